@@ -0,0 +1,140 @@
+"""Output coalescing under channel fan-out.
+
+Senders flood a channel every client is in, against a server started
+in-process (see ``loadgen.py``). Every engine runs with its coalesced output
+and with handlers writing each message on its own:
+
+* ``threaded``: ``perMessage`` (one ``sendall`` per message), ``joined`` (the
+  queued messages joined into one buffer, as the writer used to) and
+  ``sendmsg`` (the queued messages handed to one vectored write).
+* ``asyncio``: ``perMessage`` (one transport write per message) and
+  ``coalesced`` (one write per connection and loop iteration).
+
+Results are delivered messages per second, latency and the socket writes per
+delivered message, counted by the server. An asyncio write the socket does
+not fully accept is finished by the transport, which may take more than one
+system call.
+"""
+import asyncio
+from threading import Thread
+from typing import Any, Union
+
+from tap import Tap
+
+from utils import printResults, raiseFileLimit
+
+from loadgen import (
+    FANOUT_CHANNEL,
+    connectClients,
+    join,
+    measured,
+    privmsg,
+    register,
+    summarize,
+)
+
+from lib.logger import logger
+from server.AsyncClientHandler import AsyncClientHandler
+from server.AsyncServer import AsyncServer
+from server.ClientHandler import ClientHandler
+from server.Server import Server
+
+
+class BenchmarkArgs(Tap):
+    clients: int = 200  # Clients in the channel
+    senders: int = 10  # Clients sending
+    messages: int = 50  # PRIVMSGs sent by every sender
+    timeout: float = 120.0  # Seconds a run may take before it is aborted
+
+
+class PerMessageClientHandler(ClientHandler):
+    def _writeChunks(self, chunks: list[bytes]) -> None:
+        for chunk in chunks:
+            self.request.sendall(chunk)
+            self.metrics.socketWrites += 1
+
+
+class JoinedClientHandler(ClientHandler):
+    def _writeChunks(self, chunks: list[bytes]) -> None:
+        self.request.sendall(b"".join(chunks))
+        self.metrics.socketWrites += 1
+
+
+class PerMessageAsyncClientHandler(AsyncClientHandler):
+    def sendRaw(self, data: bytes) -> None:
+        super().sendRaw(data)
+        self._flush()
+
+
+def startServer(engine: str, mode: str) -> tuple[Union[Server, AsyncServer], Thread]:
+    server: Union[Server, AsyncServer]
+    if engine == "asyncio":
+        server = AsyncServer("127.0.0.1", 0, ["benchmark"], [], "benchmark")
+        if mode == "perMessage":
+            asyncServer = server
+            # Read once the server starts listening
+            server._createHandler = (  # type: ignore[method-assign]
+                lambda: PerMessageAsyncClientHandler(asyncServer, asyncServer.loop)
+            )
+    else:
+        server = Server("127.0.0.1", 0, ["benchmark"], [], "benchmark")
+        if mode == "perMessage":
+            server.RequestHandlerClass = PerMessageClientHandler
+        elif mode == "joined":
+            server.RequestHandlerClass = JoinedClientHandler
+
+    thread = Thread(target=server.start, daemon=True)
+    thread.start()
+    return server, thread
+
+
+async def fanout(
+    server: Union[Server, AsyncServer], args: BenchmarkArgs
+) -> dict[str, Any]:
+    clients = await connectClients(server.serverState.port, args.clients)
+    drains = [asyncio.create_task(client.drain()) for client in clients]
+    try:
+        await register(clients)
+        await join(clients, [FANOUT_CHANNEL])
+
+        metrics = server.serverState.metrics
+        writes = metrics.socketWrites
+        recorder = await measured(privmsg(clients, args.senders, args.messages), args)
+        writes = metrics.socketWrites - writes
+
+        result = summarize(recorder)
+        result["writesPerMessage"] = round(writes / len(recorder.latencies), 3)
+        return result
+    finally:
+        for client in clients:
+            client.close()
+        for drain in drains:
+            drain.cancel()
+        await asyncio.gather(*drains, return_exceptions=True)
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    raiseFileLimit()
+    logger.setLevel("WARNING")
+
+    results: list[dict] = []
+    for engine, modes in [
+        ("threaded", ["perMessage", "joined", "sendmsg"]),
+        ("asyncio", ["perMessage", "coalesced"]),
+    ]:
+        for mode in modes:
+            server, thread = startServer(engine, mode)
+            result: dict[str, Any] = {"engine": engine, "mode": mode}
+            try:
+                result |= asyncio.run(fanout(server, args))
+            except (OSError, asyncio.TimeoutError) as e:
+                result["error"] = repr(e)
+            finally:
+                server.stop()
+                thread.join()
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
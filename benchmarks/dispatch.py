@@ -0,0 +1,71 @@
+"""Measures the per-message overhead of command dispatch.
+
+Compares three ways of running the PING handler for an already parsed
+message: calling the handler directly (no dispatch), the Dispatcher, and
+the legacy approach of creating a handler instance for every message.
+The Dispatcher also times every command, the cost of reading the clock
+twice is reported separately as timingNanosPerMessage.
+"""
+from time import perf_counter, perf_counter_ns
+
+from tap import Tap
+
+from utils import connectClient, createServer, printResults
+
+from lib.Message import Message
+from server.MessageHandlers.handlers import HANDLERS
+
+
+class BenchmarkArgs(Tap):
+    messages: int = 1000000  # Messages dispatched per variant
+    command: str = "PING"  # Command to dispatch
+
+
+def run(args: BenchmarkArgs) -> dict:
+    server = createServer()
+    connection = connectClient(server, "bench")
+    client = server.serverState.getClient(connection)
+    message = Message(args.command, client.user)
+    serverState = server.serverState
+    messages = range(args.messages)
+
+    handle = server.dispatcher.commands[args.command][0]
+    started = perf_counter()
+    for _ in messages:
+        handle(client, message)
+    direct = perf_counter() - started
+
+    dispatch = server.dispatcher.dispatch
+    started = perf_counter()
+    for _ in messages:
+        dispatch(client, message)
+    dispatcher = perf_counter() - started
+
+    started = perf_counter()
+    for _ in messages:
+        perf_counter_ns()
+        perf_counter_ns()
+    timing = perf_counter() - started
+
+    started = perf_counter()
+    for _ in messages:
+        Handler = HANDLERS[message.command]
+        Handler(serverState).handle(client, message)
+    legacy = perf_counter() - started
+
+    def nanos(elapsed: float) -> float:
+        return round(elapsed / args.messages * 1e9, 1)
+
+    return {
+        "command": args.command,
+        "directNanosPerMessage": nanos(direct),
+        "dispatcherNanosPerMessage": nanos(dispatcher),
+        "legacyNanosPerMessage": nanos(legacy),
+        "timingNanosPerMessage": nanos(timing),
+        "dispatcherOverheadNanos": nanos(dispatcher - direct),
+        "legacyOverheadNanos": nanos(legacy - direct),
+    }
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
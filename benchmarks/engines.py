@@ -0,0 +1,144 @@
+"""Compares memory and throughput of the threaded and asyncio server engines.
+
+For every engine and connection count a server is started in a subprocess,
+the connections are opened (and optionally registered), then a subset of
+them pings the server as fast as it answers. Results are printed as JSON.
+
+Opening 10k+ connections needs a high open file limit (``ulimit -n``) and,
+for the threaded engine, enough allowed threads (``/proc/sys/kernel/threads-max``).
+"""
+import asyncio
+import subprocess
+import sys
+from time import perf_counter
+from typing import Any, Optional
+
+from tap import Tap
+
+from utils import printResults, raiseFileLimit, readProcessStatus
+
+
+# Source addresses are spread over 127.0.0.0/8 to stay clear of the ephemeral
+# port range limit of a single address pair
+CONNECTIONS_PER_SOURCE_ADDRESS = 20000
+CONNECT_CONCURRENCY = 500
+PING_BATCH = 50
+
+
+class BenchmarkArgs(Tap):
+    engines: list[str] = ["threaded", "asyncio"]  # Engines to compare
+    connections: list[int] = [1000, 10000, 50000]  # Connection counts
+    active: int = 100  # Connections sending traffic during the throughput phase
+    duration: float = 5.0  # Seconds of the throughput phase
+    register_clients: bool = False  # Register connections instead of idling
+    serve: Optional[str] = None  # Internal: run a server with this engine
+
+
+def serve(engine: str) -> None:
+    from lib.logger import logger
+    from server.AsyncServer import AsyncServer
+    from server.Server import Server
+
+    logger.setLevel("WARNING")
+    raiseFileLimit()
+
+    ServerClass = AsyncServer if engine == "asyncio" else Server
+    server = ServerClass("127.0.0.1", 0, ["benchmark"], [], "benchmark")
+    print(server.serverState.port, flush=True)
+    server.start()
+
+
+async def readUntil(reader: asyncio.StreamReader, code: bytes) -> None:
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed during registration")
+        if line.split(b" ", 2)[1:2] == [code]:
+            return
+
+
+async def connect(
+    port: int, index: int, limit: asyncio.Semaphore, register: bool
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    async with limit:
+        sourceAddress = f"127.0.0.{2 + index // CONNECTIONS_PER_SOURCE_ADDRESS}"
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", port, local_addr=(sourceAddress, 0)
+        )
+        if register:
+            writer.write(f"NICK u{index}\r\nUSER u{index} 0 * :bench\r\n".encode())
+            await readUntil(reader, b"376")
+        return reader, writer
+
+
+async def ping(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, deadline: float
+) -> int:
+    replies = 0
+    while perf_counter() < deadline:
+        writer.write(b"PING\r\n" * PING_BATCH)
+        for _ in range(PING_BATCH):
+            await reader.readline()
+        replies += PING_BATCH
+    return replies
+
+
+async def measure(port: int, pid: int, args: BenchmarkArgs, count: int) -> dict:
+    limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    started = perf_counter()
+    connections = await asyncio.gather(
+        *(connect(port, i, limit, args.register_clients) for i in range(count))
+    )
+    connectSeconds = perf_counter() - started
+    idle = readProcessStatus(pid)
+
+    active = connections[: args.active]
+    started = perf_counter()
+    deadline = started + args.duration
+    replies = await asyncio.gather(*(ping(r, w, deadline) for r, w in active))
+    elapsed = perf_counter() - started
+
+    for _, writer in connections:
+        writer.close()
+
+    return {
+        "connectSeconds": round(connectSeconds, 3),
+        "rssBytes": idle["rssBytes"],
+        "rssBytesPerConnection": round(idle["rssBytes"] / count),
+        "threads": idle["threads"],
+        "messagesPerSecond": round(sum(replies) / elapsed),
+    }
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    raiseFileLimit()
+
+    results: list[dict] = []
+    for engine in args.engines:
+        for count in args.connections:
+            process = subprocess.Popen(
+                [sys.executable, __file__, "--serve", engine],
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            assert process.stdout is not None
+            port = int(process.stdout.readline())
+
+            result: dict[str, Any] = {"engine": engine, "connections": count}
+            try:
+                result |= asyncio.run(measure(port, process.pid, args, count))
+            except OSError as e:
+                result["error"] = str(e)
+            finally:
+                process.kill()
+                process.wait()
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    args = BenchmarkArgs().parse_args()
+    if args.serve:
+        serve(args.serve)
+    else:
+        printResults(run(args))
@@ -0,0 +1,69 @@
+"""Measures the cost of a PRIVMSG fan-out as the channel grows.
+
+Clients are driven in-process with connections that only count bytes, so
+the numbers are the server's own CPU cost per message, without sockets.
+The legacy variant formats and encodes the line once per recipient, like
+the fan-out did before it serialized messages only once.
+"""
+from time import perf_counter
+
+from tap import Tap
+
+from utils import connectClient, createServer, printResults
+
+
+class BenchmarkArgs(Tap):
+    sizes: list[int] = [10, 100, 1000, 5000]  # Channel sizes
+    messages: int = 200  # PRIVMSGs sent per channel size
+
+
+def legacyFanout(server, sender, channel, message: str) -> None:
+    # Members and operators were kept apart and merged for every message
+    for user in dict(channel.members):
+        client = server.serverState.clients[user.username]
+        if client is sender:
+            continue
+        client.handler.send(f":{sender.getIdentifier()} {message}\r\n")
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    results: list[dict] = []
+    for size in args.sizes:
+        server = createServer()
+        connections = [connectClient(server, f"u{i}", i) for i in range(size)]
+        for connection in connections:
+            server.handleMessage(connection, b"JOIN #bench")
+
+        sender = connections[0]
+        line = f"PRIVMSG #bench :{'x' * 100}".encode()
+
+        started = perf_counter()
+        for _ in range(args.messages):
+            server.handleMessage(sender, line)
+        elapsed = perf_counter() - started
+
+        client = server.serverState.getClient(sender)
+        channel = server.serverState.channels["#bench"]
+        message = f"PRIVMSG #bench :{'x' * 100}"
+        started = perf_counter()
+        for _ in range(args.messages):
+            legacyFanout(server, client, channel, message)
+        legacyElapsed = perf_counter() - started
+
+        deliveries = args.messages * (size - 1)
+        results.append(
+            {
+                "channelSize": size,
+                "microsPerMessage": round(elapsed / args.messages * 1e6, 2),
+                "nanosPerDelivery": round(elapsed / max(deliveries, 1) * 1e9, 1),
+                "legacyMicrosPerMessage": round(legacyElapsed / args.messages * 1e6, 2),
+                "legacyNanosPerDelivery": round(
+                    legacyElapsed / max(deliveries, 1) * 1e9, 1
+                ),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
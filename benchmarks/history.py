@@ -0,0 +1,142 @@
+"""Channel history: recording messages, seeking by time and memory per message.
+
+Every channel keeps ``--lines`` messages, each recorded as the line its
+members receive. The rings are compared to a legacy history keeping message
+objects (sender, target, text and time) in a list per channel, trimmed from
+its start and searched by scanning it:
+
+* ``record``: microseconds per message recorded, ``--channels`` channels
+  taking turns.
+* ``seek``: microseconds per ``CHATHISTORY BEFORE`` lookup of ``--limit``
+  messages at a random time of a full channel.
+* ``memory``: bytes per message kept, measured with tracemalloc.
+"""
+import gc
+import random
+import tracemalloc
+from dataclasses import dataclass
+from time import perf_counter, time_ns
+from typing import Any, Callable
+
+from tap import Tap
+
+from utils import printResults
+
+from lib.Channel import Channel
+from lib.User import User
+from server.History import History
+
+
+class BenchmarkArgs(Tap):
+    channels: int = 100  # Channels with history
+    lines: int = 1000  # Messages kept per channel
+    seeks: int = 10_000  # Lookups measured
+    limit: int = 50  # Messages per lookup
+
+
+@dataclass
+class LegacyMessage:
+    sender: str
+    target: str
+    text: str
+    timestamp: int
+
+
+class LegacyHistory:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.channels: dict[Channel, list[LegacyMessage]] = {}
+
+    def record(self, channel: Channel, message: LegacyMessage) -> None:
+        messages = self.channels.setdefault(channel, [])
+        messages.append(message)
+        if len(messages) > self.capacity:
+            del messages[0]
+
+    def before(self, channel: Channel, timestamp: int, limit: int) -> list[bytes]:
+        messages = [m for m in self.channels[channel] if m.timestamp < timestamp]
+        return [
+            f":{m.sender} PRIVMSG {m.target} :{m.text}\r\n".encode()
+            for m in messages[-limit:]
+        ]
+
+
+def measure(f: Callable[[], Any], count: int) -> float:
+    """Microseconds per call"""
+    started = perf_counter()
+    for _ in range(count):
+        f()
+    return round((perf_counter() - started) / count * 1e6, 3)
+
+
+def allocated(build: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        build()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    creator = User()
+    creator.username = "creator"
+    channels = [Channel(f"#channel{i}", creator) for i in range(args.channels)]
+    sender = "sender!sender@127.0.0.1"
+    messages = args.channels * args.lines
+    texts = [f"message {i} of the benchmark" for i in range(messages)]
+
+    history = History(capacity=args.lines, budget=2**62)
+    legacy = LegacyHistory(args.lines)
+
+    def recordAll() -> None:
+        for i, text in enumerate(texts):
+            channel = channels[i % len(channels)]
+            history.record(
+                channel, f":{sender} PRIVMSG {channel.name} :{text}\r\n".encode()
+            )
+
+    def recordAllLegacy() -> None:
+        for i, text in enumerate(texts):
+            channel = channels[i % len(channels)]
+            legacy.record(channel, LegacyMessage(sender, channel.name, text, time_ns()))
+
+    results: list[dict] = []
+    stores: list[tuple[str, Callable[[], None], Any]] = [
+        ("ring", recordAll, history),
+        ("legacy", recordAllLegacy, legacy),
+    ]
+    for variant, record, store in stores:
+        bytesPerMessage = allocated(record) / messages
+        started = perf_counter()
+        # Full rings now, recording replaces messages
+        record()
+        usPerRecord = (perf_counter() - started) / messages * 1e6
+
+        channel = channels[0]
+        if variant == "ring":
+            times = [timestamp for timestamp, _ in history.latest(channel, args.lines)]
+        else:
+            times = [m.timestamp for m in legacy.channels[channel]]
+        targets = random.choices(times, k=args.seeks)
+        lookups = iter(targets)
+        usPerSeek = measure(
+            lambda: store.before(channel, next(lookups), args.limit), args.seeks
+        )
+
+        results.append(
+            {
+                "variant": variant,
+                "channels": args.channels,
+                "lines": args.lines,
+                "usPerRecord": round(usPerRecord, 3),
+                "usPerSeek": usPerSeek,
+                "bytesPerMessage": round(bytesPerMessage),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
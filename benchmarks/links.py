@@ -0,0 +1,213 @@
+"""Server links: latency across links and burst time.
+
+Every server runs in its own process and they are linked on localhost:
+
+* ``latency``: a chain of ``--servers`` servers, each linked to the previous
+  one. A client of the first server sends PRIVMSGs to a channel one at a time,
+  the time until a member on the n-th server receives each is measured. With
+  one server both clients are on the same server.
+* ``burst``: a server holding ``--users`` clients spread over ``--channels``
+  channels. A server linking to it (in this process) measures the time from
+  connecting until it has applied the burst, every client and channel of the
+  network.
+"""
+from multiprocessing import get_context
+from multiprocessing.context import ForkProcess
+from socket import create_connection, socket
+from time import monotonic, perf_counter, sleep
+from typing import Any, BinaryIO
+
+from tap import Tap
+
+from utils import connectClient, percentile, printResults
+
+from lib.logger import logger
+from server.Links import ServerLinks
+from server.Server import Server
+from server.ServerCore import ServerCore
+from workers import getFreePort, waitForPort
+
+
+PASSWORD = "benchmark"
+LATENCY_CHANNEL = "#latency"
+# Time given to the servers to link and to apply a burst
+LINK_TIMEOUT = 120
+
+
+class BenchmarkArgs(Tap):
+    servers: int = 4  # Servers of the chain in the latency benchmark
+    messages: int = 500  # PRIVMSGs timed per server count
+    users: list[int] = [1_000, 10_000, 50_000]  # Clients of the bursting server
+    channels: int = 1_000  # Channels the clients of the bursting server are in
+
+
+def serve(
+    name: str, port: int, linkPort: int, peers: list[int], users: int, channels: int
+) -> None:
+    logger.setLevel("WARNING")
+    server = Server("127.0.0.1", port, ["benchmark"], [], "benchmark")
+    for i in range(users):
+        connection = connectClient(server, f"{name[0]}{i}", i)
+        server.handleMessage(connection, f"JOIN #c{i % channels}".encode())
+
+    links = ServerLinks(server.serverState, name, PASSWORD)
+    links.listen("127.0.0.1", linkPort)
+    for peer in peers:
+        links.connect("127.0.0.1", peer)
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        links.stop()
+        server.stop()
+
+
+def startServer(
+    name: str, peers: list[int], users: int = 0, channels: int = 1
+) -> tuple[ForkProcess, int, int]:
+    """Starts a server process, returns it with its client and link ports"""
+    port, linkPort = getFreePort(), getFreePort()
+    process = get_context("fork").Process(
+        target=serve, args=(name, port, linkPort, peers, users, channels)
+    )
+    process.start()
+    # Listens for links once its clients are registered
+    deadline = monotonic() + LINK_TIMEOUT
+    while True:
+        try:
+            waitForPort(linkPort)
+            break
+        except ConnectionRefusedError:
+            if monotonic() > deadline:
+                raise
+    return process, port, linkPort
+
+
+class LineClient:
+    sock: socket
+    file: BinaryIO
+
+    def __init__(self, port: int, nick: str) -> None:
+        self.sock = create_connection(("127.0.0.1", port))
+        self.sock.settimeout(LINK_TIMEOUT)
+        self.file = self.sock.makefile("rb")
+        self.send(f"NICK {nick}\r\nUSER {nick} 0 * :{nick}\r\n")
+        self.readUntil(b" 376 ")
+
+    def send(self, data: str) -> None:
+        self.sock.sendall(data.encode())
+
+    def readUntil(self, text: bytes) -> bytes:
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("Closed by the server")
+            if text in line:
+                return line
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+def waitForServers(client: LineClient, servers: int) -> None:
+    expected = f"on {servers} server".encode()
+    deadline = monotonic() + LINK_TIMEOUT
+    while True:
+        client.send("LUSERS\r\n")
+        if expected in client.readUntil(b" 251 "):
+            return
+        assert monotonic() < deadline, "Timed out waiting for the links"
+        sleep(0.05)
+
+
+def measureLatency(args: BenchmarkArgs) -> list[dict[str, Any]]:
+    processes: list[ForkProcess] = []
+    ports: list[int] = []
+    linkPorts: list[int] = []
+    try:
+        for i in range(args.servers):
+            process, port, linkPort = startServer(f"s{i}.irc", linkPorts[-1:])
+            processes.append(process)
+            ports.append(port)
+            linkPorts.append(linkPort)
+
+        sender = LineClient(ports[0], "sender")
+        waitForServers(sender, args.servers)
+        sender.send(f"JOIN {LATENCY_CHANNEL}\r\n")
+        sender.readUntil(b" 366 ")
+
+        results = []
+        for servers, port in enumerate(ports, 1):
+            receiver = LineClient(port, f"receiver{servers}")
+            receiver.send(f"JOIN {LATENCY_CHANNEL}\r\n")
+            # Member on every server once its JOIN reached the sender
+            sender.readUntil(f":receiver{servers}!".encode())
+
+            latencies: list[float] = []
+            for i in range(args.messages):
+                started = perf_counter()
+                sender.send(f"PRIVMSG {LATENCY_CHANNEL} :m{i}\r\n")
+                receiver.readUntil(f":m{i}\r\n".encode())
+                latencies.append((perf_counter() - started) * 1000)
+            receiver.send(f"PART {LATENCY_CHANNEL}\r\n")
+            receiver.close()
+
+            latencies.sort()
+            results.append(
+                {
+                    "case": "latency",
+                    "servers": servers,
+                    "links": servers - 1,
+                    "messages": args.messages,
+                    "latencyMs": {
+                        "p50": round(percentile(latencies, 0.5), 3),
+                        "p99": round(percentile(latencies, 0.99), 3),
+                    },
+                }
+            )
+        sender.close()
+        return results
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def measureBurst(users: int, args: BenchmarkArgs) -> dict[str, Any]:
+    process, _, linkPort = startServer("bursting.irc", [], users, args.channels)
+    core = ServerCore("127.0.0.1", 0, [], [], "benchmark")
+    links = ServerLinks(core.serverState, "linking.irc", PASSWORD)
+    try:
+        started = perf_counter()
+        links.connect("127.0.0.1", linkPort)
+        deadline = monotonic() + LINK_TIMEOUT
+        while not any(link.synced.is_set() for link in links.links):
+            assert monotonic() < deadline, "Timed out waiting for the burst"
+            sleep(0.001)
+        seconds = perf_counter() - started
+        # Before the link drops and takes them away
+        linkedUsers = len(core.serverState.clients)
+        linkedChannels = len(core.serverState.channels)
+    finally:
+        links.stop()
+        process.terminate()
+        process.join()
+
+    return {
+        "case": "burst",
+        "users": users,
+        "channels": args.channels,
+        "linkedUsers": linkedUsers,
+        "linkedChannels": linkedChannels,
+        "seconds": round(seconds, 3),
+        "usPerUser": round(seconds / users * 1e6, 3),
+    }
+
+
+def run(args: BenchmarkArgs) -> list[dict[str, Any]]:
+    return measureLatency(args) + [measureBurst(users, args) for users in args.users]
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
@@ -0,0 +1,135 @@
+"""LIST of a network of 50k channels, against an in-process server.
+
+The client's output queue is simulated: past ``--backlog`` pending bytes it
+asks the server to wait until the output drains, which the benchmark then
+does at once. Every case is run with the paced listing and with the legacy
+one, rendering every reply into a single burst:
+
+* ``full``: LIST without parameters.
+* ``members``: LIST of the channels of more than ``--minMembers`` members.
+* ``mask``: LIST of the channels matching a wildcard mask.
+
+Reports microseconds per listing, the channels listed, the largest single
+write and the peak memory allocated by a listing, measured with tracemalloc.
+"""
+import gc
+import tracemalloc
+from time import perf_counter
+from typing import Callable
+
+from tap import Tap
+
+from utils import connectClient, createServer, printResults
+
+from server.MessageHandlers.List import parseListFilter
+from server.MessageHandlers.Reply import channelList, channelListEnd
+
+
+class BenchmarkArgs(Tap):
+    channels: int = 50_000  # Channels of the network
+    minMembers: int = 2  # Member count the "members" case filters on
+    listings: int = 5  # Listings per case and variant
+    backlog: int = 64 * 1024  # Pending bytes before the server waits for a drain
+
+
+class PacedConnection:
+    """Counts the output and drains it whenever the server waits for it"""
+
+    def __init__(self, connection, backlog: int) -> None:
+        self.connection = connection
+        self.backlog = backlog
+        self.pending = 0
+        self.largestWrite = 0
+        self.drainCallbacks: list[Callable[[], None]] = []
+
+    def sendRaw(self, data: bytes) -> None:
+        self.pending += len(data)
+        self.largestWrite = max(self.largestWrite, len(data))
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        if self.pending <= self.backlog:
+            return False
+        self.drainCallbacks.append(callback)
+        return True
+
+    def drain(self) -> None:
+        while self.drainCallbacks:
+            self.pending = 0
+            callbacks, self.drainCallbacks = self.drainCallbacks, []
+            for callback in callbacks:
+                callback()
+
+
+def legacyList(handler, client, params: str) -> None:
+    # Every reply of the listing rendered at once, sent as one burst
+    listFilter = parseListFilter(params) if params else None
+    with handler.serverState.lock:
+        channels = list(handler.serverState.channels.values())
+    replies = [
+        channelList(channel)
+        for channel in channels
+        if listFilter is None or listFilter.matches(channel)
+    ]
+    replies.append(channelListEnd())
+    client.handler.sendRaw(handler._renderNumeric(client, replies))
+
+
+def measure(f: Callable[[], None], count: int) -> tuple[float, int]:
+    """Microseconds per call and the peak memory allocated by one call"""
+    started = perf_counter()
+    for _ in range(count):
+        f()
+    microseconds = round((perf_counter() - started) / count * 1e6, 2)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        f()
+        return microseconds, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    server = createServer()
+    serverState = server.serverState
+    creator = serverState.getClient(connectClient(server, "creator"))
+    member = serverState.getClient(connectClient(server, "member", 1))
+    for i in range(args.channels):
+        with serverState.openChannel(f"#channel{i}", creator.user) as (channel, _):
+            # Every tenth channel gets enough members for the "members" case
+            if i % 10 == 0:
+                channel.addUser(member.user)
+
+    client = serverState.getClient(connectClient(server, "lister", 2))
+    handler = server.dispatcher.commands["LIST"][0].__self__
+    connection = PacedConnection(client.handler, args.backlog)
+    client.handler = connection  # type: ignore[assignment]
+
+    def paced(params: str) -> None:
+        listFilter = parseListFilter(params) if params else None
+        handler._paceNumeric(client, handler.list(listFilter))
+        connection.drain()
+
+    results = []
+    for case, params in [
+        ("full", ""),
+        ("members", f">{args.minMembers - 1}"),
+        ("mask", "#channel1*"),
+    ]:
+        result: dict = {"case": case, "channels": args.channels}
+        for variant, f in [
+            ("paced", lambda: paced(params)),
+            ("legacy", lambda: legacyList(handler, client, params)),
+        ]:
+            connection.largestWrite = 0
+            microseconds, peakBytes = measure(f, args.listings)
+            result[f"{variant}UsPerListing"] = microseconds
+            result[f"{variant}PeakBytes"] = peakBytes
+            result[f"{variant}LargestWrite"] = connection.largestWrite
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
@@ -0,0 +1,290 @@
+"""Drives simulated clients against a server started in-process.
+
+Every scenario starts a fresh server (threaded or asyncio engine) in a
+thread and connects the clients from an asyncio event loop:
+
+* ``register``: all clients send NICK/USER at once, latency until 001.
+* ``join``: every registered client joins the same channels at once,
+  latency of each JOIN until its 366 (end of NAMES).
+* ``privmsg``: senders flood a channel all clients are in, latency from
+  sending each PRIVMSG until every other member receives it.
+* ``nick``: every client changes nick repeatedly. The server does not answer
+  a successful NICK, so each change is followed by a PING and timed until
+  its PONG.
+
+Results are printed as JSON: messages per second and p50/p99/p999 latency
+in milliseconds. The load generator shares the interpreter (and the GIL)
+with the server, so absolute numbers are pessimistic. Compare runs made on
+the same machine with the same arguments.
+"""
+import asyncio
+from threading import Thread
+from time import perf_counter, perf_counter_ns
+from typing import Any, Awaitable, Callable, Union
+
+from tap import Tap
+
+from utils import percentile, printResults, raiseFileLimit
+
+from lib.logger import logger
+from server.AsyncServer import AsyncServer
+from server.Server import Server
+
+
+CONNECT_CONCURRENCY = 200
+FANOUT_CHANNEL = "#fanout"
+
+
+class BenchmarkArgs(Tap):
+    engines: list[str] = ["threaded", "asyncio"]  # Engines to compare
+    scenarios: list[str] = ["register", "join", "privmsg", "nick"]  # Scenarios to run
+    clients: int = 200  # Simulated clients per scenario
+    channels: int = 5  # Channels every client joins in the join scenario
+    senders: int = 10  # Clients sending in the privmsg scenario
+    messages: int = 20  # PRIVMSGs sent by every sender
+    nick_changes: int = 20  # NICK changes made by every client
+    timeout: float = 60.0  # Seconds a scenario may take before it is aborted
+
+
+class LoadClient:
+    """A simulated client, its lines are handed to onLine while it drains"""
+
+    index: int
+    nick: str
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    onLine: Callable[[bytes, int], None]
+
+    def __init__(
+        self, index: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.index = index
+        self.nick = f"u{index}"
+        self.reader = reader
+        self.writer = writer
+        self.onLine = ignoreLine
+
+    async def drain(self) -> None:
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            self.onLine(line, perf_counter_ns())
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def ignoreLine(line: bytes, receivedAt: int) -> None:
+    pass
+
+
+class Recorder:
+    """Collects latencies and signals once the expected number is reached"""
+
+    expected: int
+    latencies: list[int]
+    seconds: float
+    done: asyncio.Event
+
+    def __init__(self, expected: int) -> None:
+        self.expected = expected
+        self.latencies = []
+        self.seconds = 0.0
+        self.done = asyncio.Event()
+        if expected == 0:
+            self.done.set()
+
+    def record(self, nanoseconds: int) -> None:
+        self.latencies.append(nanoseconds)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def startServer(engine: str) -> tuple[Union[Server, AsyncServer], Thread]:
+    ServerClass = AsyncServer if engine == "asyncio" else Server
+    server = ServerClass("127.0.0.1", 0, ["benchmark"], [], "benchmark")
+    thread = Thread(target=server.start, daemon=True)
+    thread.start()
+    return server, thread
+
+
+async def connectClients(port: int, count: int) -> list[LoadClient]:
+    limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def connect(index: int) -> LoadClient:
+        async with limit:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            return LoadClient(index, reader, writer)
+
+    return await asyncio.gather(*(connect(i) for i in range(count)))
+
+
+def command(line: bytes) -> bytes:
+    parts = line.split(b" ", 2)
+    return parts[1] if len(parts) > 1 else parts[0].rstrip()
+
+
+async def register(clients: list[LoadClient]) -> Recorder:
+    recorder = Recorder(len(clients))
+    for client in clients:
+        sentAt = perf_counter_ns()
+
+        def onLine(line: bytes, receivedAt: int, sentAt: int = sentAt) -> None:
+            if command(line) == b"001":
+                recorder.record(receivedAt - sentAt)
+
+        client.onLine = onLine
+        client.writer.write(
+            f"NICK {client.nick}\r\nUSER {client.nick} 0 * :load\r\n".encode()
+        )
+    await recorder.done.wait()
+    return recorder
+
+
+async def join(clients: list[LoadClient], channels: list[str]) -> Recorder:
+    recorder = Recorder(len(clients) * len(channels))
+    lines = "".join(f"JOIN {channel}\r\n" for channel in channels).encode()
+    for client in clients:
+        sentAt = perf_counter_ns()
+
+        def onLine(line: bytes, receivedAt: int, sentAt: int = sentAt) -> None:
+            if command(line) == b"366":
+                recorder.record(receivedAt - sentAt)
+
+        client.onLine = onLine
+        client.writer.write(lines)
+    await recorder.done.wait()
+    return recorder
+
+
+async def privmsg(
+    clients: list[LoadClient],
+    senders: int,
+    messages: int,
+    channel: str = FANOUT_CHANNEL,
+) -> Recorder:
+    senders = min(senders, len(clients))
+    recorder = Recorder(senders * messages * (len(clients) - 1))
+
+    def onLine(line: bytes, receivedAt: int) -> None:
+        if command(line) == b"PRIVMSG":
+            sentAt = int(line.rsplit(b":", 1)[1].split(b" ", 1)[0])
+            recorder.record(receivedAt - sentAt)
+
+    for client in clients:
+        client.onLine = onLine
+
+    padding = "x" * 64
+    for _ in range(messages):
+        for client in clients[:senders]:
+            line = f"PRIVMSG {channel} :{perf_counter_ns()} {padding}\r\n"
+            client.writer.write(line.encode())
+        await asyncio.sleep(0)
+    await recorder.done.wait()
+    return recorder
+
+
+async def nick(clients: list[LoadClient], changes: int) -> Recorder:
+    recorder = Recorder(len(clients) * changes)
+
+    async def churn(client: LoadClient) -> None:
+        pong = asyncio.Event()
+
+        def onLine(line: bytes, receivedAt: int) -> None:
+            if line.startswith(b"PONG"):
+                pong.set()
+
+        client.onLine = onLine
+        for change in range(changes):
+            pong.clear()
+            sentAt = perf_counter_ns()
+            # Alternates between two nicks that are unique to the client
+            newNick = f"{'ab'[change % 2]}{client.index}"
+            client.writer.write(f"NICK {newNick}\r\nPING\r\n".encode())
+            await pong.wait()
+            recorder.record(perf_counter_ns() - sentAt)
+
+    await asyncio.gather(*(churn(client) for client in clients))
+    return recorder
+
+
+async def runScenario(scenario: str, port: int, args: BenchmarkArgs) -> Recorder:
+    clients = await connectClients(port, args.clients)
+    drains = [asyncio.create_task(client.drain()) for client in clients]
+    try:
+        if scenario == "register":
+            return await measured(register(clients), args)
+
+        # Every other scenario starts from registered clients
+        await register(clients)
+        if scenario == "join":
+            channels = [f"#join{i}" for i in range(args.channels)]
+            return await measured(join(clients, channels), args)
+        if scenario == "privmsg":
+            await join(clients, [FANOUT_CHANNEL])
+            return await measured(privmsg(clients, args.senders, args.messages), args)
+        if scenario == "nick":
+            return await measured(nick(clients, args.nick_changes), args)
+        raise ValueError(f"Unknown scenario: {scenario}")
+    finally:
+        for client in clients:
+            client.close()
+        for drain in drains:
+            drain.cancel()
+        await asyncio.gather(*drains, return_exceptions=True)
+
+
+async def measured(scenario: Awaitable[Recorder], args: BenchmarkArgs) -> Recorder:
+    started = perf_counter()
+    recorder = await asyncio.wait_for(scenario, args.timeout)
+    recorder.seconds = perf_counter() - started
+    return recorder
+
+
+def summarize(recorder: Recorder) -> dict[str, Any]:
+    latencies = sorted(recorder.latencies)
+    seconds = recorder.seconds
+
+    def milliseconds(fraction: float) -> float:
+        return round(percentile(latencies, fraction) / 1e6, 3)
+
+    return {
+        "messages": len(latencies),
+        "seconds": round(seconds, 3),
+        "messagesPerSecond": round(len(latencies) / seconds) if seconds else 0,
+        "latencyMs": {
+            "p50": milliseconds(0.5),
+            "p99": milliseconds(0.99),
+            "p999": milliseconds(0.999),
+        },
+    }
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    raiseFileLimit()
+    logger.setLevel("WARNING")
+
+    results: list[dict] = []
+    for engine in args.engines:
+        for scenario in args.scenarios:
+            server, thread = startServer(engine)
+            result: dict[str, Any] = {
+                "engine": engine,
+                "scenario": scenario,
+                "clients": args.clients,
+            }
+            try:
+                port = server.serverState.port
+                result |= summarize(asyncio.run(runScenario(scenario, port, args)))
+            except (OSError, asyncio.TimeoutError) as e:
+                result["error"] = repr(e)
+            finally:
+                server.stop()
+                thread.join()
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
@@ -0,0 +1,96 @@
+"""Cost of logging in the threads handling clients.
+
+* ``disabled``: a per-line debug message while the logger is at INFO, built
+  unconditionally (as the connection handlers used to) and behind an
+  ``isEnabledFor`` guard.
+* ``enabled``: CPU time of the logging thread for every INFO record written
+  to a log file, with a synchronous ``FileHandler`` and with the queue and
+  background writer of ``lib.logger``. Time blocked on the disk is not
+  counted, so the synchronous handler is favoured.
+"""
+from logging import DEBUG, FileHandler, getLogger
+from tempfile import TemporaryDirectory
+from time import thread_time_ns
+
+from tap import Tap
+
+from utils import printResults
+
+from lib.logger import FILE_FORMATTER, LogQueueHandler, LogWriter
+
+
+class BenchmarkArgs(Tap):
+    lines: int = 200_000  # Lines logged per measurement
+
+
+def nanosecondsPerLine(statement, lines: int) -> float:
+    """CPU time of the calling thread only, background writing is not counted"""
+    started = thread_time_ns()
+    for _ in range(lines):
+        statement()
+    return round((thread_time_ns() - started) / lines, 1)
+
+
+def disabled(args: BenchmarkArgs) -> list[dict]:
+    log = getLogger("benchmark.disabled")
+    log.propagate = False
+    log.setLevel("INFO")
+    address = "127.0.0.1:6667"
+    line = b"PRIVMSG #channel :" + b"x" * 64
+
+    def unguarded() -> None:
+        log.debug(f"{address} wrote: {repr(line)}")
+
+    def guarded() -> None:
+        if log.isEnabledFor(DEBUG):
+            log.debug(f"{address} wrote: {repr(line)}")
+
+    return [
+        {
+            "case": "disabled",
+            "mode": mode,
+            "nsPerLine": nanosecondsPerLine(f, args.lines),
+        }
+        for mode, f in [("unguarded", unguarded), ("guarded", guarded)]
+    ]
+
+
+def enabled(args: BenchmarkArgs) -> list[dict]:
+    results = []
+    with TemporaryDirectory() as directory:
+        fileHandler = FileHandler(f"{directory}/sync.log")
+        fileHandler.setFormatter(FILE_FORMATTER)
+        syncLog = getLogger("benchmark.sync")
+        syncLog.propagate = False
+        syncLog.addHandler(fileHandler)
+
+        writer = LogWriter()
+        queuedHandler = FileHandler(f"{directory}/queued.log")
+        queuedHandler.setFormatter(FILE_FORMATTER)
+        writer.handlers.append(queuedHandler)
+        queuedLog = getLogger("benchmark.queued")
+        queuedLog.propagate = False
+        queuedLog.addHandler(LogQueueHandler(writer))
+
+        for mode, log in [("FileHandler", syncLog), ("LogWriter", queuedLog)]:
+            log.setLevel("INFO")
+
+            def write() -> None:
+                log.info("user joined #channel")
+
+            results.append(
+                {
+                    "case": "enabled",
+                    "mode": mode,
+                    "nsPerLine": nanosecondsPerLine(write, args.lines),
+                }
+            )
+        writer.flush()
+        fileHandler.close()
+        queuedHandler.close()
+    return results
+
+
+if __name__ == "__main__":
+    args = BenchmarkArgs().parse_args()
+    printResults(disabled(args) + enabled(args))
@@ -0,0 +1,148 @@
+"""Memory of the users and channels of a server, measured with tracemalloc.
+
+Builds the registered users (``User`` and ``Client``) and then the channels,
+every user joining ``--joins`` of them, and reports the bytes allocated per
+user and per channel. Membership entries are counted with the channels,
+names are created beforehand and not counted.
+
+The current slotted classes with bitfield modes are compared to the legacy
+layout: dict-backed classes, modes in separate dataclasses of bools and
+channels with separate member and operator dicts.
+"""
+import gc
+import tracemalloc
+from dataclasses import dataclass
+from threading import RLock
+from typing import Any, Callable, Optional
+
+from tap import Tap
+
+from utils import NullConnection, printResults
+
+from lib.Channel import Channel
+from lib.User import User
+from server.ServerState import Client
+
+
+class BenchmarkArgs(Tap):
+    users: int = 100_000  # Registered users
+    channels: int = 20_000  # Channels
+    joins: int = 5  # Channels every user joins
+
+
+@dataclass
+class LegacyUserModes:
+    away: bool = False
+    invisible: bool = False
+    operator: bool = False
+
+
+class LegacyUser:
+    def __init__(self) -> None:
+        self.password: Optional[str] = None
+        self.nick = "*"
+        self.username: Optional[str] = None
+        self.realname: Optional[str] = None
+        self.modes = LegacyUserModes()
+        self.channels: dict[str, Any] = {}
+
+
+@dataclass
+class LegacyClient:
+    handler: Any
+    user: Any
+    floodBucket: Any = None
+
+
+@dataclass
+class LegacyChannelModes:
+    anonymous: bool = False
+    inviteOnly: bool = False
+    moderated: bool = False
+    topic: bool = False
+    userLimit: bool = False
+    channelKey: bool = False
+
+
+class LegacyChannel:
+    def __init__(self, name: str, creator: LegacyUser) -> None:
+        self.users: dict[str, LegacyUser] = {}
+        self.operators: dict[str, LegacyUser] = {}
+        self.messages: list = []
+        self.modes = LegacyChannelModes()
+        self.topic: Optional[str] = None
+        self.key: Optional[str] = None
+        self.userLimit: Optional[int] = None
+        self.lock = RLock()
+        self.closed = False
+        self.name = name
+        self.addOperator(creator)
+
+    def addUser(self, user: LegacyUser) -> None:
+        assert user.username is not None
+        self.users[user.username] = user
+        user.channels[self.name] = self
+
+    def addOperator(self, user: LegacyUser) -> None:
+        assert user.username is not None
+        self.operators[user.username] = user
+        user.channels[self.name] = self
+
+
+def allocated(build: Callable[[], Any]) -> tuple[int, Any]:
+    """Bytes allocated by build and still referenced, and what it returned"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def measure(layout: str, args: BenchmarkArgs) -> dict:
+    UserClass: Any = LegacyUser if layout == "legacy" else User
+    ClientClass: Any = LegacyClient if layout == "legacy" else Client
+    ChannelClass: Any = LegacyChannel if layout == "legacy" else Channel
+
+    connection = NullConnection()
+    names = [f"user{i}" for i in range(args.users)]
+    channelNames = [f"#channel{i}" for i in range(args.channels)]
+
+    def buildUsers() -> list:
+        clients = []
+        for name in names:
+            user = UserClass()
+            user.nick = user.username = user.realname = name
+            clients.append(ClientClass(connection, user))
+        return clients
+
+    userBytes, clients = allocated(buildUsers)
+
+    def buildChannels() -> list:
+        channels = [
+            ChannelClass(name, clients[i % len(clients)].user)
+            for i, name in enumerate(channelNames)
+        ]
+        for i, client in enumerate(clients):
+            for join in range(args.joins):
+                channel = channels[(i * args.joins + join) % len(channels)]
+                # Creators are already in their channel
+                if channel.name not in client.user.channels:
+                    channel.addUser(client.user)
+        return channels
+
+    channelBytes, channels = allocated(buildChannels)
+
+    return {
+        "layout": layout,
+        "users": len(clients),
+        "bytesPerUser": round(userBytes / len(clients)),
+        "channels": len(channels),
+        "bytesPerChannel": round(channelBytes / len(channels)),
+    }
+
+
+if __name__ == "__main__":
+    args = BenchmarkArgs().parse_args()
+    printResults([measure(layout, args) for layout in ["legacy", "slotted"]])
@@ -0,0 +1,107 @@
+"""NAMES and JOIN in a channel of 10k members, against an in-process server.
+
+* ``names``: a NAMES reply, streamed as 353 lines of at most 512 bytes,
+  compared to the legacy reply holding every member in a single line.
+* ``join``: a client joining the channel (JOIN fan-out, topic, NAMES and
+  end of NAMES) and leaving it again.
+
+Reports microseconds per reply or join, the lines of the NAMES reply and the
+longest of them.
+"""
+from time import perf_counter
+
+from tap import Tap
+
+from utils import connectClient, createServer, printResults
+
+from lib.Channel import getMemberPrefix
+
+
+class BenchmarkArgs(Tap):
+    members: int = 10_000  # Members of the channel
+    replies: int = 200  # NAMES replies generated per variant
+    joins: int = 200  # JOIN and PART cycles
+
+
+class CapturingConnection:
+    """Keeps what a call sends, to inspect the lines of a reply"""
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.sent: list[bytes] = []
+
+    def sendRaw(self, data: bytes) -> None:
+        self.sent.append(data)
+
+
+def legacyNames(serverState, client, channel) -> None:
+    with channel.lock:
+        members = [
+            f"{getMemberPrefix(flags)}{user.username}"
+            for user, flags in channel.members.items()
+        ]
+    client.handler.send(
+        f":{serverState.host} 353 {client.user.nick}"
+        f" = {channel.name} :{' '.join(members)}\r\n"
+    )
+
+
+def measure(f, count: int) -> float:
+    """Microseconds per call"""
+    started = perf_counter()
+    for _ in range(count):
+        f()
+    return round((perf_counter() - started) / count * 1e6, 2)
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    server = createServer()
+    serverState = server.serverState
+    clients = [
+        serverState.getClient(connectClient(server, f"user{i}", i))
+        for i in range(args.members)
+    ]
+    # Filled directly, joining one by one costs a fan-out to every member
+    with serverState.openChannel("#bench", clients[0].user) as (channel, _):
+        for member in clients[1:]:
+            channel.addUser(member.user)
+
+    client = clients[-1]
+    handler = server.dispatcher.commands["NAMES"][0].__self__
+
+    def names() -> None:
+        handler._streamNumeric(client, handler._names(client, channel))
+
+    capture = CapturingConnection(client.handler)
+    client.handler = capture  # type: ignore[assignment]
+    names()
+    lines = b"".join(capture.sent).split(b"\r\n")[:-1]
+    client.handler = capture.connection
+
+    joiner = connectClient(server, "joiner", args.members)
+
+    def join() -> None:
+        server.handleMessage(joiner, b"JOIN #bench")
+        server.handleMessage(joiner, b"PART #bench")
+
+    return [
+        {
+            "case": "names",
+            "members": channel.getMemberCount(),
+            "lines": len(lines),
+            "longestLine": max(len(line) + 2 for line in lines),
+            "usPerReply": measure(names, args.replies),
+            "legacyUsPerReply": measure(
+                lambda: legacyNames(serverState, client, channel), args.replies
+            ),
+        },
+        {
+            "case": "join",
+            "members": channel.getMemberCount(),
+            "usPerJoin": measure(join, args.joins),
+        },
+    ]
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
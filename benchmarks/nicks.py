@@ -0,0 +1,73 @@
+"""Measures NICK changes (a "NICK storm") with many registered users.
+
+Users are registered directly through ServerState to keep the setup fast,
+then every user changes its nick through the NICK handler. The legacy
+variant repeats the collision check as it was before the nick index: a
+scan over all registered and unregistered clients.
+"""
+from time import perf_counter
+
+from tap import Tap
+
+from utils import NullConnection, createServer, printResults
+
+
+class BenchmarkArgs(Tap):
+    users: int = 100000  # Registered users
+    legacy_samples: int = 50  # NICKs timed with the legacy linear scan
+
+
+def legacyNickInUse(serverState, client, nick: str) -> bool:
+    otherClients = list(
+        filter(
+            lambda c: c != client,
+            (serverState.clients | serverState.newClients).values(),
+        )
+    )
+    return any(c.user.nick == nick for c in otherClients)
+
+
+def run(args: BenchmarkArgs) -> dict:
+    server = createServer()
+    serverState = server.serverState
+
+    started = perf_counter()
+    connections = []
+    for i in range(args.users):
+        connection = NullConnection(port=i)
+        serverState.addUser(connection)
+        client = serverState.getClient(connection)
+        serverState.changeNick(client, f"u{i}")
+        serverState.registerUser(client, f"u{i}")
+        connections.append(connection)
+    setupSeconds = perf_counter() - started
+
+    started = perf_counter()
+    for i, connection in enumerate(connections):
+        server.handleMessage(connection, f"NICK n{i}".encode())
+    elapsed = perf_counter() - started
+
+    # Every user tries to take a nick that is already in use
+    started = perf_counter()
+    for i, connection in enumerate(connections):
+        server.handleMessage(connection, f"NICK N{(i + 1) % args.users}".encode())
+    collisionElapsed = perf_counter() - started
+
+    samples = connections[: args.legacy_samples]
+    started = perf_counter()
+    for i, connection in enumerate(samples):
+        legacyNickInUse(serverState, serverState.getClient(connection), f"x{i}")
+    legacyElapsed = perf_counter() - started
+
+    return {
+        "users": args.users,
+        "setupSeconds": round(setupSeconds, 3),
+        "nicksPerSecond": round(args.users / elapsed),
+        "microsPerNick": round(elapsed / args.users * 1e6, 2),
+        "microsPerCollision": round(collisionElapsed / args.users * 1e6, 2),
+        "legacyMicrosPerNick": round(legacyElapsed / len(samples) * 1e6, 2),
+    }
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
@@ -0,0 +1,129 @@
+"""Measures the cost of OPER with many configured operators.
+
+* ``legacy``: every credential's name and password hashes checked in turn on
+  the handler thread, as OPER used to, for the last configured operator.
+* ``hashedNames``: the index with hashed names (the operators files of older
+  versions), for a name's first attempt (found by checking every hashed name
+  once) and for the following ones (a single password check).
+* ``plainNames``: the index with plain operator names.
+* ``handlerThread``: time OPER blocks the thread serving the connection,
+  the check itself runs on the operator pool.
+
+bcrypt uses ``--rounds`` (12 in real configurations), the cost of every
+check grows with it but the number of checks does not.
+"""
+from threading import Event
+from time import perf_counter
+
+from bcrypt import checkpw, gensalt, hashpw
+from tap import Tap
+
+from utils import connectClient, createServer, printResults
+
+from lib.Message import Message
+from server.MessageHandlers.Oper import Oper
+from server.Operators import OperatorIndex
+from server.ServerState import OperatorCredential
+
+
+class BenchmarkArgs(Tap):
+    operators: int = 100  # Configured operators
+    rounds: int = 6  # bcrypt cost factor of the hashes
+    attempts: int = 5  # OPER attempts per measurement
+
+
+def createCredentials(args: BenchmarkArgs, hashNames: bool) -> list:
+    credentials = []
+    for i in range(args.operators):
+        name = f"oper{i}".encode()
+        credentials.append(
+            OperatorCredential(
+                hashpw(name, gensalt(args.rounds)) if hashNames else name,
+                hashpw(b"password", gensalt(args.rounds)),
+            )
+        )
+    return credentials
+
+
+def legacyCheck(credentials: list, name: str, password: str) -> bool:
+    for credential in credentials:
+        if checkpw(name.encode(), credential.userHash) and checkpw(
+            password.encode(), credential.passwordHash
+        ):
+            return True
+    return False
+
+
+def milliseconds(f, attempts: int) -> float:
+    started = perf_counter()
+    for _ in range(attempts):
+        assert f()
+    return round((perf_counter() - started) / attempts * 1000, 3)
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    hashedCredentials = createCredentials(args, hashNames=True)
+    plainCredentials = createCredentials(args, hashNames=False)
+    name = f"oper{args.operators - 1}"
+    results = [
+        {
+            "case": "legacy",
+            "msPerAttempt": milliseconds(
+                lambda: legacyCheck(hashedCredentials, name, "password"),
+                args.attempts,
+            ),
+        }
+    ]
+
+    index = OperatorIndex(hashedCredentials)
+    results.append(
+        {
+            "case": "hashedNames",
+            "firstAttemptMs": milliseconds(lambda: index.check(name, "password"), 1),
+            "msPerAttempt": milliseconds(
+                lambda: index.check(name, "password"), args.attempts
+            ),
+        }
+    )
+
+    index = OperatorIndex(plainCredentials)
+    results.append(
+        {
+            "case": "plainNames",
+            "msPerAttempt": milliseconds(
+                lambda: index.check(name, "password"), args.attempts
+            ),
+        }
+    )
+
+    results.append(handlerThread(args, plainCredentials, name))
+    return results
+
+
+def handlerThread(args: BenchmarkArgs, credentials: list, name: str) -> dict:
+    server = createServer()
+    server.serverState.operatorCredentials = credentials
+    # Handlers read the credentials when they are created
+    oper = Oper(server.serverState)
+
+    blocked = 0.0
+    for i in range(args.attempts):
+        connection = connectClient(server, f"user{i}", i)
+        client = server.serverState.getClient(connection)
+        message = Message(f"OPER {name} password", client.user)
+        replied = Event()
+        connection.sendRaw = lambda data: replied.set()  # type: ignore
+
+        started = perf_counter()
+        oper.handle(client, message)
+        blocked += perf_counter() - started
+        assert replied.wait(60)
+
+    return {
+        "case": "handlerThread",
+        "msPerAttempt": round(blocked / args.attempts * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
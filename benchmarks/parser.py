@@ -0,0 +1,96 @@
+"""Measures the throughput of the message parser.
+
+Parses a mix of realistic lines (PRIVMSG with a long trailing parameter,
+JOIN, PING and a tagged PRIVMSG) with the legacy ``split(" ")`` parser and
+with Message, both from text and from the received bytes. Message decodes
+its parameters lazily, so it is measured with and without reading them.
+The legacy parser leaves the trailing parameter split into words, which
+handlers had to join back together, as legacyWithTrailingJoin does.
+"""
+from time import perf_counter
+from typing import Callable, Optional
+
+from tap import Tap
+
+from utils import printResults
+
+from lib.Message import Message
+from lib.User import User
+
+
+LINES = [
+    b":nick!user@host PRIVMSG #channel :Hello everyone, how is it going today?",
+    b"JOIN #channel,#other key",
+    b"PING :irc.example.com",
+    b"@time=2022-01-01T00:00:00.000Z;msgid=abc PRIVMSG #channel :tagged message",
+]
+
+
+class BenchmarkArgs(Tap):
+    messages: int = 1000000  # Lines parsed per variant
+
+
+class LegacyMessage:
+    """The split(" ") parser Message replaced, kept here as the baseline"""
+
+    prefix: Optional[str]
+    command: str
+    params: list[str]
+
+    def __init__(self, rawMessage: str, user: User) -> None:
+        self.rawMessage = rawMessage
+        self.user = user
+
+        messageParts = rawMessage.split(" ")
+        if messageParts[0].startswith(":"):
+            self.prefix = messageParts[0][1:]
+            self.command = messageParts[1]
+            self.params = messageParts[2:]
+        else:
+            self.prefix = None
+            self.command = messageParts[0]
+            self.params = messageParts[1:]
+
+
+def measure(lines: list, parse: Callable, messages: int) -> float:
+    batches, remainder = divmod(messages, len(lines))
+    started = perf_counter()
+    for _ in range(batches):
+        for line in lines:
+            parse(line)
+    for line in lines[:remainder]:
+        parse(line)
+    return perf_counter() - started
+
+
+def run(args: BenchmarkArgs) -> dict:
+    user = User()
+    textLines = [line.decode() for line in LINES]
+
+    variants = {
+        "legacy": (textLines, lambda line: LegacyMessage(line, user)),
+        "messageFromText": (textLines, lambda line: Message(line, user)),
+        "messageFromBytes": (LINES, lambda line: Message(line, user)),
+        "messageFromBytesWithParams": (
+            LINES,
+            lambda line: Message(line, user).params,
+        ),
+        "legacyWithTrailingJoin": (
+            textLines,
+            lambda line: " ".join(LegacyMessage(line, user).params[1:]).lstrip(":"),
+        ),
+        "legacyFromBytes": (LINES, lambda line: LegacyMessage(line.decode(), user)),
+    }
+
+    results: dict = {"messages": args.messages}
+    for name, (lines, parse) in variants.items():
+        elapsed = measure(lines, parse, args.messages)
+        results[name] = {
+            "messagesPerSecond": round(args.messages / elapsed),
+            "nanosPerMessage": round(elapsed / args.messages * 1e9, 1),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
@@ -0,0 +1,123 @@
+"""Channel persistence: recovery time at 100k channels and the cost of saving.
+
+* ``recovery``: seconds to load the latest snapshot, replay the journal tail
+  and rebuild the channels of a server, compared to replaying the whole
+  journal (``--updates`` changes per channel) without snapshots.
+* ``save``: microseconds a handler spends per saved change, with the
+  background writer (group commit) and with a write and fsync per change.
+  Entries per fsync show the batching of the writer.
+"""
+import json
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from tap import Tap
+
+from utils import printResults
+
+from server.Persistence import (
+    JOURNAL_FILE,
+    SNAPSHOT_FILE,
+    ChannelJournal,
+    JournalEntry,
+)
+from server.ServerState import ServerState
+
+
+class BenchmarkArgs(Tap):
+    channels: int = 100_000  # Saved channels
+    updates: int = 5  # Changes per channel in the journal
+    tail: int = 10_000  # Journal entries written since the last snapshot
+    saves: int = 20_000  # Changes saved by the save benchmark
+    syncedSaves: int = 500  # Changes saved with an fsync each
+
+
+class CountingJournal(ChannelJournal):
+    batches: int = 0
+
+    def _append(self, entries: list[JournalEntry]) -> None:
+        self.batches += 1
+        super()._append(entries)
+
+
+def entry(i: int, update: int) -> JournalEntry:
+    return ["channel", f"#channel{i}", f"topic {update}", None, None, 8]
+
+
+def writeLines(path: str, entries) -> None:
+    with open(path, "w") as f:
+        for e in entries:
+            f.write(json.dumps(e, separators=(",", ":")) + "\n")
+
+
+def recover(directory: str) -> tuple[float, int]:
+    """Seconds to rebuild the channels saved in a directory, and their count"""
+    started = perf_counter()
+    serverState = ServerState("127.0.0.1", 6667, [], [], "N/A")
+    serverState.restoreChannels(ChannelJournal(directory).load())
+    return perf_counter() - started, len(serverState.channels)
+
+
+def measureRecovery(args: BenchmarkArgs) -> dict:
+    with TemporaryDirectory() as snapshotted, TemporaryDirectory() as replayed:
+        writeLines(
+            os.path.join(snapshotted, SNAPSHOT_FILE),
+            (entry(i, args.updates) for i in range(args.channels)),
+        )
+        writeLines(
+            os.path.join(snapshotted, JOURNAL_FILE),
+            (entry(i % args.channels, args.updates) for i in range(args.tail)),
+        )
+        writeLines(
+            os.path.join(replayed, JOURNAL_FILE),
+            (
+                entry(i, update)
+                for update in range(args.updates + 1)
+                for i in range(args.channels)
+            ),
+        )
+
+        seconds, channels = recover(snapshotted)
+        legacySeconds, _ = recover(replayed)
+    return {
+        "case": "recovery",
+        "channels": channels,
+        "journalEntries": args.tail,
+        "seconds": round(seconds, 3),
+        "legacyJournalEntries": args.channels * (args.updates + 1),
+        "legacySeconds": round(legacySeconds, 3),
+    }
+
+
+def measureSave(args: BenchmarkArgs) -> dict:
+    with TemporaryDirectory() as directory:
+        journal = CountingJournal(directory)
+        journal.load()
+        journal.start()
+        started = perf_counter()
+        for i in range(args.saves):
+            journal.saveChannel(f"#channel{i}", "topic", None, None, 8)
+        usPerSave = (perf_counter() - started) / args.saves * 1e6
+        journal.close()
+
+        # Legacy: every change written and synced before the handler goes on
+        with open(os.path.join(directory, "synced.journal"), "ab") as f:
+            started = perf_counter()
+            for i in range(args.syncedSaves):
+                f.write(json.dumps(entry(i, 0)).encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            usPerSyncedSave = (perf_counter() - started) / args.syncedSaves * 1e6
+
+    return {
+        "case": "save",
+        "usPerSave": round(usPerSave, 3),
+        "entriesPerFsync": round(args.saves / journal.batches, 1),
+        "legacyUsPerSave": round(usPerSyncedSave, 3),
+    }
+
+
+if __name__ == "__main__":
+    args = BenchmarkArgs().parse_args()
+    printResults([measureRecovery(args), measureSave(args)])
@@ -0,0 +1,149 @@
+"""Measures the generation of numeric replies.
+
+* ``registration``: the welcome burst (001-004, LUSERS and MOTD) sent once a
+  client registers.
+* ``names``: a NAMES reply for channels of growing size.
+
+Both are compared to the legacy rendering, which formatted every reply as
+text, rebuilt the server prefix per line, concatenated the burst with ``+=``
+and encoded it when sending.
+"""
+from time import perf_counter
+
+from tap import Tap
+
+from utils import connectClient, createServer, printResults
+
+
+class BenchmarkArgs(Tap):
+    bursts: int = 20_000  # Registration bursts generated per variant
+    motdLines: int = 20  # Lines of the MOTD in the registration burst
+    sizes: list[int] = [10, 100, 500]  # Channel sizes of the NAMES replies
+    replies: int = 5_000  # NAMES replies generated per size and variant
+
+
+class LegacyReply:
+    code: str
+    text: str
+
+    def __init__(self, code: str, text: str) -> None:
+        self.code = code
+        self.text = text
+
+
+def legacyReplyNumeric(serverState, client, replies: list[LegacyReply]) -> None:
+    message = ""
+    for reply in replies:
+        message += (
+            f":{serverState.host}"
+            f" {reply.code}"
+            f" {client.user.nick}"
+            f" {reply.text}\r\n"
+        )
+    client.handler.send(message)
+
+
+def legacyWelcome(serverState, client) -> None:
+    user = client.user
+    host = client.handler.getHost()
+    clients = serverState.getClients()
+    operators = filter(lambda c: c.user.isOperator(), clients)
+    replies = [
+        LegacyReply(
+            "001",
+            ":Welcome to the Internet Relay Network"
+            f" {user.nick}!{user.username}@{host}",
+        ),
+        LegacyReply("002", f":Your host is {serverState.host}, running version 0.0.1"),
+        LegacyReply("003", f":This server was created {serverState.createdDate}"),
+        LegacyReply("004", f":{host} 0.0.1 aiwroOs OovaimnqpsrtklbeI"),
+        LegacyReply(
+            "251", f":There are {len(clients)} users and 0 services on 1 server"
+        ),
+        LegacyReply("252", f"{len(list(operators))} :operator(s) online"),
+        LegacyReply("253", f"{len(serverState.newClients)} :unknown connection(s)"),
+        LegacyReply("254", f"{len(serverState.channels)} :channels formed"),
+        LegacyReply("255", f":I have {len(clients)} clients and 0 servers"),
+        LegacyReply("375", f":- {serverState.host} Message of the day - "),
+        *[LegacyReply("372", f":- {line}") for line in serverState.motd],
+        LegacyReply("376", ":End of MOTD command"),
+    ]
+    legacyReplyNumeric(serverState, client, replies)
+
+
+def legacyNames(serverState, client, channel) -> None:
+    with channel.lock:
+        operators = [f"@{u.username}" for u in channel.members if channel.isOperator(u)]
+        users = [u.username for u in channel.members if not channel.isOperator(u)]
+    reply = LegacyReply("353", f"= {channel.name} :{' '.join(operators + users)}")
+    legacyReplyNumeric(serverState, client, [reply])
+
+
+def measure(f, count: int) -> float:
+    """Microseconds per call"""
+    started = perf_counter()
+    for _ in range(count):
+        f()
+    return round((perf_counter() - started) / count * 1e6, 2)
+
+
+def registration(args: BenchmarkArgs) -> dict:
+    server = createServer()
+    server.serverState.motd = [
+        f"line {i} of the message of the day" for i in range(args.motdLines)
+    ]
+    connection = connectClient(server, "bench")
+    client = server.serverState.getClient(connection)
+    userHandler = server.dispatcher.commands["USER"][0].__self__
+
+    connection.bytes = 0
+    userHandler.sendWelcome(client)
+    burstBytes = connection.bytes
+    connection.bytes = 0
+    legacyWelcome(server.serverState, client)
+    # Both variants render the same lines
+    assert connection.bytes == burstBytes
+    return {
+        "case": "registration",
+        "lines": 11 + args.motdLines,
+        "bytes": burstBytes,
+        "usPerReply": measure(lambda: userHandler.sendWelcome(client), args.bursts),
+        "legacyUsPerReply": measure(
+            lambda: legacyWelcome(server.serverState, client), args.bursts
+        ),
+    }
+
+
+def names(args: BenchmarkArgs) -> list[dict]:
+    results = []
+    for size in args.sizes:
+        server = createServer()
+        for i in range(size):
+            connection = connectClient(server, f"user{i}", i)
+            server.handleMessage(connection, b"JOIN #bench")
+
+        client = server.serverState.getClient(connection)
+        channel = server.serverState.channels["#bench"]
+        handler = server.dispatcher.commands["NAMES"][0].__self__
+        results.append(
+            {
+                "case": "names",
+                "members": size,
+                "usPerReply": measure(
+                    lambda: handler._streamNumeric(
+                        client, handler._names(client, channel)
+                    ),
+                    args.replies,
+                ),
+                "legacyUsPerReply": measure(
+                    lambda: legacyNames(server.serverState, client, channel),
+                    args.replies,
+                ),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    args = BenchmarkArgs().parse_args()
+    printResults([registration(args)] + names(args))
@@ -0,0 +1,109 @@
+import json
+import sys
+from pathlib import Path
+from resource import RLIMIT_NOFILE, getrlimit, setrlimit
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+
+SRC_PATH = Path(__file__).resolve().parents[1] / "src"
+
+# Benchmarks run from a checkout, make the packages under src importable
+if str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
+
+from lib.User import User  # noqa: E402
+
+if TYPE_CHECKING:
+    from server.ServerCore import ServerCore
+
+
+def raiseFileLimit() -> int:
+    """Raises the open file limit to the hard limit and returns it"""
+    soft, hard = getrlimit(RLIMIT_NOFILE)
+    if soft < hard:
+        setrlimit(RLIMIT_NOFILE, (hard, hard))
+    return getrlimit(RLIMIT_NOFILE)[0]
+
+
+def readProcessStatus(pid: int) -> dict[str, int]:
+    """Returns resident memory (bytes) and thread count of a process (Linux only)"""
+    status: dict[str, int] = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key == "VmRSS":
+                status["rssBytes"] = int(value.split()[0]) * 1024
+            elif key == "Threads":
+                status["threads"] = int(value)
+    return status
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def printResults(results: Any) -> None:
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+class NullConnection:
+    """Connection stand-in that counts what the server sends instead of writing it"""
+
+    user: Optional[User]
+    host: str
+    port: int
+    messages: int
+    bytes: int
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.user = None
+        self.host = host
+        self.port = port
+        self.messages = 0
+        self.bytes = 0
+
+    def send(self, message: str) -> None:
+        self.sendRaw(message.encode())
+
+    def sendRaw(self, data: bytes) -> None:
+        self.messages += 1
+        self.bytes += len(data)
+
+    def getClientAddress(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def getHost(self) -> str:
+        return self.host
+
+    def getPort(self) -> int:
+        return self.port
+
+    def getSendQueueSize(self) -> int:
+        return 0
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        return False
+
+    def disconnect(self, reason: str) -> None:
+        pass
+
+
+def createServer() -> "ServerCore":
+    """Returns a server core whose clients are driven in-process, without sockets"""
+    from server.ServerCore import ServerCore
+
+    return ServerCore("127.0.0.1", 6667, ["benchmark"], [], "benchmark")
+
+
+def connectClient(server: "ServerCore", nick: str, port: int = 0) -> NullConnection:
+    """Connects and registers a client with the given nick (and username)"""
+    connection = NullConnection(port=port)
+    server.handleClientConnect(connection)
+    server.handleMessage(connection, f"NICK {nick}".encode())
+    server.handleMessage(connection, f"USER {nick} 0 * :{nick}".encode())
+    return connection
@@ -0,0 +1,166 @@
+"""Channel fan-out throughput as the number of worker processes grows.
+
+For every worker count, the server runs in a separate process (with the
+worker mode when there is more than one worker) and load processes connect
+clients from their own event loops. The clients of every load process join a
+channel of their own and flood it, so the members of a channel are spread over
+the workers and every message also crosses the state bus.
+
+Scaling is bounded by the CPUs of the machine: the workers, the hub and the
+load processes share them.
+"""
+import asyncio
+import socket
+from multiprocessing import Queue, get_context
+from time import monotonic, sleep
+from typing import Any
+
+from tap import Tap
+
+from utils import percentile, printResults, raiseFileLimit
+
+from lib.logger import logger
+from loadgen import connectClients, join, measured, privmsg, register
+from server.Server import Server
+from server.Workers import runWorkers
+
+
+SERVER_START_TIMEOUT = 10
+# Time given to the workers to connect to the hub after the port is open
+WORKERS_SETTLE_TIME = 1.0
+
+
+class BenchmarkArgs(Tap):
+    workers: list[int] = [1, 2, 4]  # Worker counts to compare
+    load_processes: int = 4  # Processes connecting the clients
+    clients: int = 200  # Clients per load process
+    senders: int = 10  # Clients sending in every load process
+    messages: int = 20  # PRIVMSGs sent by every sender
+    timeout: float = 60.0  # Seconds a run may take before it is aborted
+
+
+def getFreePort() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(workers: int, port: int) -> None:
+    logger.setLevel("WARNING")
+
+    def createServer() -> Server:
+        return Server(
+            "127.0.0.1", port, ["benchmark"], [], "benchmark", reusePort=workers > 1
+        )
+
+    if workers > 1:
+        runWorkers(workers, createServer)
+        return
+
+    server = createServer()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def waitForPort(port: int) -> None:
+    deadline = monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except ConnectionRefusedError:
+            if monotonic() > deadline:
+                raise
+            sleep(0.05)
+
+
+async def flood(index: int, port: int, args: BenchmarkArgs) -> dict[str, Any]:
+    clients = await connectClients(port, args.clients)
+    for client in clients:
+        client.nick = f"p{index}u{client.index}"
+    drains = [asyncio.create_task(client.drain()) for client in clients]
+    try:
+        await register(clients)
+        channel = f"#load{index}"
+        await join(clients, [channel])
+        recorder = await measured(
+            privmsg(clients, args.senders, args.messages, channel), args
+        )
+        return {"latencies": recorder.latencies, "seconds": recorder.seconds}
+    finally:
+        for client in clients:
+            client.close()
+        for drain in drains:
+            drain.cancel()
+        await asyncio.gather(*drains, return_exceptions=True)
+
+
+def load(index: int, port: int, args: BenchmarkArgs, results: Queue) -> None:
+    raiseFileLimit()
+    try:
+        results.put(asyncio.run(flood(index, port, args)))
+    except (OSError, asyncio.TimeoutError) as e:
+        results.put({"error": repr(e)})
+
+
+def runWorkerCount(workers: int, args: BenchmarkArgs) -> dict[str, Any]:
+    context = get_context("fork")
+    port = getFreePort()
+    server = context.Process(target=serve, args=(workers, port))
+    server.start()
+
+    result: dict[str, Any] = {
+        "workers": workers,
+        "clients": args.clients * args.load_processes,
+    }
+    try:
+        waitForPort(port)
+        sleep(WORKERS_SETTLE_TIME)
+
+        results: Queue = context.Queue()
+        loads = [
+            context.Process(target=load, args=(i, port, args, results))
+            for i in range(args.load_processes)
+        ]
+        for process in loads:
+            process.start()
+        outcomes = [results.get() for _ in loads]
+        for process in loads:
+            process.join()
+    finally:
+        server.terminate()
+        server.join()
+
+    errors = [outcome["error"] for outcome in outcomes if "error" in outcome]
+    if errors:
+        return result | {"error": errors[0]}
+
+    latencies = sorted(n for outcome in outcomes for n in outcome["latencies"])
+    seconds = max(outcome["seconds"] for outcome in outcomes)
+
+    def milliseconds(fraction: float) -> float:
+        return round(percentile(latencies, fraction) / 1e6, 3)
+
+    return result | {
+        "messages": len(latencies),
+        "seconds": round(seconds, 3),
+        "messagesPerSecond": round(len(latencies) / seconds) if seconds else 0,
+        "latencyMs": {
+            "p50": milliseconds(0.5),
+            "p99": milliseconds(0.99),
+            "p999": milliseconds(0.999),
+        },
+    }
+
+
+def run(args: BenchmarkArgs) -> list[dict]:
+    raiseFileLimit()
+    return [runWorkerCount(workers, args) for workers in args.workers]
+
+
+if __name__ == "__main__":
+    printResults(run(BenchmarkArgs().parse_args()))
@@ -1,23 +1,61 @@
-from dataclasses import dataclass
+from enum import IntFlag
+from logging import DEBUG
+from threading import RLock
 from typing import Optional
 
 from .logger import logger
-from .Message import Messages
-from .User import User, Users
+from .User import User
 
 
 MAX_CHANNEL_NAME_LENGTH = 50
 VALID_CHANNEL_PREFIXES = ["&", "#", "+", "!"]
 
 
-@dataclass
-class Modes:
-    anonymous: bool = False
-    inviteOnly: bool = False
-    moderated: bool = False
-    topic: bool = False
-    userLimit: bool = False
-    channelKey: bool = False
+# https://datatracker.ietf.org/doc/html/rfc2811#section-4.2
+class Modes(IntFlag):
+    NONE = 0
+    ANONYMOUS = 1
+    INVITE_ONLY = 2
+    MODERATED = 4
+    TOPIC = 8
+    USER_LIMIT = 16
+    CHANNEL_KEY = 32
+
+
+# Letters of the modes, in the order they are shown
+MODE_LETTERS = (
+    (Modes.ANONYMOUS, "a"),
+    (Modes.INVITE_ONLY, "i"),
+    (Modes.MODERATED, "m"),
+    (Modes.TOPIC, "t"),
+    (Modes.USER_LIMIT, "l"),
+    (Modes.CHANNEL_KEY, "k"),
+)
+
+
+# Status of a member in the channel
+class MemberFlags(IntFlag):
+    NONE = 0
+    OPERATOR = 1
+    VOICE = 2
+
+
+# Prefixes of the member's name in NAMES, the highest status first
+# https://datatracker.ietf.org/doc/html/rfc2812#section-5.1 (RPL_NAMREPLY)
+MEMBER_PREFIXES = ((MemberFlags.OPERATOR, "@"), (MemberFlags.VOICE, "+"))
+
+
+# Prefix of every combination of flags, looked up once per name in NAMES
+_memberPrefixes = {
+    MemberFlags(value): next(
+        (prefix for flag, prefix in MEMBER_PREFIXES if value & flag), ""
+    )
+    for value in range(max(MemberFlags) * 2)
+}
+
+
+def getMemberPrefix(flags: MemberFlags) -> str:
+    return _memberPrefixes[flags]
 
 
 class ChannelNameTooLong(Exception):
@@ -44,129 +82,162 @@ log = logger.getChild("Channel")
 
 
 # https://datatracker.ietf.org/doc/html/rfc1459#section-1.3
+#
+# Membership changes hold the channel's lock, so handler threads working on
+# different channels never wait for each other. A closed channel has been
+# removed from the server and must not be joined anymore. Slotted, with its
+# modes in a single bitfield.
 class Channel:
+    __slots__ = (
+        "name",
+        "members",
+        "modes",
+        "topic",
+        "key",
+        "userLimit",
+        "lock",
+        "closed",
+        "serial",
+    )
+
     name: str
-    users: Users
-    operators: Users
-    messages: Messages
+    # Members by identity, a client reconnecting with the same username is
+    # another user. Iterate under the lock, without copying.
+    members: dict[User, MemberFlags]
     modes: Modes
     topic: Optional[str]
     key: Optional[str]
     userLimit: Optional[int]
+    lock: RLock
+    closed: bool
+    # Order of creation among the channels of a server, set by its registry
+    serial: int
 
-    def __init__(self, name: str, creator: User, key: Optional[str] = None):
+    def __init__(self, name: str, creator: Optional[User], key: Optional[str] = None):
         if len(name) > MAX_CHANNEL_NAME_LENGTH:
             raise ChannelNameTooLong(f"Channel name too long: {name}")
         if not name[0] in VALID_CHANNEL_PREFIXES:
             raise InvalidChannelPrefix(f"Invalid channel prefix: {name}")
 
-        self.users = {}
-        self.operators = {}
-        self.messages = []
-        self.modes = Modes()
+        self.members = {}
+        self.modes = Modes.NONE
         self.topic = None
         self.key = None
         self.userLimit = None
+        self.lock = RLock()
+        self.closed = False
+        self.serial = 0
 
         self.name = name
-        self.addOperator(creator)
+        # Restored channels are created without members
+        if creator:
+            self.addOperator(creator)
         if key:
             self.setKey(key)
 
-    def getUsers(self) -> Users:
-        return self.users
-
-    def getOperators(self) -> Users:
-        return self.operators
+    def getMemberCount(self) -> int:
+        return len(self.members)
 
-    def getAllUsers(self) -> Users:
-        return self.users | self.operators
+    def getMemberFlags(self, user: User) -> Optional[MemberFlags]:
+        """The member's flags, None if the user is not in the channel"""
+        return self.members.get(user)
 
     def isOperator(self, user: User) -> bool:
-        return user.username in self.operators
+        return bool(self.members.get(user, MemberFlags.NONE) & MemberFlags.OPERATOR)
 
     def setKey(self, key: str) -> None:
         self.key = key
-        self.modes.channelKey = True
+        self.modes |= Modes.CHANNEL_KEY
 
     def removeKey(self) -> None:
         self.key = None
-        self.modes.channelKey = False
+        self.modes &= ~Modes.CHANNEL_KEY
 
     def setTopic(self, topic: str) -> None:
         self.topic = topic
 
-    def addUser(self, user: User) -> None:
-        if user.username in self.users:
-            raise UserAlreadyInChannel()
-        elif user.username:
-            log.info(f"Adding user {user.nick} to channel {self.name}")
-            self.users[user.username] = user
-        else:
-            raise NoUsername(user)
+    def hasUser(self, user: User) -> bool:
+        return user in self.members
+
+    def addUser(self, user: User, flags: MemberFlags = MemberFlags.NONE) -> None:
+        with self.lock:
+            if user in self.members:
+                raise UserAlreadyInChannel()
+            elif user.username:
+                if log.isEnabledFor(DEBUG):
+                    log.debug(f"Adding user {user.nick} to channel {self.name}")
+                self.members[user] = flags
+                user.channels[self.name] = self
+            else:
+                raise NoUsername(user)
 
     def removeUser(self, user: User) -> None:
-        if user.username in self.users:
-            assert user.username is not None
-            log.info(f"Removing user {user.nick} from channel {self.name}")
-            del self.users[user.username]
-        elif user.username in self.operators:
-            self.removeOperator(user)
-        else:
-            raise NoUserInChannel(user)
+        """Removes the user from the channel, operator or not"""
+        with self.lock:
+            if user not in self.members:
+                raise NoUserInChannel(user)
+            if log.isEnabledFor(DEBUG):
+                log.debug(f"Removing user {user.nick} from channel {self.name}")
+            del self.members[user]
+            del user.channels[self.name]
 
     def addOperator(self, user: User) -> None:
-        if user.username in self.operators:
-            raise UserAlreadyInChannel()
-        elif user.username:
-            log.info(f"Adding operator {user.nick} to channel {self.name}")
-            self.operators[user.username] = user
-        else:
-            raise NoUsername(user)
+        """Makes a member operator, or adds the user as operator (its creator)"""
+        with self.lock:
+            if user not in self.members:
+                self.addUser(user, MemberFlags.OPERATOR)
+            elif self.members[user] & MemberFlags.OPERATOR:
+                raise UserAlreadyInChannel()
+            else:
+                self.setMemberFlag(user, MemberFlags.OPERATOR, True)
 
     def removeOperator(self, user: User) -> None:
-        if user.username in self.operators:
-            assert user.username is not None
-            log.info(f"Removing operator {user.nick} from channel {self.name}")
-            del self.operators[user.username]
-        else:
-            raise NoUserInChannel(user)
+        """Takes operator status from a member, who stays in the channel"""
+        with self.lock:
+            if not self.isOperator(user):
+                raise NoUserInChannel(user)
+            self.setMemberFlag(user, MemberFlags.OPERATOR, False)
+
+    def setMemberFlag(self, user: User, flag: MemberFlags, enabled: bool) -> None:
+        with self.lock:
+            if user not in self.members:
+                raise NoUserInChannel(user)
+            if log.isEnabledFor(DEBUG):
+                change = "Setting" if enabled else "Clearing"
+                log.debug(f"{change} {flag!r} of {user.nick} in {self.name}")
+            if enabled:
+                self.members[user] |= flag
+            else:
+                self.members[user] &= ~flag
 
     def setAnonymous(self, anonymous: bool) -> None:
-        self.modes.anonymous = anonymous
+        self._setMode(Modes.ANONYMOUS, anonymous)
 
     def setInviteOnly(self, inviteOnly: bool) -> None:
-        self.modes.inviteOnly = inviteOnly
+        self._setMode(Modes.INVITE_ONLY, inviteOnly)
 
     def setModerated(self, moderated: bool) -> None:
-        self.modes.moderated = moderated
+        self._setMode(Modes.MODERATED, moderated)
 
     def setTopicRestrict(self, restrict: bool) -> None:
-        self.modes.topic = restrict
+        self._setMode(Modes.TOPIC, restrict)
 
     def setUserLimit(self, limit: int) -> None:
         self.userLimit = limit
-        self.modes.userLimit = True
+        self.modes |= Modes.USER_LIMIT
 
     def removeUserLimit(self) -> None:
         self.userLimit = None
-        self.modes.userLimit = False
+        self.modes &= ~Modes.USER_LIMIT
 
     def getSimpleModes(self) -> str:
-        modes = ""
-        if self.modes.anonymous:
-            modes += "a"
-        if self.modes.inviteOnly:
-            modes += "i"
-        if self.modes.moderated:
-            modes += "m"
-        if self.modes.topic:
-            modes += "t"
-        if self.modes.userLimit:
-            modes += "l"
-        if self.modes.channelKey:
-            modes += "k"
-        return modes
+        return "".join(letter for mode, letter in MODE_LETTERS if self.modes & mode)
+
+    def _setMode(self, mode: Modes, enabled: bool) -> None:
+        if enabled:
+            self.modes |= mode
+        else:
+            self.modes &= ~mode
 
 
 Channels = dict[str, Channel]
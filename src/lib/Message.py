@@ -1,37 +1,162 @@
-from typing import Optional
+from typing import Optional, Union
 
 from .User import User
 
 
+# RFC 2812 allows 15 parameters, the 15th takes the rest of the line
+MAX_MIDDLE_PARAMS = 14
+
+SPACE = 0x20
+
+# https://ircv3.net/specs/extensions/message-tags#escaping-values
+_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def _unescapeTagValue(value: str) -> str:
+    if "\\" not in value:
+        return value
+
+    unescaped = []
+    escaping = False
+    for char in value:
+        if escaping:
+            unescaped.append(_TAG_ESCAPES.get(char, char))
+            escaping = False
+        elif char == "\\":
+            escaping = True
+        else:
+            unescaped.append(char)
+    return "".join(unescaped)
+
+
 # https://datatracker.ietf.org/doc/html/rfc1459#section-2.3
+# https://ircv3.net/specs/extensions/message-tags
+#
+# The line is parsed from its bytes without decoding it. The command is decoded
+# right away since every message is dispatched on it, everything else is only
+# decoded when first accessed.
 class Message:
-    rawMessage: str
-    prefix: Optional[str]
     command: str
-    params: list[str]
     user: User
 
-    def __init__(self, rawMessage: str, user: User):
-        self.prefix = None
-        self.params = []
+    _data: bytes
+    _middleSpan: tuple[int, int]
 
-        self.rawMessage = rawMessage
-        self.user = user
+    # Class level defaults, parsing only sets what the line has
+    _tagsSpan: Optional[tuple[int, int]] = None
+    _prefixSpan: Optional[tuple[int, int]] = None
+    _trailingStart: Optional[int] = None
+    _params: Optional[list[str]] = None
+    _tags: Optional[dict[str, str]] = None
 
-        self._parseRawMessage()
+    def __init__(self, rawMessage: Union[str, bytes], user: User):
+        """Parses a line, as text or as received without its line ending"""
+        data = rawMessage.encode() if isinstance(rawMessage, str) else rawMessage
+        self.user = user
+        self._data = data
 
-    def _parseRawMessage(self):
-        messageParts = self.rawMessage.split(" ")
+        position = 0
+        if data[:1] in b"@:":
+            position = self._parseTagsAndPrefix()
 
-        # The first part of the message is the prefix
-        if messageParts[0].startswith(":"):
-            self.prefix = messageParts[0][1:]
-            self.command = messageParts[1]
-            self.params = messageParts[2:]
+        # Trailing parameter: the rest of the line after " :", spaces included
+        end = len(data)
+        middleEnd = data.find(b" :", position)
+        if middleEnd == -1:
+            middleEnd = end
         else:
-            self.prefix = None
-            self.command = messageParts[0]
-            self.params = messageParts[1:]
+            self._trailingStart = middleEnd + 2
+
+        commandEnd = data.find(b" ", position, middleEnd)
+        if commandEnd == -1:
+            commandEnd = middleEnd
+        self.command = data[position:commandEnd].decode("ascii", "replace").upper()
+        self._middleSpan = (commandEnd + 1, middleEnd)
+
+    def _parseTagsAndPrefix(self) -> int:
+        """Records the tags and prefix spans, returns where the command starts"""
+        data = self._data
+        end = len(data)
+        position = 0
+        if data[:1] == b"@":
+            position = _findSpace(data, 0, end)
+            self._tagsSpan = (1, position)
+            position = _skipSpaces(data, position, end)
+
+        if data[position : position + 1] == b":":
+            prefixEnd = _findSpace(data, position, end)
+            self._prefixSpan = (position + 1, prefixEnd)
+            position = _skipSpaces(data, prefixEnd, end)
+        return position
+
+    def _decode(self, start: int, end: int) -> str:
+        return self._data[start:end].decode("utf-8", "replace")
+
+    # Decoded on first access and cached. These are plain properties rather
+    # than cached_property, which takes a lock on every first access.
+    @property
+    def params(self) -> list[str]:
+        if self._params is None:
+            data = self._data
+            start, end = self._middleSpan
+            params = data[start:end].decode("utf-8", "replace").split(" ")
+            if "" in params:
+                # Runs of spaces between parameters
+                params = [param for param in params if param]
+
+            trailingStart = self._trailingStart
+            if len(params) > MAX_MIDDLE_PARAMS:
+                # The 15th parameter takes the rest of the line even without a colon
+                params = params[:MAX_MIDDLE_PARAMS]
+                trailingStart = self._findLastParam()
+            if trailingStart is not None:
+                params.append(data[trailingStart:].decode("utf-8", "replace"))
+            self._params = params
+        return self._params
+
+    def _findLastParam(self) -> int:
+        data = self._data
+        position, end = self._middleSpan
+        position = _skipSpaces(data, position, end)
+        for _ in range(MAX_MIDDLE_PARAMS):
+            position = _skipSpaces(data, _findSpace(data, position, end), end)
+        return position
+
+    @property
+    def prefix(self) -> Optional[str]:
+        if self._prefixSpan is None:
+            return None
+        return self._decode(*self._prefixSpan)
+
+    @property
+    def tags(self) -> dict[str, str]:
+        if self._tags is None:
+            self._tags = {}
+            if self._tagsSpan is not None:
+                for tag in self._decode(*self._tagsSpan).split(";"):
+                    if tag:
+                        key, _, value = tag.partition("=")
+                        self._tags[key] = _unescapeTagValue(value)
+        return self._tags
+
+    @property
+    def rawMessage(self) -> str:
+        return self._data.decode("utf-8", "replace")
+
+    def __len__(self) -> int:
+        """Length of the line in bytes, without its line ending"""
+        return len(self._data)
+
+
+def _findSpace(data: bytes, start: int, end: int) -> int:
+    position = data.find(b" ", start, end)
+    return end if position == -1 else position
+
+
+def _skipSpaces(data: bytes, start: int, end: int) -> int:
+    while start < end and data[start] == SPACE:
+        start += 1
+    return start
 
 
 Messages = list[Message]
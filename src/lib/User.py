@@ -1,29 +1,58 @@
-from dataclasses import dataclass
-from typing import Optional
+from enum import IntFlag
+from typing import TYPE_CHECKING, Optional
+
+
+if TYPE_CHECKING:
+    from .Channel import Channels
+
 
 MAX_NICK_LENGTH = 9
 
+# https://datatracker.ietf.org/doc/html/rfc1459#section-2.2
+# {}| are the lower case equivalents of []\, ~ is the lower case of ^
+_RFC1459_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\^", "abcdefghijklmnopqrstuvwxyz{}|~"
+)
+
+
+def ircLower(text: str) -> str:
+    """Lower cases a nick (or channel name) using the RFC 1459 casemapping"""
+    return text.translate(_RFC1459_LOWER)
 
-@dataclass
-class Modes:
-    away: bool = False
-    invisible: bool = False
-    operator: bool = False
 
+# https://datatracker.ietf.org/doc/html/rfc2812#section-3.1.5
+class Modes(IntFlag):
+    NONE = 0
+    AWAY = 1
+    INVISIBLE = 2
+    OPERATOR = 4
 
+
+# Letters of the modes, in the order they are shown
+MODE_LETTERS = ((Modes.AWAY, "a"), (Modes.INVISIBLE, "i"), (Modes.OPERATOR, "o"))
+
+
+# Slotted, with its modes in a single bitfield: a server keeps one per client
+# of the whole network
 class User:
+    __slots__ = ("password", "nick", "username", "realname", "modes", "channels")
+
     password: Optional[str]
     nick: str
     username: Optional[str]
     realname: Optional[str]
     modes: Modes
+    # Channels the user is in, maintained by Channel under its lock. Iterate
+    # over a copy, other channels may change it at the same time.
+    channels: "Channels"
 
     def __init__(self):
         self.password = None
         self.nick = "*"
         self.username = None
         self.realname = None
-        self.modes = Modes()
+        self.modes = Modes.NONE
+        self.channels = {}
 
     def setNick(self, nick: str) -> None:
         if len(nick) > MAX_NICK_LENGTH:
@@ -31,32 +60,31 @@ class User:
         self.nick = nick
 
     def getModes(self) -> str:
-        modes = ""
-        if self.isAway():
-            modes += "a"
-        if self.isInvisible():
-            modes += "i"
-        if self.isOperator():
-            modes += "o"
-        return modes
+        return "".join(letter for mode, letter in MODE_LETTERS if self.modes & mode)
 
     def isAway(self) -> bool:
-        return self.modes.away
+        return bool(self.modes & Modes.AWAY)
 
     def setAway(self, away: bool) -> None:
-        self.modes.away = away
+        self._setMode(Modes.AWAY, away)
 
     def isInvisible(self) -> bool:
-        return self.modes.invisible
+        return bool(self.modes & Modes.INVISIBLE)
 
     def setInvisible(self, invisible: bool) -> None:
-        self.modes.invisible = invisible
+        self._setMode(Modes.INVISIBLE, invisible)
 
     def isOperator(self) -> bool:
-        return self.modes.operator
+        return bool(self.modes & Modes.OPERATOR)
 
     def setOperator(self, operator: bool) -> None:
-        self.modes.operator = operator
+        self._setMode(Modes.OPERATOR, operator)
+
+    def _setMode(self, mode: Modes, enabled: bool) -> None:
+        if enabled:
+            self.modes |= mode
+        else:
+            self.modes &= ~mode
 
 
 Users = dict[str, User]
@@ -1,6 +1,12 @@
+import atexit
+import os
 from colorama import init, Fore, Back
 from enum import Enum
-from logging import FileHandler, Formatter, StreamHandler, getLogger
+from logging import FileHandler, Formatter, LogRecord, StreamHandler, getLogger
+from logging.handlers import QueueHandler
+from queue import Empty, SimpleQueue
+from threading import Event, Lock, Thread
+from typing import Optional, Union
 
 init(autoreset=True)
 
@@ -14,6 +20,7 @@ class LogLevel(Enum):
 
 
 FILE_FORMATTER = Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+_EXCEPTION_FORMATTER = Formatter()
 
 LOG_FORMATTER = Formatter(
     f"{Fore.CYAN}%(asctime)s "
@@ -22,15 +29,151 @@ LOG_FORMATTER = Formatter(
     f"{Fore.YELLOW} %(message)s"
 )
 
+# Records written by the log writer before it flushes its streams
+MAX_BATCH_SIZE = 512
+
+
+# Writes the records of the logger from a background thread, so the threads
+# logging never block on the terminal or the disk. Records queued meanwhile are
+# written in one batch, with a single flush per stream. The thread starts with
+# the first record, so importing the logger starts nothing.
+class LogWriter:
+    handlers: list[StreamHandler]
+    queue: "SimpleQueue[Union[LogRecord, Event, None]]"
+    thread: Optional[Thread]
+    stopped: bool
+    lock: Lock
+
+    def __init__(self) -> None:
+        self.handlers = []
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.stopped = False
+        self.lock = Lock()
+
+    def put(self, record: LogRecord) -> None:
+        if self.stopped:
+            # Nothing left to write them once stopped, written in place
+            self._writeRecords([record])
+            return
+        if self.thread is None:
+            self.start()
+        self.queue.put(record)
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self._write, name="log-writer", daemon=True)
+                self.thread.start()
+
+    def stop(self) -> None:
+        """Writes out the queued records and ends the thread"""
+        with self.lock:
+            self.stopped = True
+            thread = self.thread
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join()
+
+    def reset(self) -> None:
+        # Only the thread that forked survives in the child, the records queued
+        # in the parent are its to write
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.stopped = False
+        self.lock = Lock()
+
+    def flush(self) -> None:
+        """Blocks until every record logged so far is written"""
+        if self.thread is not None and self.thread.is_alive():
+            flushed = Event()
+            self.queue.put(flushed)
+            flushed.wait()
+
+    def _write(self) -> None:
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < MAX_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            self._writeRecords([r for r in batch if isinstance(r, LogRecord)])
+
+            for item in batch:
+                if isinstance(item, Event):
+                    item.set()
+                elif item is None:
+                    running = False
+
+    def _writeRecords(self, records: list[LogRecord]) -> None:
+        for handler in self.handlers:
+            self._writeBatch(handler, records)
+
+    def _writeBatch(self, handler: StreamHandler, records: list[LogRecord]) -> None:
+        lines = []
+        for record in records:
+            if record.levelno >= handler.level and handler.filter(record):
+                try:
+                    lines.append(handler.format(record) + handler.terminator)
+                except Exception:
+                    handler.handleError(record)
+        if lines:
+            handler.acquire()
+            try:
+                handler.stream.write("".join(lines))
+                handler.stream.flush()
+            except Exception:
+                handler.handleError(records[-1])
+            finally:
+                handler.release()
+
+
+# Formats the message in the logging thread, but leaves the rest to the writer
+class LogQueueHandler(QueueHandler):
+    writer: LogWriter
+
+    def __init__(self, writer: LogWriter) -> None:
+        super().__init__(writer.queue)
+        self.writer = writer
+
+    def enqueue(self, record: LogRecord) -> None:
+        self.writer.put(record)
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # The record is not copied, it stays valid for the handlers of the
+        # parent loggers
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        return record
+
+
+writer = LogWriter()
+queueHandler = LogQueueHandler(writer)
+
 stdOut = StreamHandler()
 # TODO: Use colored formatter only for CLI output
 # stdOut.setFormatter(LOG_FORMATTER)
+writer.handlers.append(stdOut)
 
 logger = getLogger("irc")
-logger.addHandler(stdOut)
+logger.addHandler(queueHandler)
+
+
+os.register_at_fork(after_in_child=writer.reset)
+atexit.register(writer.stop)
+
+
+def stopLogs() -> None:
+    """Writes out pending records, for processes exiting without atexit"""
+    writer.stop()
 
 
 def setLogFile(path: str) -> None:
     fileHandler = FileHandler(path)
     fileHandler.setFormatter(FILE_FORMATTER)
-    logger.addHandler(fileHandler)
+    writer.handlers.append(fileHandler)
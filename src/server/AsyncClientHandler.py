@@ -0,0 +1,192 @@
+from asyncio import AbstractEventLoop, BaseTransport, Protocol, TimerHandle, Transport
+from logging import DEBUG
+from threading import get_ident
+from typing import TYPE_CHECKING, Callable, Optional, cast
+
+from lib.logger import logger
+from lib.User import User
+
+from .SendQueue import DRAIN_MARK
+
+
+if TYPE_CHECKING:
+    from .AsyncServer import AsyncServer
+
+
+log = logger.getChild("server.AsyncClientHandler")
+
+
+# Longest line accepted before the connection is dropped, a generous bound
+# over the 512 bytes allowed by https://datatracker.ietf.org/doc/html/rfc1459#section-2.3
+MAX_LINE_LENGTH = 8192
+
+
+# Callback-based counterpart of ClientHandler for the asyncio engine. Using a
+# Protocol instead of streams avoids a task and a reader per connection, which
+# keeps idle connections cheap.
+class AsyncClientHandler(Protocol):
+    user: Optional[User]
+    server: "AsyncServer"
+    loop: AbstractEventLoop
+    transport: Optional[Transport]
+    client_address: tuple[str, int]
+    buffer: bytes
+    # Set while flood control delays the client's lines
+    resumeHandle: Optional[TimerHandle]
+    # Output sent during the current iteration of the event loop
+    pending: list[bytes]
+    pendingSize: int
+    # Set while the transport buffers more than DRAIN_MARK
+    writingPaused: bool
+    drainCallbacks: list[Callable[[], None]]
+
+    def __init__(self, server: "AsyncServer", loop: AbstractEventLoop) -> None:
+        self.user = None
+        self.server = server
+        self.loop = loop
+        self.transport = None
+        self.client_address = ("", 0)
+        self.buffer = b""
+        self.resumeHandle = None
+        self.pending = []
+        self.pendingSize = 0
+        self.writingPaused = False
+        self.drainCallbacks = []
+
+    def connection_made(self, transport: BaseTransport) -> None:
+        self.transport = cast(Transport, transport)
+        self.client_address = self.transport.get_extra_info("peername")[:2]
+        # Writing is paused (and resumed) around the mark replies wait for
+        self.transport.set_write_buffer_limits(high=DRAIN_MARK)
+
+        log.debug(f"New connection from {self.getClientAddress()}")
+
+        self.server.handleClientConnect(self)
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        if not self.resumeHandle:
+            self._handleLines()
+
+    def _handleLines(self) -> None:
+        lines = self.buffer.split(b"\n")
+        self.buffer = lines.pop()
+
+        for i, rawLine in enumerate(lines):
+            line = rawLine.rstrip(b"\r")
+            if len(line) > 0:
+                if log.isEnabledFor(DEBUG):
+                    log.debug(f"{self.getClientAddress()} wrote: {repr(line)}")
+                delay = self.server.handleMessage(self, line)
+                if delay and self.transport:
+                    # Flood control: keeps the remaining lines and stops reading
+                    # until the client may send again
+                    self.buffer = b"\n".join(lines[i + 1 :] + [self.buffer])
+                    self.transport.pause_reading()
+                    self.resumeHandle = self.loop.call_later(delay, self._resume)
+                    return
+
+        if len(self.buffer) > MAX_LINE_LENGTH:
+            log.debug(f"Line from {self.getClientAddress()} too long, closing")
+            self.close()
+
+    def _resume(self) -> None:
+        self.resumeHandle = None
+        if self.transport and not self.transport.is_closing():
+            self.transport.resume_reading()
+            self._handleLines()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        log.debug(f"Connection from {self.getClientAddress()} closed")
+        if self.resumeHandle:
+            self.resumeHandle.cancel()
+            self.resumeHandle = None
+        self.drainCallbacks = []
+        self.server.handleClientDisconnect(self)
+        self.transport = None
+
+    def send(self, message: str) -> None:
+        self.sendRaw(message.encode())
+
+    def sendRaw(self, data: bytes) -> None:
+        if get_ident() != self.server.loopThread:
+            # Handlers running outside the event loop must not touch the transport
+            self.loop.call_soon_threadsafe(self.sendRaw, data)
+            return
+
+        if self.transport and not self.transport.is_closing():
+            if not self.pending:
+                # Everything sent to the connection during this iteration of the
+                # event loop is written at once, at the end of the iteration
+                self.loop.call_soon(self._flush)
+            self.pending.append(data)
+            self.pendingSize += len(data)
+            metrics = self.server.serverState.metrics
+            metrics.bytesOut += len(data)
+            if self.getSendQueueSize() > self.server.sendQueueLimit:
+                metrics.sendQueueExceeded += 1
+                self.disconnect("SendQ exceeded")
+                return
+            if log.isEnabledFor(DEBUG):
+                log.debug(f"Server wrote to {self.getClientAddress()}: {repr(data)}")
+
+    def _flush(self) -> None:
+        pending = self.pending
+        self.pending = []
+        self.pendingSize = 0
+        if pending and self.transport and not self.transport.is_closing():
+            # The transport buffers whatever the socket does not accept right
+            # away, which makes it this connection's send queue
+            self.transport.writelines(pending)
+            self.server.serverState.metrics.socketWrites += 1
+            if self.drainCallbacks and not self.writingPaused:
+                self.loop.call_soon(self._notifyDrained)
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        if not self.transport or self.transport.is_closing():
+            return True
+        if self.getSendQueueSize() <= DRAIN_MARK:
+            return False
+        # Called once the pending output is handed to the transport, or once
+        # the transport resumes writing if that fills it
+        self.drainCallbacks.append(callback)
+        return True
+
+    def pause_writing(self) -> None:
+        self.writingPaused = True
+
+    def resume_writing(self) -> None:
+        self.writingPaused = False
+        self._notifyDrained()
+
+    def _notifyDrained(self) -> None:
+        if self.writingPaused or not self.transport or self.transport.is_closing():
+            return
+        callbacks = self.drainCallbacks
+        self.drainCallbacks = []
+        for callback in callbacks:
+            callback()
+
+    def disconnect(self, reason: str) -> None:
+        log.info(f"Disconnecting {self.getClientAddress()}: {reason}")
+        if self.transport:
+            self.transport.abort()
+
+    def close(self) -> None:
+        if self.transport:
+            self._flush()
+            self.transport.close()
+
+    def getClientAddress(self) -> str:
+        return f"{self.getHost()}:{self.getPort()}"
+
+    def getHost(self) -> str:
+        return self.client_address[0]
+
+    def getPort(self) -> int:
+        return self.client_address[1]
+
+    def getSendQueueSize(self) -> int:
+        if self.transport:
+            return self.transport.get_write_buffer_size() + self.pendingSize
+        return 0
@@ -0,0 +1,128 @@
+from asyncio import AbstractEventLoop, Event as AsyncEvent, get_running_loop, run, sleep
+from socket import create_server, socket
+from threading import Event, get_ident
+from typing import Optional
+
+from lib.logger import logger
+
+from .AsyncClientHandler import AsyncClientHandler
+from .Connection import Connection
+from .ServerCore import ServerCore, LISTEN_BACKLOG
+from .FloodControl import FloodLimits
+from .SendQueue import DEFAULT_SEND_QUEUE_LIMIT
+from .ServerState import MOTD, OperatorCredentials
+
+
+log = logger.getChild("server.AsyncServer")
+
+
+# Single-threaded alternative to Server: every connection is served by one
+# asyncio event loop instead of a dedicated thread
+class AsyncServer(ServerCore):
+    started: bool
+    socket: socket
+    loop: Optional[AbstractEventLoop]
+    loopThread: Optional[int]
+    connections: set[Connection]
+
+    _stopRequested: Optional[AsyncEvent]
+    _ready: Event
+    _stopped: Event
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        motd: Optional[MOTD] = [],
+        operatorCredentials: Optional[OperatorCredentials] = [],
+        createdDate: Optional[str] = None,
+        sendQueueLimit: int = DEFAULT_SEND_QUEUE_LIMIT,
+        reusePort: bool = False,
+        floodLimits: Optional[FloodLimits] = None,
+    ) -> None:
+        # Bind eagerly so the address (and any ephemeral port) is known up front
+        self.socket = create_server(
+            (host, port), backlog=LISTEN_BACKLOG, reuse_port=reusePort
+        )
+
+        host = self.socket.getsockname()[0]
+        port = self.socket.getsockname()[1]
+
+        super().__init__(
+            host,
+            port,
+            motd,
+            operatorCredentials,
+            createdDate,
+            sendQueueLimit,
+            floodLimits,
+        )
+        self.started = False
+        self.loop = None
+        self.loopThread = None
+        self.connections = set()
+
+        self._stopRequested = None
+        self._ready = Event()
+        self._stopped = Event()
+
+    def start(self) -> None:
+        if not self.started:
+            self.started = True
+            self._ready.clear()
+            self._stopped.clear()
+            log.info(
+                f"Server listening on {self.serverState.host}:{self.serverState.port}"
+            )
+            try:
+                run(self._serve())
+            finally:
+                self._ready.set()
+                self._stopped.set()
+
+    def stop(self) -> None:
+        if self.started:
+            # start() may have been called from another thread that is still
+            # setting up the event loop
+            self._ready.wait()
+            if self.loop and self._stopRequested:
+                self.loop.call_soon_threadsafe(self._stopRequested.set)
+                if get_ident() != self.loopThread:
+                    self._stopped.wait()
+        else:
+            self.socket.close()
+        self.started = False
+        log.info("Server stopped")
+
+    async def _serve(self) -> None:
+        self.loop = get_running_loop()
+        self.loopThread = get_ident()
+        self._stopRequested = AsyncEvent()
+
+        server = await self.loop.create_server(
+            self._createHandler, sock=self.socket, backlog=LISTEN_BACKLOG
+        )
+        self._ready.set()
+        async with server:
+            await self._stopRequested.wait()
+
+            for connection in list(self.connections):
+                assert isinstance(connection, AsyncClientHandler)
+                connection.close()
+            # Let the closed connections run their disconnect callbacks
+            await sleep(0)
+
+        self.loop = None
+        self._stopRequested = None
+
+    def _createHandler(self) -> AsyncClientHandler:
+        assert self.loop is not None
+        return AsyncClientHandler(self, self.loop)
+
+    def handleClientConnect(self, handler: Connection) -> None:
+        self.connections.add(handler)
+        super().handleClientConnect(handler)
+
+    def handleClientDisconnect(self, handler: Connection) -> None:
+        self.connections.discard(handler)
+        super().handleClientDisconnect(handler)
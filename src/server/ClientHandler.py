@@ -1,9 +1,16 @@
+from logging import DEBUG
+from socket import IPPROTO_TCP, SHUT_RDWR, TCP_NODELAY
 from socketserver import StreamRequestHandler
-from typing import TYPE_CHECKING, Optional
+from threading import Thread
+from time import sleep
+from typing import TYPE_CHECKING, Callable, Optional
 
 from lib.logger import logger
 from lib.User import User
 
+from .Metrics import Metrics
+from .SendQueue import SendQueue, SendQueueExceeded
+
 
 if TYPE_CHECKING:
     from .Server import Server
@@ -12,8 +19,17 @@ if TYPE_CHECKING:
 log = logger.getChild("server.ClientHandler")
 
 
+# Time given to the writer to flush pending output once the client is gone
+WRITER_FLUSH_TIMEOUT = 5
+# Buffers given to a single sendmsg, within the IOV_MAX of Linux and the BSDs
+MAX_WRITE_BUFFERS = 1024
+
+
 class ClientHandler(StreamRequestHandler):
     user: Optional[User]
+    sendQueue: SendQueue
+    writer: Thread
+    metrics: Metrics
 
     # Inherited from StreamRequestHandler
     server: "Server"
@@ -21,6 +37,19 @@ class ClientHandler(StreamRequestHandler):
     def setup(self) -> None:
         super().setup()
         self.user = None
+        self.metrics = self.server.serverState.metrics
+
+        # The writer coalesces output, lines written alone must not wait for
+        # the acknowledgement of the previous ones (Nagle's algorithm)
+        self.request.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+
+        # Output is written by a dedicated thread so a slow client never blocks
+        # the thread of whoever is sending to it
+        self.sendQueue = SendQueue(self.server.sendQueueLimit)
+        self.writer = Thread(
+            target=self._write, name=f"writer-{self.getClientAddress()}", daemon=True
+        )
+        self.writer.start()
 
         log.debug(f"New connection from {self.getClientAddress()}")
 
@@ -29,26 +58,89 @@ class ClientHandler(StreamRequestHandler):
     def handle(self) -> None:
         while True:
             try:
-                line = self.rfile.readline().strip().decode()
+                line = self.rfile.readline()
+                if not line:
+                    break
 
+                line = line.rstrip(b"\r\n")
                 if len(line) > 0:
-                    log.debug(f"{self.getClientAddress()} wrote: {repr(line)}")
-                    self.server.handleMessage(self, line)
-                else:
-                    break
+                    if log.isEnabledFor(DEBUG):
+                        log.debug(f"{self.getClientAddress()} wrote: {repr(line)}")
+                    delay = self.server.handleMessage(self, line)
+                    if delay:
+                        # Flood control: the next lines wait in the socket
+                        # buffers, a client sending more is eventually blocked
+                        sleep(delay)
             except ConnectionResetError:
                 break
 
     def send(self, message: str) -> None:
-        self.wfile.write(message.encode())
-        self.wfile.flush()
-        # fsync(self.wfile.fileno())
-        log.debug(f"Server wrote to {self.getClientAddress()}: {repr(message)}")
+        self.sendRaw(message.encode())
+
+    def sendRaw(self, data: bytes) -> None:
+        try:
+            self.sendQueue.push(data)
+        except SendQueueExceeded:
+            self.metrics.sendQueueExceeded += 1
+            self.disconnect("SendQ exceeded")
+            return
+        self.metrics.bytesOut += len(data)
+        if log.isEnabledFor(DEBUG):
+            log.debug(f"Server wrote to {self.getClientAddress()}: {repr(data)}")
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        return self.sendQueue.whenDrained(callback)
+
+    def disconnect(self, reason: str) -> None:
+        log.info(f"Disconnecting {self.getClientAddress()}: {reason}")
+        self.sendQueue.close()
+        try:
+            # Wakes up the reader (and a blocked writer), which then cleans up
+            self.request.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _write(self) -> None:
+        while True:
+            chunks = self.sendQueue.pop()
+            if chunks is None:
+                break
+            try:
+                self._writeChunks(chunks)
+            except OSError:
+                break
+            try:
+                # Replies paused for the client to catch up continue from here
+                self.sendQueue.notifyDrained()
+            except Exception:
+                log.exception(f"Failed to resume output to {self.getClientAddress()}")
+
+    def _writeChunks(self, chunks: list[bytes]) -> None:
+        # Everything queued since the writer last woke up goes out in one
+        # vectored write, without copying the chunks into a single buffer
+        while chunks:
+            sent = self.request.sendmsg(chunks[:MAX_WRITE_BUFFERS])
+            self.metrics.socketWrites += 1
+
+            written = 0
+            while written < len(chunks) and sent >= len(chunks[written]):
+                sent -= len(chunks[written])
+                written += 1
+            chunks = chunks[written:]
+            if sent:
+                # A partial write stopped within this chunk
+                chunks[0] = chunks[0][sent:]
 
     def finish(self) -> None:
         log.debug(f"Connection from {self.getClientAddress()} closed")
         self.server.handleClientDisconnect(self)
 
+        self.sendQueue.close()
+        self.writer.join(WRITER_FLUSH_TIMEOUT)
+        if self.writer.is_alive():
+            self.disconnect("Timed out flushing output")
+            self.writer.join()
+
         super().finish()
 
     def getClientAddress(self) -> str:
@@ -59,3 +151,6 @@ class ClientHandler(StreamRequestHandler):
 
     def getPort(self) -> int:
         return self.client_address[1]
+
+    def getSendQueueSize(self) -> int:
+        return len(self.sendQueue)
@@ -0,0 +1,38 @@
+from typing import Callable, Optional, Protocol
+
+from lib.User import User
+
+
+# The interface the server state and message handlers need from a client
+# connection, independent of the engine (threaded or asyncio) serving it
+class Connection(Protocol):
+    user: Optional[User]
+
+    def send(self, message: str) -> None:
+        ...
+
+    def sendRaw(self, data: bytes) -> None:
+        ...
+
+    def getClientAddress(self) -> str:
+        ...
+
+    def getHost(self) -> str:
+        ...
+
+    def getPort(self) -> int:
+        ...
+
+    def getSendQueueSize(self) -> int:
+        """Bytes waiting to be written to the client"""
+        ...
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        """Calls callback, possibly from another thread, once the pending output
+        falls under DRAIN_MARK and returns True, or returns False if it already
+        is. The callback is dropped if the connection closes meanwhile."""
+        ...
+
+    def disconnect(self, reason: str) -> None:
+        """Closes the connection, its client is removed once it is closed"""
+        ...
@@ -0,0 +1,50 @@
+from time import perf_counter_ns
+from typing import Callable
+
+from lib.Message import Message
+
+from .Metrics import CommandStats
+from .Profiler import SlowLog
+from .ServerState import ServerState, Client
+from .MessageHandlers.handlers import HANDLERS
+
+
+Command = Callable[[Client, Message], None]
+
+
+# Routes messages to the handler of their command. Every handler is created
+# once and its bound handle method is looked up per message, so dispatching a
+# message allocates nothing but its timing.
+class Dispatcher:
+    commands: dict[str, tuple[Command, CommandStats]]
+    slowLog: SlowLog
+
+    def __init__(self, serverState: ServerState) -> None:
+        self.commands = {}
+        self.slowLog = serverState.profiler.slowLog
+        for command, Handler in HANDLERS.items():
+            self.commands[command] = (
+                Handler(serverState).handle,
+                serverState.metrics.getCommandStats(command),
+            )
+
+    def dispatch(self, client: Client, message: Message) -> bool:
+        """Handles the message, returns False if its command is unknown"""
+        entry = self.commands.get(message.command)
+        if entry is None:
+            return False
+
+        command, stats = entry
+        started = perf_counter_ns()
+        try:
+            command(client, message)
+        finally:
+            elapsed = perf_counter_ns() - started
+            stats.observe(elapsed)
+            stats.bytes += len(message)
+            if elapsed > self.slowLog.threshold:
+                self.slowLog.record(elapsed, message)
+        return True
+
+    def getStats(self) -> dict[str, CommandStats]:
+        return {command: stats for command, (_, stats) in self.commands.items()}
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+from lib.Message import Message
+
+
+if TYPE_CHECKING:
+    from .ServerState import ServerState
+
+
+# Tokens a line costs, by command
+DEFAULT_COMMAND_COST = 1.0
+COMMAND_COSTS = {
+    "PING": 0.5,
+    "PONG": 0.5,
+    "JOIN": 2.0,
+    "PART": 2.0,
+    "NICK": 2.0,
+    "NAMES": 2.0,
+    "MOTD": 2.0,
+    "LUSERS": 2.0,
+    "STATS": 2.0,
+    "USERS": 2.0,
+    "LIST": 5.0,
+    "CHATHISTORY": 5.0,
+}
+# A message to a channel costs one more token per this many members
+MEMBERS_PER_TOKEN = 50
+
+DEFAULT_FLOOD_RATE = 2.0
+DEFAULT_FLOOD_BURST = 20.0
+DEFAULT_FLOOD_TIMEOUT = 10.0
+
+
+@dataclass
+class FloodLimits:
+    # Tokens given back per second
+    rate: float = DEFAULT_FLOOD_RATE
+    # Tokens a client starts with and can save up
+    burst: float = DEFAULT_FLOOD_BURST
+    # Seconds a client may stay throttled before being disconnected
+    timeout: float = DEFAULT_FLOOD_TIMEOUT
+
+
+class ExcessFlood(Exception):
+    pass
+
+
+# Flood control of a client, in the style of the ircd penalty clocks: a line
+# may take more tokens than the client has, the reader then waits for the debt
+# to be paid back before reading the next line
+class TokenBucket:
+    limits: FloodLimits
+    tokens: float
+    updated: float
+    # Since when every line of the client had to wait, if they do
+    throttledSince: Optional[float]
+    # Set once the client flooded, until it is disconnected
+    exceeded: bool
+
+    def __init__(self, limits: FloodLimits, now: float) -> None:
+        self.limits = limits
+        self.tokens = limits.burst
+        self.updated = now
+        self.throttledSince = None
+        self.exceeded = False
+
+    def charge(self, cost: float, now: float) -> float:
+        """Takes the tokens of a line, returns the seconds to wait before
+        reading the next one. Raises ExcessFlood once the client stayed
+        throttled for longer than the timeout."""
+        limits = self.limits
+        tokens = min(limits.burst, self.tokens + (now - self.updated) * limits.rate)
+        # Waiting for a single line is bounded by the time to refill the bucket
+        cost = min(cost, limits.burst)
+
+        if tokens >= cost:
+            self.throttledSince = None
+        elif self.throttledSince is None:
+            self.throttledSince = now
+        elif now - self.throttledSince > limits.timeout:
+            self.exceeded = True
+            raise ExcessFlood(now - self.throttledSince)
+
+        self.tokens = tokens - cost
+        self.updated = now
+        return -self.tokens / limits.rate if self.tokens < 0 else 0.0
+
+
+def getCommandCost(serverState: "ServerState", message: Message) -> float:
+    cost = COMMAND_COSTS.get(message.command, DEFAULT_COMMAND_COST)
+    if message.command in ("PRIVMSG", "NOTICE") and message.params:
+        targets = message.params[0].split(",")
+        cost += len(targets) - 1
+        for target in targets:
+            channel = serverState.getChannel(target)
+            if channel:
+                # Read without the channel's lock, an estimate is enough
+                cost += channel.getMemberCount() / MEMBERS_PER_TOKEN
+    return cost
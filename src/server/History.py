@@ -0,0 +1,251 @@
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from time import time_ns
+from typing import Optional
+
+from lib.Channel import Channel
+from lib.logger import logger
+
+
+log = logger.getChild("server.History")
+
+
+# Messages kept per channel
+DEFAULT_HISTORY_LINES = 1000
+# Bytes of history kept for all the channels together
+DEFAULT_HISTORY_BUDGET = 64 * 1024 * 1024
+# Bytes an entry takes besides its line: the bytes object, its reference and
+# its timestamp
+ENTRY_OVERHEAD = 49
+
+# A message of the history: its time in milliseconds since the epoch and the
+# line sent to the members, with its line ending
+HistoryEntry = tuple[int, bytes]
+
+
+# Recent messages of a channel, oldest first, in a ring of at most capacity
+# entries: once full, a new message replaces the oldest one. Timestamps never
+# decrease, so messages are found by time with a binary search.
+class ChannelHistory:
+    __slots__ = (
+        "capacity",
+        "timestamps",
+        "lines",
+        "start",
+        "size",
+        "last",
+        "usedBytes",
+    )
+
+    capacity: int
+    # Parallel rings, timestamps packed as 64-bit integers
+    timestamps: array
+    lines: list[bytes]
+    # Ring index of the oldest entry
+    start: int
+    size: int
+    # Timestamp of the latest entry
+    last: int
+    # Bytes taken by the entries, counted with ENTRY_OVERHEAD
+    usedBytes: int
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.timestamps = array("q")
+        self.lines = []
+        self.start = 0
+        self.size = 0
+        self.last = 0
+        self.usedBytes = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, timestamp: int, line: bytes) -> int:
+        """Adds a message, returns the change of bytes taken"""
+        # The clock may go back, the ring stays sorted
+        if self.size and timestamp < self.last:
+            timestamp = self.last
+        self.last = timestamp
+        added = len(line) + ENTRY_OVERHEAD
+        lines = self.lines
+        size = self.size
+
+        if size == self.capacity:
+            # Full, the oldest entry is replaced
+            start = self.start
+            freed = len(lines[start]) + ENTRY_OVERHEAD
+            lines[start] = line
+            self.timestamps[start] = timestamp
+            self.start = (start + 1) % size
+            self.usedBytes += added - freed
+            return added - freed
+
+        if size < len(lines):
+            # Reuses a slot freed by dropOldest
+            index = (self.start + size) % len(lines)
+            lines[index] = line
+            self.timestamps[index] = timestamp
+        else:
+            if self.start:
+                # Grows from its end only, rotate entries dropped from the start
+                self.timestamps = (
+                    self.timestamps[self.start :] + self.timestamps[: self.start]
+                )
+                self.lines = lines = lines[self.start :] + lines[: self.start]
+                self.start = 0
+            lines.append(line)
+            self.timestamps.append(timestamp)
+        self.size = size + 1
+        self.usedBytes += added
+        return added
+
+    def dropOldest(self, count: int) -> int:
+        """Drops up to count messages, returns the bytes freed"""
+        freed = 0
+        for _ in range(min(count, self.size)):
+            freed += self._dropOldest()
+        return freed
+
+    def clear(self) -> int:
+        """Drops every message, returns the bytes freed"""
+        freed = self.usedBytes
+        self.timestamps = array("q")
+        self.lines = []
+        self.start = self.size = self.usedBytes = 0
+        return freed
+
+    def latest(self, limit: int, after: Optional[int] = None) -> list[HistoryEntry]:
+        """The last limit messages, only those after a time if given"""
+        first = self.size - limit
+        if after is not None:
+            first = max(first, self._bisect(after, True))
+        return self._slice(first, self.size)
+
+    def before(self, timestamp: int, limit: int) -> list[HistoryEntry]:
+        """The limit messages preceding a time"""
+        end = self._bisect(timestamp, False)
+        return self._slice(end - limit, end)
+
+    def after(self, timestamp: int, limit: int) -> list[HistoryEntry]:
+        """The limit messages following a time"""
+        start = self._bisect(timestamp, True)
+        return self._slice(start, start + limit)
+
+    def _index(self, position: int) -> int:
+        """Ring index of the entry at a position, 0 being the oldest"""
+        return (self.start + position) % len(self.lines)
+
+    def _dropOldest(self) -> int:
+        line = self.lines[self.start]
+        # Frees the line, the slot is reused by a later append
+        self.lines[self.start] = b""
+        self.start = (self.start + 1) % len(self.lines)
+        self.size -= 1
+
+        freed = len(line) + ENTRY_OVERHEAD
+        self.usedBytes -= freed
+        return freed
+
+    def _bisect(self, timestamp: int, right: bool) -> int:
+        """Position of the first entry after timestamp if right, else of the
+        first entry at or after it"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            entry = self.timestamps[self._index(middle)]
+            if entry < timestamp or (right and entry == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _slice(self, start: int, end: int) -> list[HistoryEntry]:
+        start, end = max(start, 0), min(end, self.size)
+        entries = []
+        for position in range(start, end):
+            index = self._index(position)
+            entries.append((self.timestamps[index], self.lines[index]))
+        return entries
+
+
+# History of every channel, within a global budget: past it, the channels that
+# had a message least recently lose their history first. A single lock guards
+# every channel's history, its sections are short and never take other locks.
+class History:
+    capacity: int
+    budget: int
+    # Histories by channel, the least recently active first
+    channels: OrderedDict[Channel, ChannelHistory]
+    usedBytes: int
+    lock: Lock
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_HISTORY_LINES,
+        budget: int = DEFAULT_HISTORY_BUDGET,
+    ) -> None:
+        self.capacity = capacity
+        self.budget = budget
+        self.channels = OrderedDict()
+        self.usedBytes = 0
+        self.lock = Lock()
+
+    def record(self, channel: Channel, line: bytes) -> None:
+        """Keeps a message sent to a channel, call with the channel's lock
+        held so that the history follows the order of delivery"""
+        if self.capacity <= 0:
+            return
+
+        timestamp = time_ns() // 1_000_000
+        with self.lock:
+            history = self.channels.get(channel)
+            if history is None:
+                history = self.channels[channel] = ChannelHistory(self.capacity)
+            else:
+                self.channels.move_to_end(channel)
+            self.usedBytes += history.append(timestamp, line)
+            if self.usedBytes > self.budget:
+                self._evict(history)
+
+    def discard(self, channel: Channel) -> None:
+        """Forgets the history of a deleted channel"""
+        with self.lock:
+            history = self.channels.pop(channel, None)
+            if history is not None:
+                self.usedBytes -= history.usedBytes
+
+    def latest(
+        self, channel: Channel, limit: int, after: Optional[int] = None
+    ) -> list[HistoryEntry]:
+        with self.lock:
+            history = self.channels.get(channel)
+            return history.latest(limit, after) if history is not None else []
+
+    def before(
+        self, channel: Channel, timestamp: int, limit: int
+    ) -> list[HistoryEntry]:
+        with self.lock:
+            history = self.channels.get(channel)
+            return history.before(timestamp, limit) if history is not None else []
+
+    def after(self, channel: Channel, timestamp: int, limit: int) -> list[HistoryEntry]:
+        with self.lock:
+            history = self.channels.get(channel)
+            return history.after(timestamp, limit) if history is not None else []
+
+    def _evict(self, recorded: ChannelHistory) -> None:
+        while self.usedBytes > self.budget:
+            channel, history = next(iter(self.channels.items()))
+            if history is recorded:
+                # The only history left, it keeps its latest messages
+                freed = history.dropOldest(1)
+                if not freed:
+                    return
+                self.usedBytes -= freed
+                continue
+
+            log.debug(f"Evicting the history of {channel.name}")
+            self.usedBytes -= history.clear()
+            del self.channels[channel]
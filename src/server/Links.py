@@ -0,0 +1,888 @@
+import hmac
+from dataclasses import dataclass
+from queue import Empty, SimpleQueue
+from socket import (
+    IPPROTO_TCP,
+    SHUT_RDWR,
+    TCP_NODELAY,
+    create_connection,
+    create_server,
+    socket,
+)
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Callable, Iterable, Iterator, Optional
+
+from lib.Channel import MODE_LETTERS, Channel, MemberFlags
+from lib.logger import logger
+from lib.Message import Message
+from lib.User import User
+
+from .ServerState import Client, ServerState
+from .StateBus import BusEvent, RemoteConnection, Route, isRemote
+
+
+log = logger.getChild("server.Links")
+
+
+# https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.1
+PROTOCOL_VERSION = "0210"
+PROTOCOL_FLAGS = "IRC|"
+DEFAULT_SERVER_INFO = "IRC server"
+
+# Time given to a new link to register, then to reconnect a lost link
+REGISTER_TIMEOUT = 30
+RECONNECT_DELAY = 5
+# Lines written at once by the writer of a link
+MAX_BATCH_SIZE = 1024
+# Bytes of nicks in an NJOIN line, within the 512 bytes of a line
+MAX_NJOIN_NICKS_LENGTH = 400
+
+_CHANNEL_MODES = {letter: mode for mode, letter in MODE_LETTERS}
+
+Command = Callable[["ServerLink", Message, bytes], None]
+
+
+# A client of a linked server. Its route is the link to the next server toward
+# it, on the spanning tree formed by the links.
+class LinkedConnection(RemoteConnection):
+    route: "ServerLink"
+    # Server the client is connected to, and how many links away it is
+    server: str
+    hopcount: int
+
+    def __init__(
+        self, link: "ServerLink", username: str, host: str, server: str, hopcount: int
+    ) -> None:
+        super().__init__(link, username, host)
+        self.server = server
+        self.hopcount = hopcount
+
+
+def isLinked(connection: object, link: "ServerLink") -> bool:
+    """Whether the connection is that of a client behind the link"""
+    return isinstance(connection, LinkedConnection) and connection.route is link
+
+
+# A server of the network, other than this one
+@dataclass(slots=True)
+class LinkedServer:
+    name: str
+    hopcount: int
+    info: str
+    # Server it is linked to, on the side of this one
+    uplink: str
+    # Link toward it
+    link: "ServerLink"
+
+
+# A connection to a directly linked server. Lines are queued and written by a
+# dedicated thread, so a slow peer never stalls the handlers sending to it.
+class ServerLink:
+    sock: socket
+    address: str
+    # Whether this server opened the link
+    outgoing: bool
+    # Name of the peer once the link is registered
+    name: Optional[str]
+    password: Optional[str]
+    queue: "SimpleQueue[Optional[bytes]]"
+    # Messages of peers have no user, they are parsed with this one
+    user: User
+    registeredAt: float
+    # Set once the burst of the peer is received
+    synced: Event
+
+    def __init__(self, sock: socket, address: str, outgoing: bool) -> None:
+        self.sock = sock
+        self.address = address
+        self.outgoing = outgoing
+        self.name = None
+        self.password = None
+        self.queue = SimpleQueue()
+        self.user = User()
+        self.registeredAt = 0.0
+        self.synced = Event()
+        Thread(
+            target=self._write, name=f"link-writer-{self.address}", daemon=True
+        ).start()
+
+    def send(self, line: str) -> None:
+        self.queue.put(f"{line}\r\n".encode())
+
+    def sendRaw(self, data: bytes) -> None:
+        self.queue.put(data)
+
+    # Route of the clients behind the link: messages are passed on as they
+    # are, the peer finds their recipients from the message
+    def deliver(self, username: str, data: bytes) -> None:
+        self.sendRaw(data)
+
+    def relay(self, channel: Channel, data: bytes, history: bool) -> None:
+        self.sendRaw(data)
+
+    def close(self) -> None:
+        self.queue.put(None)
+        try:
+            # Wakes up the reader, which then drops the link
+            self.sock.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _write(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < MAX_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            chunks = []
+            for data in batch:
+                if data is None:
+                    stopping = True
+                    break
+                chunks.append(data)
+            try:
+                self.sock.sendall(b"".join(chunks))
+            except OSError:
+                self.close()
+                break
+        self.sock.close()
+
+
+# Links this server to others, RFC 2813 style: servers form a spanning tree,
+# each one bursts its servers, clients and channels to a new peer and then
+# passes on the changes it makes or receives.
+#
+# Linked clients are kept in serverState like the clients of other workers
+# (see StateBus), so handlers see the whole network. The peers receive the
+# events of ServerState.publish as server messages. Messages sent to channels
+# and clients are relayed as their members receive them, prefixed with the
+# sender's nick!user@host: a channel's messages only go to the links with
+# members behind them, and on to the next links from there.
+#
+# Adaptations of RFC 2813: servers are named where it uses tokens (NICK),
+# there is no end of burst message, a PING after the burst is answered once
+# the peer has applied it. Clients are also keyed by username in serverState:
+# a client whose nick or username is already taken is killed, like both
+# clients of a nick collision.
+class ServerLinks:
+    serverState: ServerState
+    name: str
+    password: str
+    info: str
+    # Other servers of the network, by name
+    servers: dict[str, "LinkedServer"]
+    # Registered links, replaced rather than changed so that publishing reads
+    # them without a lock
+    links: tuple[ServerLink, ...]
+    # Every open link, registered or not
+    connections: set[ServerLink]
+    # Clients of linked servers
+    linkedUsers: int
+    # Nick of every local client as the peers know it, for the prefix of its
+    # NICK and QUIT messages
+    nicks: dict[str, str]
+    listener: Optional[socket]
+    stopped: Event
+    commands: dict[str, Command]
+    registrationCommands: dict[str, Command]
+    # Guards servers, links, connections and linkedUsers
+    lock: Lock
+
+    def __init__(
+        self,
+        serverState: ServerState,
+        name: str,
+        password: str,
+        info: str = DEFAULT_SERVER_INFO,
+    ) -> None:
+        self.serverState = serverState
+        self.name = name
+        self.password = password
+        self.info = info
+        self.servers = {}
+        self.links = ()
+        self.connections = set()
+        self.linkedUsers = 0
+        self.nicks = {}
+        self.listener = None
+        self.stopped = Event()
+        self.lock = Lock()
+        self.registrationCommands = {
+            "PASS": self._pass,
+            "SERVER": self._register,
+            "ERROR": self._error,
+        }
+        self.commands = {
+            "SERVER": self._server,
+            "SQUIT": self._squit,
+            "NICK": self._nick,
+            "QUIT": self._quit,
+            "KILL": self._kill,
+            "NJOIN": self._njoin,
+            "JOIN": self._join,
+            "PART": self._part,
+            "KICK": self._kick,
+            "MODE": self._mode,
+            "TOPIC": self._topic,
+            "PING": self._ping,
+            "PONG": self._pong,
+            "ERROR": self._error,
+        }
+        serverState.links = self
+
+    def listen(self, host: str, port: int) -> int:
+        """Accepts links from other servers, returns the port listened on"""
+        listener = create_server((host, port))
+        self.listener = listener
+        Thread(target=self._accept, name="link-listener", daemon=True).start()
+        port = listener.getsockname()[1]
+        log.info(f"Accepting server links on {host}:{port}")
+        return port
+
+    def connect(self, host: str, port: int) -> None:
+        """Links to a server, again whenever the link is lost"""
+        Thread(
+            target=self._connect, args=(host, port), name="link-connector", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.listener:
+            try:
+                # Wakes up the accepting thread
+                self.listener.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+        with self.lock:
+            connections = list(self.connections)
+        for link in connections:
+            link.close()
+
+    def _accept(self) -> None:
+        assert self.listener is not None
+        while True:
+            try:
+                sock, (host, port, *_) = self.listener.accept()
+            except OSError:
+                break
+            Thread(
+                target=self._serve,
+                args=(sock, f"{host}:{port}", False),
+                name="link",
+                daemon=True,
+            ).start()
+
+    def _connect(self, host: str, port: int) -> None:
+        while not self.stopped.is_set():
+            try:
+                sock = create_connection((host, port), REGISTER_TIMEOUT)
+            except OSError as e:
+                log.warning(f"Could not link to {host}:{port}: {e}")
+            else:
+                self._serve(sock, f"{host}:{port}", True)
+            self.stopped.wait(RECONNECT_DELAY)
+
+    def _serve(self, sock: socket, address: str, outgoing: bool) -> None:
+        sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        sock.settimeout(REGISTER_TIMEOUT)
+        link = ServerLink(sock, address, outgoing)
+        with self.lock:
+            self.connections.add(link)
+        if self.stopped.is_set():
+            link.close()
+        if outgoing:
+            self._sendRegistration(link)
+
+        reason = "Connection closed"
+        try:
+            for line in sock.makefile("rb"):
+                line = line.rstrip(b"\r\n")
+                if line:
+                    self._handle(link, line)
+        except OSError as e:
+            reason = str(e) or type(e).__name__
+        finally:
+            self._drop(link, reason)
+
+    def _sendRegistration(self, link: ServerLink) -> None:
+        link.send(f"PASS {self.password} {PROTOCOL_VERSION} {PROTOCOL_FLAGS}")
+        link.send(f"SERVER {self.name} 1 :{self.info}")
+
+    def _handle(self, link: ServerLink, line: bytes) -> None:
+        message = Message(line, link.user)
+        prefix = message.prefix
+        if link.name is None:
+            command = self.registrationCommands.get(message.command)
+        elif prefix and "!" in prefix:
+            command = self._relay
+        else:
+            command = self.commands.get(message.command)
+
+        if command is None:
+            log.debug(f"Ignoring {message.command} from {link.name or link.address}")
+            return
+        try:
+            command(link, message, line + b"\r\n")
+        except Exception:
+            log.exception(f"Failed to handle {message.rawMessage} from {link.name}")
+
+    def _drop(self, link: ServerLink, reason: str) -> None:
+        link.close()
+        with self.lock:
+            self.connections.discard(link)
+            registered = link in self.links
+            if registered:
+                self.links = tuple(other for other in self.links if other is not link)
+                lost = {s.name for s in self.servers.values() if s.link is link}
+                for name in lost:
+                    del self.servers[name]
+        if not registered:
+            return
+
+        log.warning(f"Lost the link to {link.name}: {reason}")
+        self._removeUsers(lost)
+        self._forward(link, f":{self.name} SQUIT {link.name} :{reason}\r\n".encode())
+
+    def _forward(self, source: Optional[ServerLink], data: bytes) -> None:
+        """Sends a message to every registered link but the one it came from"""
+        for link in self.links:
+            if link is not source:
+                link.sendRaw(data)
+
+    def _broadcast(self, lines: Iterable[str]) -> None:
+        data = "".join(f"{line}\r\n" for line in lines).encode()
+        if data:
+            self._forward(None, data)
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.1
+    def _pass(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if message.params:
+            link.password = message.params[0]
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.2
+    def _register(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if len(message.params) < 2:
+            return
+        name = message.params[0]
+        info = message.params[-1]
+        password = (link.password or "").encode()
+        if not hmac.compare_digest(password, self.password.encode()):
+            log.warning(f"Refusing the link from {link.address}: bad password")
+            self._close(link, "Bad password")
+            return
+
+        with self.lock:
+            known = name == self.name or name in self.servers
+            if not known:
+                if not link.outgoing:
+                    self._sendRegistration(link)
+                link.name = name
+                link.registeredAt = perf_counter()
+                self.servers[name] = LinkedServer(name, 1, info, self.name, link)
+                # Registered first: the changes made during the burst reach the
+                # peer, some of them twice, rather than not at all
+                self.links += (link,)
+        if known:
+            # https://datatracker.ietf.org/doc/html/rfc2813#section-5.6
+            log.warning(f"Refusing the link to {name}: already on the network")
+            self._close(link, f"Server {name} already exists")
+            return
+
+        link.sock.settimeout(None)
+        log.info(f"Linked to {name} ({link.address})")
+        self._forward(link, f":{self.name} SERVER {name} 2 :{info}\r\n".encode())
+        self._burst(link)
+
+    def _close(self, link: ServerLink, reason: str) -> None:
+        link.send(f"ERROR :{reason}")
+        link.close()
+
+    def _burst(self, link: ServerLink) -> None:
+        """Sends the servers, clients and channels of the network to a new
+        peer, then a PING answered once the peer has applied them"""
+        started = perf_counter()
+        with self.lock:
+            # Ordered by distance, every server follows its uplink
+            servers = sorted(
+                (s for s in self.servers.values() if s.link is not link),
+                key=lambda server: server.hopcount,
+            )
+        for server in servers:
+            link.send(
+                f":{server.uplink} SERVER {server.name}"
+                f" {server.hopcount + 1} :{server.info}"
+            )
+
+        state = self.serverState
+        # Queued under the registry's lock: a change of a client made meanwhile
+        # (NICK, QUIT) is published after its introduction
+        with state.lock:
+            introductions = [
+                self._introduce(client)
+                for client in state.clients.values()
+                if not isLinked(client.handler, link)
+            ]
+            link.sendRaw("".join(introductions).encode())
+
+        for channel in state.getChannels():
+            # Under the channel's lock, for the same reason (JOIN, PART)
+            with channel.lock:
+                if channel.closed:
+                    continue
+                lines = list(self._renderChannel(channel, link))
+                if not lines:
+                    continue
+                if channel.modes:
+                    modes = _renderModes(channel)
+                    lines.append(f":{self.name} MODE {channel.name} {modes}\r\n")
+                if channel.topic:
+                    topic = channel.topic
+                    lines.append(f":{self.name} TOPIC {channel.name} :{topic}\r\n")
+                link.sendRaw("".join(lines).encode())
+
+        link.send(f"PING :{self.name}")
+        log.info(
+            f"Sent the burst of {len(introductions)} clients to {link.name}"
+            f" in {(perf_counter() - started) * 1000:.1f} ms"
+        )
+
+    def _introduce(self, client: Client) -> str:
+        # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.3
+        user = client.user
+        handler = client.handler
+        if isinstance(handler, LinkedConnection):
+            hopcount, server = handler.hopcount + 1, handler.server
+        else:
+            hopcount, server = 1, self.name
+        modes = "+i" if user.isInvisible() else "+"
+        return (
+            f"NICK {user.nick} {hopcount} {user.username} {handler.getHost()}"
+            f" {server} {modes} :{user.realname or ''}\r\n"
+        )
+
+    def _renderChannel(self, channel: Channel, link: ServerLink) -> Iterator[str]:
+        # https://datatracker.ietf.org/doc/html/rfc2813#section-4.2.2
+        clients = self.serverState.clients
+        head = f":{self.name} NJOIN {channel.name} :"
+        nicks: list[str] = []
+        length = 0
+        for user, flags in channel.members.items():
+            assert user.username is not None
+            client = clients.get(user.username)
+            if client is None or isLinked(client.handler, link):
+                continue
+            nick = ("@" if flags & MemberFlags.OPERATOR else "") + user.nick
+            nicks.append(nick)
+            length += len(nick) + 1
+            if length > MAX_NJOIN_NICKS_LENGTH:
+                yield head + ",".join(nicks) + "\r\n"
+                nicks = []
+                length = 0
+        if nicks:
+            yield head + ",".join(nicks) + "\r\n"
+
+    def publish(self, event: BusEvent) -> None:
+        """Passes a local change on to the linked servers"""
+        kind = event[0]
+        state = self.serverState
+        lines: list[str] = []
+        if kind == "register":
+            _, username, nick, _, _, _ = event
+            self.nicks[username] = nick
+            client = state.clients.get(username)
+            if client:
+                lines.append(self._introduce(client).rstrip("\r\n"))
+        elif kind == "nick":
+            _, username, nick = event
+            previousNick = self.nicks.get(username)
+            self.nicks[username] = nick
+            if previousNick:
+                lines.append(f":{previousNick} NICK {nick}")
+        elif kind == "quit":
+            nick = self.nicks.pop(event[1], None)
+            if nick:
+                lines.append(f":{nick} QUIT :Quit")
+        elif kind in ("join", "part", "op"):
+            client = state.clients.get(event[1])
+            if client is None:
+                return
+            nick, channelName = client.user.nick, event[2]
+            if kind == "join":
+                lines.append(f":{nick} JOIN {channelName}")
+            elif kind == "op":
+                sign = "+" if event[3] else "-"
+                lines.append(f":{self.name} MODE {channelName} {sign}o {nick}")
+            elif isRemote(client.handler):
+                # Only kicked, the client's own server removes it too
+                lines.append(f":{self.name} KICK {channelName} {nick}")
+            else:
+                lines.append(f":{nick} PART {channelName}")
+        elif kind == "channel":
+            channel = state.getChannel(event[1])
+            if channel:
+                lines.append(
+                    f":{self.name} MODE {channel.name} {_renderModes(channel)}"
+                )
+                lines.append(
+                    f":{self.name} TOPIC {channel.name} :{channel.topic or ''}"
+                )
+        # Channel messages go through the routes of their members instead,
+        # and every server has its own MOTD
+        self._broadcast(lines)
+
+    def _getLinkedClient(
+        self, link: ServerLink, nick: Optional[str]
+    ) -> Optional[Client]:
+        """The client using the nick, if it is behind the link"""
+        client = self.serverState.getClientFromNick(nick) if nick else None
+        if client and isLinked(client.handler, link):
+            return client
+        return None
+
+    def _removeUser(self, client: Client) -> None:
+        self.serverState.removeUser(client.handler)
+        with self.lock:
+            self.linkedUsers -= 1
+
+    def _removeUsers(self, servers: set[str]) -> None:
+        """Removes the clients of servers that left the network"""
+        for client in self.serverState.getClients():
+            handler = client.handler
+            if isinstance(handler, LinkedConnection) and handler.server in servers:
+                self._removeUser(client)
+
+    # Relayed messages, sent to the local recipients and on to the links
+    # toward the others
+    def _relay(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if not message.params:
+            return
+        state = self.serverState
+        target = message.params[0]
+        channel = state.getChannel(target)
+        if channel is None:
+            client = state.getClientFromNick(target)
+            if client and not isLinked(client.handler, link):
+                client.handler.sendRaw(data)
+            return
+
+        clients = state.clients
+        routes: set[Route] = set()
+        with channel.lock:
+            for user in channel.members:
+                assert user.username is not None
+                client = clients.get(user.username)
+                if client is None:
+                    continue
+                handler = client.handler
+                if isRemote(handler):
+                    if handler.route is not link:
+                        routes.add(handler.route)
+                else:
+                    handler.sendRaw(data)
+            history = message.command == "PRIVMSG"
+            if history:
+                state.history.record(channel, data)
+            for route in routes:
+                route.relay(channel, data, history)
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.2
+    def _server(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if len(message.params) < 3 or not message.prefix:
+            return
+        name, hopcount, info = (
+            message.params[0],
+            int(message.params[1]),
+            message.params[-1],
+        )
+        with self.lock:
+            known = name == self.name or name in self.servers
+            if not known:
+                self.servers[name] = LinkedServer(
+                    name, hopcount, info, message.prefix, link
+                )
+        if known:
+            # A loop: the link closes the cycle, it is dropped
+            log.warning(f"{link.name} introduced {name}, already on the network")
+            self._close(link, f"Server {name} already exists")
+            return
+
+        log.info(f"{name} joined the network behind {link.name}")
+        self._forward(
+            link,
+            f":{message.prefix} SERVER {name} {hopcount + 1} :{info}\r\n".encode(),
+        )
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.6
+    def _squit(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if not message.params:
+            return
+        name = message.params[0]
+        with self.lock:
+            server = self.servers.get(name)
+            if server is None or server.link is not link:
+                return
+            # The server and every server behind it
+            lost = {name}
+            while True:
+                behind = {
+                    s.name
+                    for s in self.servers.values()
+                    if s.uplink in lost and s.name not in lost
+                }
+                if not behind:
+                    break
+                lost |= behind
+            for lostName in lost:
+                del self.servers[lostName]
+
+        log.warning(f"{name} left the network")
+        self._removeUsers(lost)
+        self._forward(link, data)
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.3
+    def _nick(self, link: ServerLink, message: Message, data: bytes) -> None:
+        params = message.params
+        if len(params) >= 7:
+            self._addUser(link, params)
+            return
+        client = self._getLinkedClient(link, message.prefix)
+        if client is None or not params:
+            return
+
+        nick = params[0]
+        try:
+            changed = self.serverState.renameRemoteClient(client, nick)
+        except ValueError:
+            changed = False
+        if changed:
+            self._forward(link, data)
+            return
+
+        # A nick collision, the client is killed
+        log.warning(f"Nick collision on {nick}, killing it")
+        link.send(f"KILL {nick} :{self.name} (Nick collision)")
+        self._removeUser(client)
+        self._forward(link, f":{message.prefix} QUIT :Nick collision\r\n".encode())
+
+    def _addUser(self, link: ServerLink, params: list[str]) -> None:
+        nick, hopcount, username, host, server, modes, realname = params[:7]
+        existing = self.serverState.getClientFromNick(nick)
+        if (
+            existing
+            and isLinked(existing.handler, link)
+            and existing.user.username == username
+        ):
+            # Both in the burst and announced by the peer meanwhile
+            return
+
+        user = User()
+        user.username = username
+        user.realname = realname
+        user.setInvisible("i" in modes)
+        connection = LinkedConnection(link, username, host, server, int(hopcount))
+        connection.user = user
+        try:
+            user.setNick(nick)
+            added = self.serverState.addRemoteClient(Client(connection, user))
+        except ValueError:
+            added = False
+        if not added:
+            # https://datatracker.ietf.org/doc/html/rfc2813#section-5.2
+            log.warning(f"Nick or username of {nick}!{username} taken, killing it")
+            link.send(f"KILL {nick} :{self.name} (Nick collision)")
+            return
+
+        with self.lock:
+            self.linkedUsers += 1
+        self._forward(
+            link,
+            (
+                f"NICK {nick} {int(hopcount) + 1} {username} {host} {server}"
+                f" {modes} :{realname}\r\n"
+            ).encode(),
+        )
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.1.5
+    def _quit(self, link: ServerLink, message: Message, data: bytes) -> None:
+        client = self._getLinkedClient(link, message.prefix)
+        if client:
+            self._removeUser(client)
+            self._forward(link, data)
+
+    # https://datatracker.ietf.org/doc/html/rfc2812#section-3.7.1
+    def _kill(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if not message.params:
+            return
+        client = self.serverState.getClientFromNick(message.params[0])
+        if client is None or isLinked(client.handler, link):
+            return
+        reason = message.params[-1] if len(message.params) > 1 else "Killed"
+        if isRemote(client.handler):
+            # On toward the server of the client
+            client.handler.sendRaw(data)
+        else:
+            client.handler.disconnect(f"Killed ({reason})")
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.2.2
+    def _njoin(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if len(message.params) < 2:
+            return
+        members: list[tuple[User, MemberFlags]] = []
+        for nick in message.params[1].split(","):
+            flags = MemberFlags.NONE
+            if nick.startswith("@"):
+                flags |= MemberFlags.OPERATOR
+            client = self._getLinkedClient(link, nick.lstrip("@+"))
+            if client:
+                members.append((client.user, flags))
+        if members:
+            self._joinMembers(link, message.params[0], members, data)
+
+    def _joinMembers(
+        self,
+        link: ServerLink,
+        channelName: str,
+        members: list[tuple[User, MemberFlags]],
+        data: bytes,
+    ) -> None:
+        creator = members[0][0]
+        with self.serverState.openChannel(channelName, creator) as (channel, created):
+            for user, flags in members:
+                if created and user is creator:
+                    isOperator = bool(flags & MemberFlags.OPERATOR)
+                    channel.setMemberFlag(user, MemberFlags.OPERATOR, isOperator)
+                elif not channel.hasUser(user):
+                    channel.addUser(user, flags)
+            # Passed on under the lock, after the channel's earlier changes
+            self._forward(link, data)
+
+    def _join(self, link: ServerLink, message: Message, data: bytes) -> None:
+        client = self._getLinkedClient(link, message.prefix)
+        if client is None or not message.params:
+            return
+        user = client.user
+        with self.serverState.openChannel(message.params[0], user) as (
+            channel,
+            created,
+        ):
+            # The creator of a channel is its operator on every server
+            if not created and not channel.hasUser(user):
+                channel.addUser(user)
+            self._forward(link, data)
+
+    def _part(self, link: ServerLink, message: Message, data: bytes) -> None:
+        client = self._getLinkedClient(link, message.prefix)
+        if client and message.params:
+            self._leave(link, client, message.params[0], data)
+
+    def _kick(self, link: ServerLink, message: Message, data: bytes) -> None:
+        # The kicked client may be anywhere, even local
+        if len(message.params) >= 2:
+            client = self.serverState.getClientFromNick(message.params[1])
+            if client:
+                self._leave(link, client, message.params[0], data)
+
+    def _leave(
+        self, link: ServerLink, client: Client, channelName: str, data: bytes
+    ) -> None:
+        state = self.serverState
+        channel = state.getChannel(channelName)
+        if channel is None:
+            return
+        with channel.lock:
+            if not channel.hasUser(client.user):
+                return
+            channel.removeUser(client.user)
+            self._forward(link, data)
+        state.deleteChannelIfEmpty(channel)
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-4.2.3
+    def _mode(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if len(message.params) < 2:
+            return
+        channel = self.serverState.getChannel(message.params[0])
+        if channel is None:
+            return
+        with channel.lock:
+            self._applyModes(channel, message.params[1], message.params[2:])
+            self._forward(link, data)
+
+    def _applyModes(self, channel: Channel, modes: str, params: list[str]) -> None:
+        adding = True
+        remaining = iter(params)
+        for letter in modes:
+            if letter in "+-":
+                adding = letter == "+"
+            elif letter == "o":
+                client = self.serverState.getClientFromNick(next(remaining, ""))
+                if client and channel.hasUser(client.user):
+                    channel.setMemberFlag(client.user, MemberFlags.OPERATOR, adding)
+            elif letter == "k":
+                key = next(remaining, None) if adding else None
+                if key:
+                    channel.setKey(key)
+                else:
+                    channel.removeKey()
+            elif letter == "l":
+                limit = next(remaining, None) if adding else None
+                if limit:
+                    channel.setUserLimit(int(limit))
+                else:
+                    channel.removeUserLimit()
+            elif mode := _CHANNEL_MODES.get(letter):
+                channel.modes = (
+                    channel.modes | mode if adding else channel.modes & ~mode
+                )
+
+    def _topic(self, link: ServerLink, message: Message, data: bytes) -> None:
+        if not message.params:
+            return
+        channel = self.serverState.getChannel(message.params[0])
+        if channel is None:
+            return
+        with channel.lock:
+            topic = message.params[1] if len(message.params) > 1 else ""
+            channel.topic = topic or None
+            self._forward(link, data)
+
+    def _ping(self, link: ServerLink, message: Message, data: bytes) -> None:
+        origin = message.params[0] if message.params else link.name
+        link.send(f"PONG {self.name} :{origin}")
+        if not link.synced.is_set():
+            # The first PING follows the burst of the peer
+            link.synced.set()
+            log.info(
+                f"Received the burst of {link.name}"
+                f" in {(perf_counter() - link.registeredAt) * 1000:.1f} ms"
+            )
+
+    def _pong(self, link: ServerLink, message: Message, data: bytes) -> None:
+        pass
+
+    def _error(self, link: ServerLink, message: Message, data: bytes) -> None:
+        reason = message.params[-1] if message.params else ""
+        log.error(f"Link to {link.name or link.address} closed by the peer: {reason}")
+        link.close()
+
+
+def _renderModes(channel: Channel) -> str:
+    """The modes of the channel as a MODE setting all of them, with the key and
+    user limit"""
+    modes = channel.modes
+    added = "".join(letter for mode, letter in MODE_LETTERS if modes & mode)
+    removed = "".join(letter for mode, letter in MODE_LETTERS if not modes & mode)
+    params = []
+    # In the order of their letters
+    for letter in added:
+        if letter == "l":
+            params.append(str(channel.userLimit))
+        elif letter == "k":
+            params.append(str(channel.key))
+    rendered = (f"+{added}" if added else "") + (f"-{removed}" if removed else "")
+    return " ".join([rendered, *params])
@@ -1,9 +1,50 @@
-from .Handler import Handler
+from .Handler import Handler, FailedParamValidation
+from .Reply import invalidCapCommand
+from ..ServerState import Client
 
 from lib.Message import Message
 
 
+# Capabilities a client may request, for the replay of CHATHISTORY
+CAPABILITIES = ("batch", "draft/chathistory", "server-time")
+
+
 # https://ircv3.net/specs/extensions/capability-negotiation
+#
+# Registration is not held until CAP END, the capabilities only change how
+# later replies are tagged.
 class Cap(Handler):
-    def handle(self, message: Message):
-        self.client.handler.send("CAP * LS :\r\n")
+    def handle(self, client: Client, message: Message):
+        try:
+            self._requireParams(client, message)
+        except FailedParamValidation:
+            return
+
+        subcommand = message.params[0].upper()
+        nick = client.user.nick
+        if subcommand == "LS":
+            client.handler.send(f"CAP {nick} LS :{' '.join(CAPABILITIES)}\r\n")
+        elif subcommand == "LIST":
+            capabilities = " ".join(sorted(client.capabilities))
+            client.handler.send(f"CAP {nick} LIST :{capabilities}\r\n")
+        elif subcommand == "REQ":
+            requested = message.params[1] if len(message.params) > 1 else ""
+            self.request(client, requested)
+        elif subcommand != "END":
+            self._replyNumeric(client, invalidCapCommand(subcommand))
+
+    def request(self, client: Client, requested: str) -> None:
+        # The whole request is acknowledged or none of it
+        enabled = set(client.capabilities)
+        for capability in requested.split():
+            name = capability.removeprefix("-")
+            if name not in CAPABILITIES:
+                client.handler.send(f"CAP {client.user.nick} NAK :{requested}\r\n")
+                return
+            if capability.startswith("-"):
+                enabled.discard(name)
+            else:
+                enabled.add(name)
+
+        client.capabilities = frozenset(enabled)
+        client.handler.send(f"CAP {client.user.nick} ACK :{requested}\r\n")
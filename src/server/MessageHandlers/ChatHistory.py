@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Iterator, Optional
+
+from lib.Message import Message
+
+from .Handler import Handler, FailedParamValidation
+from ..History import HistoryEntry
+from ..ServerState import Client, ServerState
+
+
+# Most messages returned by a single request
+MAX_CHATHISTORY_LIMIT = 100
+
+SUBCOMMANDS = ("LATEST", "BEFORE", "AFTER")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+class InvalidSelector(Exception):
+    pass
+
+
+def formatTimestamp(timestamp: int) -> str:
+    """Milliseconds since the epoch in the server-time format"""
+    seconds, milliseconds = divmod(timestamp, 1000)
+    time = datetime.fromtimestamp(seconds, timezone.utc)
+    return f"{time:%Y-%m-%dT%H:%M:%S}.{milliseconds:03d}Z"
+
+
+def parseSelector(selector: str) -> int:
+    """Milliseconds since the epoch of a "timestamp=" selector"""
+    kind, _, value = selector.partition("=")
+    if kind != "timestamp":
+        raise InvalidSelector(selector)
+    try:
+        time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidSelector(selector)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return (time - _EPOCH) // _MILLISECOND
+
+
+# https://ircv3.net/specs/extensions/chathistory
+#
+# Messages are replayed in a "chathistory" batch to clients that negotiated
+# "batch" (https://ircv3.net/specs/extensions/batch), each tagged with the time
+# it was sent to clients that negotiated "server-time"
+# (https://ircv3.net/specs/extensions/server-time), as plain lines otherwise.
+# Only the history of the channels the client is in is served, selected by
+# timestamp.
+class ChatHistory(Handler):
+    # References of the batches, unique for the server
+    batches: Iterator[int]
+
+    def __init__(self, serverState: ServerState):
+        super().__init__(serverState)
+        self.batches = count(1)
+
+    def handle(self, client: Client, message: Message):
+        try:
+            self._requireParams(client, message, 4)
+        except FailedParamValidation:
+            return
+
+        subcommand, target, selector, limit = message.params[:4]
+        subcommand = subcommand.upper()
+        if subcommand not in SUBCOMMANDS:
+            self._fail(client, "INVALID_PARAMS", subcommand, "Unknown subcommand")
+            return
+
+        channel = self.serverState.getChannel(target)
+        if channel is None or not channel.hasUser(client.user):
+            self._fail(
+                client,
+                "INVALID_TARGET",
+                f"{subcommand} {target}",
+                "Messages could not be retrieved",
+            )
+            return
+
+        try:
+            timestamp = None
+            if not (subcommand == "LATEST" and selector == "*"):
+                timestamp = parseSelector(selector)
+        except InvalidSelector:
+            self._fail(client, "INVALID_PARAMS", selector, "Invalid message selector")
+            return
+
+        try:
+            maxEntries = min(int(limit), MAX_CHATHISTORY_LIMIT)
+        except ValueError:
+            maxEntries = 0
+        if maxEntries <= 0:
+            self._fail(client, "INVALID_PARAMS", limit, "Invalid limit")
+            return
+
+        history = self.serverState.history
+        entries: list[HistoryEntry]
+        if subcommand == "LATEST":
+            entries = history.latest(channel, maxEntries, timestamp)
+        elif subcommand == "BEFORE":
+            assert timestamp is not None
+            entries = history.before(channel, timestamp, maxEntries)
+        else:
+            assert timestamp is not None
+            entries = history.after(channel, timestamp, maxEntries)
+
+        self._sendBatch(client, channel.name, entries)
+
+    def _sendBatch(
+        self, client: Client, target: str, entries: list[HistoryEntry]
+    ) -> None:
+        # The whole reply is rendered into a single write
+        prefix = self.serverState.prefixBytes
+        batched = "batch" in client.capabilities
+        timed = "server-time" in client.capabilities
+        parts: list[bytes] = []
+        tags = ""
+        if batched:
+            reference = str(next(self.batches))
+            tags = f"batch={reference};"
+            parts += (prefix, f" BATCH +{reference} chathistory {target}\r\n".encode())
+        for timestamp, line in entries:
+            if timed:
+                parts.append(f"@{tags}time={formatTimestamp(timestamp)} ".encode())
+            elif batched:
+                parts.append(f"@{tags[:-1]} ".encode())
+            parts.append(line)
+        if batched:
+            parts += (prefix, f" BATCH -{reference}\r\n".encode())
+        client.handler.sendRaw(b"".join(parts))
+
+    def _fail(
+        self, client: Client, code: str, context: Optional[str], description: str
+    ) -> None:
+        # https://ircv3.net/specs/extensions/standard-replies
+        params = f" {context}" if context else ""
+        client.handler.send(
+            f"{self.serverState.getPrefix()} FAIL CHATHISTORY {code}{params}"
+            f" :{description}\r\n"
+        )
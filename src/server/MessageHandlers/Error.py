@@ -1,7 +1,10 @@
+from logging import DEBUG
+
 from lib.logger import logger
 from lib.Message import Message
 
 from .Handler import Handler
+from ..ServerState import Client
 
 
 log = logger.getChild("server.MessageHandlers.Error")
@@ -9,5 +12,6 @@ log = logger.getChild("server.MessageHandlers.Error")
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.1.1
 class Error(Handler):
-    def handle(self, message: Message):
-        log.debug(f"Unhandled command: {message.rawMessage}")
+    def handle(self, client: Client, message: Message):
+        if log.isEnabledFor(DEBUG):
+            log.debug(f"Unhandled command: {message.rawMessage}")
@@ -1,27 +1,36 @@
 from abc import ABC, abstractmethod
-from typing import overload
+from functools import partial
+from itertools import islice
+from typing import Iterable, Iterator, overload
 
 from lib.Message import Message
 from lib.Channel import Channel
 
 from ..ServerState import ServerState, Client
+from ..StateBus import Route, isRemote
 from . import Reply
 
 
+# Bytes of a streamed reply rendered before they are sent
+STREAM_CHUNK_SIZE = 16 * 1024
+# Lines of a paced reply sent between two checks of the client's output
+PACED_CHUNK_LINES = 100
+
+
 class FailedParamValidation(Exception):
     pass
 
 
+# Handlers hold no per-message state: one instance per command is created when
+# the server starts and handles the messages of every client
 class Handler(ABC):
     serverState: ServerState
-    client: Client
 
-    def __init__(self, serverState: ServerState, client: Client):
+    def __init__(self, serverState: ServerState):
         self.serverState = serverState
-        self.client = client
 
     @abstractmethod
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         ...
 
     # TODO: Make decorator?
@@ -43,21 +52,78 @@ class Handler(ABC):
     def _replyNumeric(
         self, client: Client, reply: Reply.Reply | list[Reply.Reply]
     ) -> None:
-        if isinstance(reply, Reply.Reply):
-            message = self._generateNumericReply(client, reply)
-        else:
-            message = ""
-            for each in reply:
-                message += self._generateNumericReply(client, each)
-
-        client.handler.send(message)
-
-    def _generateNumericReply(self, client: Client, reply: Reply.Reply) -> str:
-        return (
-            f"{self.serverState.getPrefix()}"
-            f" {reply.code}"
-            f" {client.user.nick}"
-            f" {reply.text}\r\n"
+        client.handler.sendRaw(self._renderNumeric(client, reply))
+
+    def _renderNumeric(
+        self, client: Client, reply: Reply.Reply | list[Reply.Reply]
+    ) -> bytes:
+        # Every line of a burst starts with the same prefix and nick: they are
+        # encoded once and the whole burst is joined into a single buffer
+        prefix = self.serverState.prefixBytes
+        nick = client.user.nick.encode()
+        if isinstance(reply, tuple):
+            code, text = reply
+            return b"".join((prefix, code, nick, text))
+
+        parts: list[bytes] = []
+        for code, text in reply:
+            parts += (prefix, code, nick, text)
+        return b"".join(parts)
+
+    def _streamNumeric(self, client: Client, replies: Iterable[Reply.Reply]) -> None:
+        """Sends replies as they are produced, for replies too long to be
+        rendered at once"""
+        prefix = self.serverState.prefixBytes
+        nick = client.user.nick.encode()
+        # The start of the lines of every code, rendered once for the client
+        heads: dict[bytes, bytes] = {}
+        parts: list[bytes] = []
+        size = 0
+        for code, text in replies:
+            head = heads.get(code)
+            if head is None:
+                head = heads[code] = b"".join((prefix, code, nick))
+            parts += (head, text)
+            size += len(head) + len(text)
+            if size >= STREAM_CHUNK_SIZE:
+                client.handler.sendRaw(b"".join(parts))
+                parts = []
+                size = 0
+        if parts:
+            client.handler.sendRaw(b"".join(parts))
+
+    def _paceNumeric(self, client: Client, replies: Iterable[Reply.Reply]) -> None:
+        """Streams replies that may fill the client's output queue, waiting for
+        it to drain between chunks. Replaces a paced reply still in progress."""
+        stream = iter(replies)
+        client.pacedReplies = stream
+        self._sendPaced(client, stream)
+
+    def _sendPaced(self, client: Client, stream: Iterator[Reply.Reply]) -> None:
+        # Resumed from the thread draining the output (the writer thread or the
+        # event loop) until the stream is done or replaced
+        while client.pacedReplies is stream:
+            chunk = list(islice(stream, PACED_CHUNK_LINES))
+            if chunk:
+                client.handler.sendRaw(self._renderNumeric(client, chunk))
+            if len(chunk) < PACED_CHUNK_LINES:
+                if client.pacedReplies is stream:
+                    client.pacedReplies = None
+                return
+            if client.handler.onDrained(partial(self._sendPaced, client, stream)):
+                return
+
+    def _names(self, client: Client, channel: Channel) -> Iterator[Reply.Reply]:
+        headLength = (
+            len(self.serverState.prefixBytes)
+            + len(Reply.RPL_NAMREPLY)
+            + len(client.user.nick.encode())
+        )
+        return Reply.names(channel, headLength)
+
+    def _notice(self, client: Client, text: str) -> None:
+        client.handler.send(
+            f"{self.serverState.getPrefix()} NOTICE {client.user.nick} :{text}\r\n"
         )
 
     def _sendToChannel(
@@ -66,10 +132,35 @@ class Handler(ABC):
         channel: Channel,
         message: str,
         excludeSender: bool = False,
+        history: bool = False,
     ) -> None:
-        for username in channel.getAllUsers():
-            client = self.serverState.clients[username]
-            if excludeSender and client == sender:
-                continue
-
-            client.handler.send(f":{sender.getIdentifier()} {message}\r\n")
+        """Sends a message to the members, and keeps it in the channel's
+        history if history is set"""
+        # Every member receives the same bytes, serialize them only once
+        data = f":{sender.getIdentifier()} {message}\r\n".encode()
+        clients = self.serverState.clients
+        routes: set[Route] = set()
+        recipients = 0
+        # Holding the lock orders the channel's messages and membership changes
+        with channel.lock:
+            for user in channel.members:
+                # Members always have a username, see Channel.addUser
+                assert user.username is not None
+                client = clients.get(user.username)
+                # Disconnecting clients leave the registry before their channels
+                if client is None or (excludeSender and client is sender):
+                    continue
+                # Other workers and linked servers deliver to their own
+                # members, the message goes once to each of them, see below
+                if isRemote(client.handler):
+                    routes.add(client.handler.route)
+                    continue
+
+                client.handler.sendRaw(data)
+                recipients += 1
+
+            if history:
+                self.serverState.history.record(channel, data)
+            self.serverState.metrics.fanout.observe(recipients)
+            for route in routes:
+                route.relay(channel, data, history)
@@ -1,10 +1,12 @@
+from itertools import chain
+
 from lib.logger import logger
 from lib.Message import Message
-from lib.Channel import Channel
 
 from .Handler import Handler, FailedParamValidation
+from ..ServerState import ServerState, Client
 from .Part import Part
-from .Reply import badChannelKey, topic, names, endOfNames
+from .Reply import badChannelKey, topic, endOfNames
 
 
 log = logger.getChild("server.MessageHandlers.Join")
@@ -12,17 +14,21 @@ log = logger.getChild("server.MessageHandlers.Join")
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.1
 class Join(Handler):
-    def handle(self, message: Message):
+    partHandler: Part
+
+    def __init__(self, serverState: ServerState):
+        super().__init__(serverState)
+        self.partHandler = Part(serverState)
+
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message)
+            self._requireParams(client, message)
 
             # Leave all channels
             if message.params[0] == "0":
-                for channelName in self.serverState.channels:
-                    channel = self.serverState.channels[channelName]
-                    if self.client.user.username in channel.getAllUsers():
-                        log.info(f"{self.client.user.nick} is leaving all channels")
-                        Part(self.serverState, self.client).part(self.client, channel)
+                log.info(f"{client.user.nick} is leaving all channels")
+                for channel in list(client.user.channels.values()):
+                    self.partHandler.part(client, channel)
             else:
                 channels = message.params[0].split(",")
                 try:
@@ -35,23 +41,48 @@ class Join(Handler):
                     if keys and len(keys) > i:
                         key = keys[i]
 
-                    if channelName in self.serverState.channels:
-                        channel = self.serverState.channels[channelName]
-                        if channel.key and key != channel.key:
-                            self._replyNumeric(self.client, badChannelKey(channelName))
-                            break
-                        channel.addUser(self.client.user)
-                        log.info(f"{self.client.user.nick} joined {channelName}")
-                    else:
-                        channel = Channel(channelName, self.client.user, key)
-                        self.serverState.channels[channelName] = channel
-                        log.info(f"{self.client.user.nick} created {channelName}")
-                    self._sendToChannel(self.client, channel, f"JOIN {channelName}")
-                    replies = [
-                        topic(channel),
-                        names(channel),
-                        endOfNames(channelName),
-                    ]
-                    self._replyNumeric(self.client, replies)
+                    with self.serverState.openChannel(
+                        channelName, client.user, key
+                    ) as (channel, created):
+                        restored = False
+                        if created:
+                            log.info(f"{client.user.nick} created {channelName}")
+                        elif channel.hasUser(client.user):
+                            # Already a member, nothing to do
+                            continue
+                        else:
+                            if channel.key and key != channel.key:
+                                self._replyNumeric(client, badChannelKey(channelName))
+                                break
+                            # Channels restored from disk have no members, their
+                            # first member runs them as a creator would
+                            if not channel.members:
+                                restored = True
+                                channel.addOperator(client.user)
+                            else:
+                                channel.addUser(client.user)
+                            log.info(f"{client.user.nick} joined {channelName}")
+                        # Under the name it was created with
+                        self._sendToChannel(client, channel, f"JOIN {channel.name}")
+                        username = client.user.username
+                        self.serverState.publish(("join", username, channel.name))
+                        if restored:
+                            self.serverState.publish(
+                                ("op", username, channel.name, True)
+                            )
+                        if created:
+                            self.serverState.saveChannel(channel)
+                            if key:
+                                self.serverState.publishChannel(channel)
+
+                    # Rendered without the channel's lock, NAMES may be long
+                    self._streamNumeric(
+                        client,
+                        chain(
+                            [topic(channel)],
+                            self._names(client, channel),
+                            [endOfNames(channel.name)],
+                        ),
+                    )
         except FailedParamValidation:
             pass
@@ -10,42 +10,44 @@ from ..ServerState import Client
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.8
 class Kick(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message, 2)
+            self._requireParams(client, message, 2)
 
             channelNames = message.params[0].split(",")
             nicks = message.params[1].split(",")
             try:
-                reason = " ".join(message.params[2:]).lstrip(":")
+                reason = message.params[2]
             except IndexError:
                 reason = None
 
             if len(channelNames) == 1:
-                channel = self.serverState.channels[channelNames[0]]
-                if (
-                    channel.isOperator(self.client.user)
-                    or self.client.user.isOperator()
-                ):
+                channel = self.serverState.getChannel(channelNames[0])
+                if channel is None:
+                    return
+                if channel.isOperator(client.user) or client.user.isOperator():
                     for nick in nicks:
                         user = self.serverState.getUserFromNick(nick)
-                        if user and user.username in channel.users:
-                            self.kick(self.client, user, channel, reason)
+                        if user and channel.hasUser(user):
+                            self.kick(client, user, channel, reason)
             elif len(channelNames) == len(nicks):
                 isOperator = False
                 for channelName in channelNames:
-                    channel = self.serverState.channels[channelName]
+                    channel = self.serverState.getChannel(channelName)
+                    if channel is None:
+                        return
                     isOperator = (
-                        channel.isOperator(self.client.user)
-                        or self.client.user.isOperator()
+                        channel.isOperator(client.user) or client.user.isOperator()
                     )
                 if isOperator:
                     for channelName in channelNames:
-                        channel = self.serverState.channels[channelName]
+                        channel = self.serverState.getChannel(channelName)
+                        if channel is None:
+                            continue
                         for nick in nicks:
                             user = self.serverState.getUserFromNick(nick)
-                            if user and user.username in channel.users:
-                                self.kick(self.client, user, channel, reason)
+                            if user and channel.hasUser(user):
+                                self.kick(client, user, channel, reason)
                 else:
                     # TODO: ERR_CHANOPRIVSNEEDED
                     pass
@@ -64,5 +66,11 @@ class Kick(Handler):
         message = f"KICK {channel.name} {kickedUser.nick}"
         if reason:
             message += f" :{reason}"
-        self._sendToChannel(client, channel, message)
-        channel.removeUser(kickedUser)
+        with channel.lock:
+            # The user may have left since the caller checked
+            if not channel.hasUser(kickedUser):
+                return
+            self._sendToChannel(client, channel, message)
+            channel.removeUser(kickedUser)
+            self.serverState.publish(("part", kickedUser.username, channel.name))
+        self.serverState.deleteChannelIfEmpty(channel)
@@ -1,22 +1,29 @@
 from lib.Message import Message
 
 from .Handler import Handler
+from ..ServerState import Client
 from .Reply import Reply, lUserClient, lUserOp, lUserUnknown, lUserChannels, lUserMe
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.4.2
 class LUsers(Handler):
-    def handle(self, message: Message):
-        self._replyNumeric(self.client, self.lUsers())
+    def handle(self, client: Client, message: Message):
+        self._replyNumeric(client, self.lUsers())
 
     def lUsers(self) -> list[Reply]:
-        operators = filter(
-            lambda c: c.user.isOperator(), self.serverState.clients.values()
-        )
+        # Counters only, this is part of every registration
+        state = self.serverState
+        clients = len(state.clients)
+        # The whole network, then the clients and links of this server
+        servers, localClients, linkedServers = 1, clients, 0
+        if state.links:
+            servers += len(state.links.servers)
+            localClients -= state.links.linkedUsers
+            linkedServers = len(state.links.links)
         return [
-            lUserClient(len(self.serverState.clients), 0),
-            lUserOp(len(list(operators))),
-            lUserUnknown(len(self.serverState.newClients)),
-            lUserChannels(len(self.serverState.channels)),
-            lUserMe(len(self.serverState.clients)),
+            lUserClient(clients, 0, servers),
+            lUserOp(state.operators),
+            lUserUnknown(len(state.newClients)),
+            lUserChannels(len(state.channels)),
+            lUserMe(localClients, linkedServers),
         ]
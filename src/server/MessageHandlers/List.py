@@ -1,22 +1,98 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
 from lib.Message import Message
-from lib.Channel import Channels
+from lib.Channel import Channel
+from lib.User import ircLower
 
 from .Handler import Handler
+from ..ServerState import Client
 from .Reply import Reply, channelList, channelListEnd
 
 
+# Filters of a LIST, given in place of the channel names
+# https://datatracker.ietf.org/doc/html/draft-brocklesby-irc-isupport-03#section-3.5
+# (ELIST): ">N" and "<N" bound the member count, "!mask" excludes the channels
+# matching a mask, other masks (or names) select channels
+@dataclass
+class ListFilter:
+    minMembers: int = 0
+    maxMembers: Optional[int] = None
+    masks: list[re.Pattern] = field(default_factory=list)
+    excludedMasks: list[re.Pattern] = field(default_factory=list)
+    # Names given without wildcards, looked up instead of scanning every channel
+    names: list[str] = field(default_factory=list)
+
+    def matches(self, channel: Channel) -> bool:
+        if self.minMembers or self.maxMembers is not None:
+            members = channel.getMemberCount()
+            if members < self.minMembers:
+                return False
+            if self.maxMembers is not None and members > self.maxMembers:
+                return False
+
+        if not self.masks and not self.excludedMasks:
+            return True
+        name = ircLower(channel.name)
+        if self.masks and not any(mask.fullmatch(name) for mask in self.masks):
+            return False
+        return not any(mask.fullmatch(name) for mask in self.excludedMasks)
+
+
+def parseListFilter(params: str) -> ListFilter:
+    listFilter = ListFilter()
+    for param in params.split(","):
+        try:
+            if param.startswith(">"):
+                listFilter.minMembers = int(param[1:]) + 1
+                continue
+            if param.startswith("<"):
+                listFilter.maxMembers = int(param[1:]) - 1
+                continue
+        except ValueError:
+            pass
+
+        if param.startswith("!"):
+            listFilter.excludedMasks.append(_compileMask(param[1:]))
+        else:
+            listFilter.masks.append(_compileMask(param))
+            if "*" not in param and "?" not in param:
+                listFilter.names.append(param)
+    return listFilter
+
+
+def _compileMask(mask: str) -> re.Pattern:
+    # "*" matches any characters and "?" a single one, case insensitively
+    pattern = re.escape(ircLower(mask)).replace(r"\*", ".*").replace(r"\?", ".")
+    return re.compile(pattern)
+
+
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.6
+#
+# The listing is produced lazily and paced by the client's output queue, a
+# client listing a large network never holds more than a chunk of it
 class List(Handler):
-    def handle(self, message: Message):
-        channels: list[str] | Channels
-        try:
-            channels = message.params[0].split(",")
-        except IndexError:
-            channels = self.serverState.channels
-
-        replies: list[Reply] = []
-        for channelName in channels:
-            channel = self.serverState.channels[channelName]
-            replies.append(channelList(channel))
-        replies.append(channelListEnd())
-        self._replyNumeric(self.client, replies)
+    def handle(self, client: Client, message: Message):
+        listFilter = parseListFilter(message.params[0]) if message.params else None
+        self._paceNumeric(client, self.list(listFilter))
+
+    def list(self, listFilter: Optional[ListFilter]) -> Iterator[Reply]:
+        channels: Iterable[Optional[Channel]]
+        if (
+            listFilter
+            and listFilter.names
+            and len(listFilter.names) == len(listFilter.masks)
+        ):
+            channels = map(self.serverState.getChannel, listFilter.names)
+        else:
+            # Read from the registry as the listing goes on, without a copy of
+            # it, and skipped once deleted
+            channels = self.serverState.iterChannels()
+
+        for channel in channels:
+            if channel is None or channel.closed:
+                continue
+            if listFilter is None or listFilter.matches(channel):
+                yield channelList(channel)
+        yield channelListEnd()
@@ -1,8 +1,8 @@
 from typing import Optional
 
 from lib.Message import Message
-from lib.User import User
-from lib.Channel import Channel
+from lib.User import ircLower
+from lib.Channel import Channel, MemberFlags
 
 from .Handler import Handler, FailedParamValidation
 from ..ServerState import Client
@@ -12,6 +12,10 @@ from .Reply import (
     usersDontMatch,
     channelModeIs,
     unknownMode,
+    needMoreParams,
+    noSuchNick,
+    userNotInChannel,
+    chanOPrivsNeeded,
 )
 
 
@@ -20,26 +24,24 @@ def _validUserMode(mode: str) -> bool:
 
 
 def _validChannelMode(mode: str) -> bool:
-    return mode[0] in "+-" and mode[1] in "aimtkl"
+    return mode[0] in "+-" and mode[1] in "aimtklo"
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.3
 class Mode(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message)
+            self._requireParams(client, message)
 
             nickOrChannel = message.params[0]
-            try:
-                mode = message.params[1]
-            except IndexError:
-                mode = None
+            mode = message.params[1] if len(message.params) > 1 else None
+            # The parameter of the k, l and o modes
+            modeParam = message.params[2] if len(message.params) > 2 else None
 
-            if nickOrChannel in self.serverState.clients:
-                self.userMode(self.client, nickOrChannel, mode)
-            elif nickOrChannel in self.serverState.channels:
-                channel = self.serverState.channels[nickOrChannel]
-                self.channelMode(self.client, channel, mode)
+            if self.serverState.getClientFromNick(nickOrChannel):
+                self.userMode(client, nickOrChannel, mode)
+            elif channel := self.serverState.getChannel(nickOrChannel):
+                self.channelMode(client, channel, mode, modeParam)
 
         except FailedParamValidation:
             pass
@@ -49,12 +51,13 @@ class Mode(Handler):
             self._replyNumeric(client, userModeIs(client.user.getModes()))
         elif not _validUserMode(mode):
             self._replyNumeric(client, unknownModeFlag())
-        elif nick == client.user.nick:
-            self.setUserMode(client.user, mode)
+        elif ircLower(nick) == ircLower(client.user.nick):
+            self.setUserMode(client, mode)
         else:
             self._replyNumeric(client, usersDontMatch())
 
-    def setUserMode(self, user: User, mode: str) -> None:
+    def setUserMode(self, client: Client, mode: str) -> None:
+        user = client.user
         addMode = False
         if mode[0] == "+":
             addMode = True
@@ -64,30 +67,40 @@ class Mode(Handler):
             user.setAway(addMode)
         elif mode == "i":
             user.setInvisible(addMode)
-        elif mode == "o":
-            user.setOperator(addMode)
+        elif mode == "o" and not addMode:
+            # Operators are made with OPER, "+o" is ignored
+            # https://datatracker.ietf.org/doc/html/rfc2812#section-3.1.5
+            self.serverState.setOperator(client, False)
 
     def channelMode(
-        self, client: Client, channel: Channel, mode: Optional[str]
+        self,
+        client: Client,
+        channel: Channel,
+        mode: Optional[str],
+        modeParam: Optional[str],
     ) -> None:
         if not mode:
             self._replyNumeric(client, channelModeIs(channel))
         elif not _validChannelMode(mode):
             self._replyNumeric(client, unknownMode(channel, mode))
+        elif not channel.isOperator(client.user):
+            self._replyNumeric(client, chanOPrivsNeeded(channel.name))
+        elif modeParam is None and (mode[1] == "o" or mode[:2] in ("+k", "+l")):
+            self._replyNumeric(client, needMoreParams("MODE"))
+        elif mode[1] == "o":
+            assert modeParam is not None
+            self.setChannelOperator(client, channel, mode[0] == "+", modeParam)
         else:
-            self.setChannelMode(channel, mode)
+            self.setChannelMode(channel, mode, modeParam)
 
-    def setChannelMode(self, channel: Channel, mode: str) -> None:
+    def setChannelMode(
+        self, channel: Channel, mode: str, modeParam: Optional[str]
+    ) -> None:
         addMode = False
         if mode[0] == "+":
             addMode = True
 
         mode = mode[1]
-        try:
-            modeParam = mode[2]
-        except IndexError:
-            modeParam = None
-
         if mode == "a":
             channel.setAnonymous(addMode)
         elif mode == "i":
@@ -99,6 +112,8 @@ class Mode(Handler):
         elif mode == "l":
             if addMode:
                 assert modeParam is not None
+                if not modeParam.isdigit():
+                    return
                 channel.setUserLimit(int(modeParam))
             else:
                 channel.removeUserLimit()
@@ -108,10 +123,23 @@ class Mode(Handler):
                 channel.setKey(modeParam)
             else:
                 channel.removeKey()
-        elif mode == "o":
-            assert modeParam is not None
-            user = self.serverState.getUserFromNick(modeParam)
-            if addMode:
-                channel.addOperator(user)
-            else:
-                channel.removeOperator(user)
+
+        self.serverState.publishChannel(channel)
+        self.serverState.saveChannel(channel)
+
+    def setChannelOperator(
+        self, client: Client, channel: Channel, addMode: bool, nick: str
+    ) -> None:
+        user = self.serverState.getUserFromNick(nick)
+        if not user:
+            self._replyNumeric(client, noSuchNick(nick))
+            return
+        with channel.lock:
+            # Only members can be made operators, which also rules out a
+            # channel deleted since it was looked up
+            if not channel.hasUser(user):
+                self._replyNumeric(client, userNotInChannel(nick, channel.name))
+                return
+            # Giving or taking the status twice is harmless
+            channel.setMemberFlag(user, MemberFlags.OPERATOR, addMode)
+            self.serverState.publish(("op", user.username, channel.name, addMode))
@@ -1,18 +1,34 @@
+from typing import Optional
+
 from lib.Message import Message
 
 from .Handler import Handler
-from .Reply import Reply, motdStart, motd, endOfMotd
+from ..ServerState import Client, MOTD
+from .Reply import Burst, Reply, motdStart, motd, endOfMotd
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.4.1
 class Motd(Handler):
-    def handle(self, message: Message):
-        self._replyNumeric(self.client, self.motd())
+    # The MOTD last rendered, with its burst
+    rendered: Optional[tuple[MOTD, Burst]] = None
+
+    def handle(self, client: Client, message: Message):
+        client.handler.sendRaw(self.getBurst().render(client.user.nick.encode()))
+
+    def getBurst(self) -> Burst:
+        # Rendered again only once the MOTD was replaced, see ServerState.setMOTD
+        lines = self.serverState.motd
+        rendered = self.rendered
+        if rendered is None or rendered[0] is not lines:
+            rendered = self.rendered = (
+                lines,
+                Burst(self.serverState.prefixBytes, self.motd(lines)),
+            )
+        return rendered[1]
 
-    def motd(self) -> list[Reply]:
+    def motd(self, lines: MOTD) -> list[Reply]:
         replies = [motdStart(self.serverState.host)]
-        if self.serverState.motd:
-            for line in self.serverState.motd:
-                replies.append(motd(line))
+        for line in lines:
+            replies.append(motd(line))
         replies.append(endOfMotd())
         return replies
@@ -1,15 +1,26 @@
+from itertools import chain
+
 from lib.Message import Message
 
-from .Handler import Handler
-from .Reply import names
+from .Handler import Handler, FailedParamValidation
+from ..ServerState import Client
+from .Reply import endOfNames
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.5
 class Names(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
+        # Listing every channel of the network is not supported
+        try:
+            self._requireParams(client, message)
+        except FailedParamValidation:
+            return
+
         channels = message.params[0].split(",")
 
         for channelName in channels:
-            if channelName in self.serverState.channels:
-                channel = self.serverState.channels[channelName]
-                self._replyNumeric(self.client, names(channel))
+            if channel := self.serverState.getChannel(channelName):
+                self._streamNumeric(
+                    client,
+                    chain(self._names(client, channel), [endOfNames(channelName)]),
+                )
@@ -1,29 +1,60 @@
-from bcrypt import checkpw
+from threading import Lock
+from time import monotonic
+from weakref import WeakKeyDictionary
 
 from lib.Message import Message
 
 from .Handler import Handler, FailedParamValidation
-from .Reply import youreOper, passwordMismatch
+from ..Connection import Connection
+from ..Operators import OperatorAuthenticator
+from ..ServerState import Client, ServerState
+from .Reply import youreOper, passwordMismatch, tryAgain
+
+
+# Seconds between two OPER attempts of a connection
+OPER_ATTEMPT_INTERVAL = 2
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.1.4
+# The password is checked in the background, RPL_YOUREOPER or
+# ERR_PASSWDMISMATCH follows once it is done
 class Oper(Handler):
-    def handle(self, message: Message):
+    authenticator: OperatorAuthenticator
+    # Time of the last attempt of every connection
+    attempts: "WeakKeyDictionary[Connection, float]"
+    attemptsLock: Lock
+
+    def __init__(self, serverState: ServerState):
+        super().__init__(serverState)
+        self.authenticator = OperatorAuthenticator(serverState.operatorCredentials)
+        self.attempts = WeakKeyDictionary()
+        self.attemptsLock = Lock()
+
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message, 2)
-
-            user = message.params[0]
-            password = message.params[1]
-
-            for credential in self.serverState.operatorCredentials:
-                if checkpw(user.encode(), credential.userHash) and checkpw(
-                    password.encode(), credential.passwordHash
-                ):
-                    self.client.user.setOperator(True)
-                    self._replyNumeric(self.client, youreOper())
-                    return
-
-            self._replyNumeric(self.client, passwordMismatch())
-
+            self._requireParams(client, message, 2)
         except FailedParamValidation:
-            pass
+            return
+
+        if not self._allowAttempt(client.handler):
+            self._replyNumeric(client, tryAgain("OPER"))
+            return
+
+        def onDone(valid: bool) -> None:
+            if valid and self.serverState.setOperator(client, True):
+                self._replyNumeric(client, youreOper())
+            elif not valid:
+                self._replyNumeric(client, passwordMismatch())
+
+        name, password = message.params[0], message.params[1]
+        if not self.authenticator.submit(name, password, onDone):
+            self._replyNumeric(client, tryAgain("OPER"))
+
+    def _allowAttempt(self, connection: Connection) -> bool:
+        now = monotonic()
+        with self.attemptsLock:
+            last = self.attempts.get(connection)
+            if last is not None and now - last < OPER_ATTEMPT_INTERVAL:
+                return False
+            self.attempts[connection] = now
+            return True
@@ -6,6 +6,7 @@ from lib.Channel import Channel
 
 from .Handler import Handler, FailedParamValidation
 from ..ServerState import Client
+from .Reply import noSuchChannel, notOnChannel
 
 
 log = logger.getChild("server.MessageHandlers.Part")
@@ -13,20 +14,22 @@ log = logger.getChild("server.MessageHandlers.Part")
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.2
 class Part(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message)
+            self._requireParams(client, message)
 
             channels = message.params[0].split(",")
             try:
-                partMessage = message.params[1].lstrip(":")
+                partMessage = message.params[1]
             except IndexError:
                 partMessage = None
 
             for channelName in channels:
-                if channelName in self.serverState.channels:
-                    channel = self.serverState.channels[channelName]
-                    self.part(self.client, channel, partMessage)
+                channel = self.serverState.getChannel(channelName)
+                if not channel:
+                    self._replyNumeric(client, noSuchChannel(channelName))
+                elif not self.part(client, channel, partMessage):
+                    self._replyNumeric(client, notOnChannel(channelName))
         except FailedParamValidation:
             pass
 
@@ -35,13 +38,18 @@ class Part(Handler):
         client: Client,
         channel: Channel,
         partMessage: Optional[str] = None,
-    ) -> None:
+    ) -> bool:
+        """Leaves a channel, False if the client is not (or no longer) in it"""
         message = f"PART {channel.name}"
         if partMessage:
             message += f" :{partMessage}"
-        log.info(f"{client.user.nick} left {channel.name}")
-        self._sendToChannel(client, channel, message)
-        channel.removeUser(client.user)
-        if len(channel.getAllUsers()) == 0:
-            log.info(f"Deleting channel {channel.name}")
-            del self.serverState.channels[channel.name]
+        with channel.lock:
+            # Kicked or parted from another thread meanwhile
+            if not channel.hasUser(client.user):
+                return False
+            log.info(f"{client.user.nick} left {channel.name}")
+            self._sendToChannel(client, channel, message)
+            channel.removeUser(client.user)
+            self.serverState.publish(("part", client.user.username, channel.name))
+        self.serverState.deleteChannelIfEmpty(channel)
+        return True
@@ -1,9 +1,10 @@
 from lib.Message import Message
 
 from .Handler import Handler
+from ..ServerState import Client
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.7.2
 class Ping(Handler):
-    def handle(self, message: Message):
-        self.client.handler.send("PONG\r\n")
+    def handle(self, client: Client, message: Message):
+        client.handler.send("PONG\r\n")
@@ -0,0 +1,50 @@
+from time import strftime, localtime
+from typing import Optional
+
+from lib.Message import Message
+
+from .Handler import Handler
+from ..Profiler import DEFAULT_PROFILE_SECONDS, ProfilerBusy
+from ..ServerState import Client
+from .Reply import noPrivileges
+
+
+# Not part of the RFCs, operators only:
+#   PROFILE [seconds]  samples the message handlers, the profile is written to a
+#                      file speedscope reads
+#   PROFILE SLOW       lists the slowest messages handled since the start
+class Profile(Handler):
+    def handle(self, client: Client, message: Message):
+        if not client.user.isOperator():
+            self._replyNumeric(client, noPrivileges())
+            return
+
+        argument = message.params[0] if message.params else ""
+        if argument.upper() == "SLOW":
+            self._listSlowMessages(client)
+        elif argument == "" or argument.isdigit():
+            self._startSampling(client, int(argument or DEFAULT_PROFILE_SECONDS))
+        else:
+            self._notice(client, "Usage: PROFILE [seconds] or PROFILE SLOW")
+
+    def _startSampling(self, client: Client, seconds: int) -> None:
+        def onDone(path: str, error: Optional[Exception]) -> None:
+            if error:
+                self._notice(client, f"Failed to write the profile to {path}: {error}")
+            else:
+                self._notice(client, f"Profile written to {path}")
+
+        try:
+            path = self.serverState.profiler.startSampling(seconds, onDone)
+        except ProfilerBusy as e:
+            self._notice(client, f"A profile is already being written to {e}")
+            return
+        self._notice(client, f"Profiling, the profile will be written to {path}")
+
+    def _listSlowMessages(self, client: Client) -> None:
+        slowest = self.serverState.profiler.slowLog.getSlowest()
+        for each in slowest:
+            at = strftime("%H:%M:%S", localtime(each.timestamp))
+            milliseconds = each.nanoseconds / 1e6
+            self._notice(client, f"{milliseconds:.3f}ms at {at}: {each.line}")
+        self._notice(client, f"End of the {len(slowest)} slowest messages")
@@ -0,0 +1,22 @@
+from lib.Message import Message
+
+from .Handler import Handler
+from ..ServerState import Client
+from .Reply import noPrivileges, rehashing
+
+
+# https://datatracker.ietf.org/doc/html/rfc2812#section-4.2
+# Operators only. Reloads the MOTD, the rest of the configuration needs a
+# restart. The other workers, if any, are sent the new MOTD.
+class Rehash(Handler):
+    def handle(self, client: Client, message: Message):
+        if not client.user.isOperator():
+            self._replyNumeric(client, noPrivileges())
+            return
+
+        if not self.serverState.reloadMOTD():
+            self._notice(client, "The MOTD could not be reloaded")
+            return
+
+        self.serverState.publish(("motd", self.serverState.motd))
+        self._replyNumeric(client, rehashing("MOTD"))
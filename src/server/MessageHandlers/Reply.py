@@ -1,185 +1,409 @@
-from lib.User import User
-from lib.Channel import Channel
-
-
-class Reply:
-    code: str
-    text: str
+from typing import Iterator
 
-    def __init__(self, code: str, text: str) -> None:
-        self.code = code
-        self.text = text
+from lib.User import User
+from lib.Channel import Channel, getMemberPrefix
+
+
+# A numeric reply without the server prefix and the target nick, which
+# Handler._replyNumeric puts in front: ":<server><code><nick><text>". The code
+# comes from the table below and the text holds the parameters after the nick,
+# with the line ending: (b" 001 ", b" :Welcome ...\r\n")
+Reply = tuple[bytes, bytes]
+
+# Longest line a client accepts, with its line ending
+# https://datatracker.ietf.org/doc/html/rfc1459#section-2.3
+MAX_LINE_LENGTH = 512
+
+
+# Replies rendered once for every target: the nick goes between the segments,
+# so rendering them for a client is a single join
+class Burst:
+    segments: list[bytes]
+
+    def __init__(self, prefix: bytes, replies: list[Reply]) -> None:
+        self.segments = [b""]
+        for code, text in replies:
+            self.segments[-1] += prefix + code
+            self.segments.append(text)
+
+    def render(self, nick: bytes) -> bytes:
+        return nick.join(self.segments)
+
+
+# Codes encoded once, between the spaces that separate them from the prefix
+# and the nick
+# https://datatracker.ietf.org/doc/html/rfc2812#section-5
+RPL_WELCOME = b" 001 "
+RPL_YOURHOST = b" 002 "
+RPL_CREATED = b" 003 "
+RPL_MYINFO = b" 004 "
+RPL_STATSCOMMANDS = b" 212 "
+RPL_ENDOFSTATS = b" 219 "
+RPL_UMODEIS = b" 221 "
+RPL_STATSUPTIME = b" 242 "
+RPL_STATSDEBUG = b" 249 "
+RPL_LUSERCLIENT = b" 251 "
+RPL_LUSEROP = b" 252 "
+RPL_LUSERUNKNOWN = b" 253 "
+RPL_LUSERCHANNELS = b" 254 "
+RPL_LUSERME = b" 255 "
+RPL_TRYAGAIN = b" 263 "
+RPL_USERHOST = b" 302 "
+RPL_LIST = b" 322 "
+RPL_LISTEND = b" 323 "
+RPL_CHANNELMODEIS = b" 324 "
+RPL_NOTOPIC = b" 331 "
+RPL_TOPIC = b" 332 "
+RPL_NAMREPLY = b" 353 "
+RPL_ENDOFNAMES = b" 366 "
+RPL_MOTD = b" 372 "
+RPL_MOTDSTART = b" 375 "
+RPL_ENDOFMOTD = b" 376 "
+RPL_YOUREOPER = b" 381 "
+RPL_REHASHING = b" 382 "
+RPL_TIME = b" 391 "
+RPL_USERSSTART = b" 392 "
+RPL_USERS = b" 393 "
+RPL_ENDOFUSERS = b" 394 "
+RPL_NOUSERS = b" 395 "
+ERR_NOSUCHNICK = b" 401 "
+ERR_NOSUCHCHANNEL = b" 403 "
+# https://ircv3.net/specs/extensions/capability-negotiation#errors
+ERR_INVALIDCAPCMD = b" 410 "
+ERR_NONICKNAMEGIVEN = b" 431 "
+ERR_ERRONEUSNICKNAME = b" 432 "
+ERR_NICKNAMEINUSE = b" 433 "
+ERR_USERNOTINCHANNEL = b" 441 "
+ERR_NOTONCHANNEL = b" 442 "
+ERR_USERSDISABLED = b" 446 "
+ERR_NEEDMOREPARAMS = b" 461 "
+ERR_ALREADYREGISTRED = b" 462 "
+ERR_PASSWDMISMATCH = b" 464 "
+# Not in the RFCs (ERR_INVALIDUSERNAME of some servers): clients are found by
+# username, which must be unique
+ERR_USERNAMEINUSE = b" 468 "
+ERR_UNKNOWNMODE = b" 472 "
+ERR_BADCHANNELKEY = b" 475 "
+ERR_NOCHANMODES = b" 477 "
+ERR_NOPRIVILEGES = b" 481 "
+ERR_CHANOPRIVSNEEDED = b" 482 "
+ERR_UMODEUNKNOWNFLAG = b" 501 "
+ERR_USERSDONTMATCH = b" 502 "
+
+# Replies without parameters are built only once
+_listEnd = (RPL_LISTEND, b" :End of LIST\r\n")
+_endOfMotd = (RPL_ENDOFMOTD, b" :End of MOTD command\r\n")
+_youreOper = (RPL_YOUREOPER, b" :You are now an IRC operator\r\n")
+_usersStart = (RPL_USERSSTART, b" :UserID   Terminal  Host\r\n")
+_endOfUsers = (RPL_ENDOFUSERS, b" :End of users\r\n")
+_noUsers = (RPL_NOUSERS, b" :Nobody logged in\r\n")
+_noNickGiven = (ERR_NONICKNAMEGIVEN, b" :No nickname given\r\n")
+_usersDisabled = (ERR_USERSDISABLED, b" :USERS has been disabled\r\n")
+_alreadyRegistered = (
+    ERR_ALREADYREGISTRED,
+    b" :Unauthorized command (already registered)\r\n",
+)
+_passwordMismatch = (ERR_PASSWDMISMATCH, b" :Password incorrect\r\n")
+_noPrivileges = (
+    ERR_NOPRIVILEGES,
+    b" :Permission Denied- You're not an IRC operator\r\n",
+)
+_unknownModeFlag = (ERR_UMODEUNKNOWNFLAG, b" :Unknown MODE flag\r\n")
+_usersDontMatch = (ERR_USERSDONTMATCH, b" :Cannot change mode for other users\r\n")
 
 
 def welcome(nick: str, username: str, host: str) -> Reply:
-    return Reply(
-        "001",
-        f":Welcome to the Internet Relay Network {nick}!{username}@{host}",
+    return (
+        RPL_WELCOME,
+        (
+            " :Welcome to the Internet Relay Network" f" {nick}!{username}@{host}\r\n"
+        ).encode(),
     )
 
 
 def yourHost(serverName: str, version: str) -> Reply:
-    return Reply("002", f":Your host is {serverName}, running version {version}")
+    return (
+        RPL_YOURHOST,
+        f" :Your host is {serverName}, running version {version}\r\n".encode(),
+    )
 
 
 def created(date: str) -> Reply:
-    return Reply("003", f":This server was created {date}")
+    return (RPL_CREATED, f" :This server was created {date}\r\n".encode())
 
 
 def myInfo(serverName: str, version: str, userModes: str, channelModes: str) -> Reply:
-    return Reply("004", f":{serverName} {version} {userModes} {channelModes}")
+    return (
+        RPL_MYINFO,
+        f" :{serverName} {version} {userModes} {channelModes}\r\n".encode(),
+    )
+
+
+def invalidCapCommand(subcommand: str) -> Reply:
+    return (ERR_INVALIDCAPCMD, f" {subcommand} :Invalid CAP command\r\n".encode())
 
 
 def needMoreParams(command: str) -> Reply:
-    return Reply("461", f"{command} :Not enough parameters")
+    return (ERR_NEEDMOREPARAMS, f" {command} :Not enough parameters\r\n".encode())
 
 
 def alreadyRegistered() -> Reply:
-    return Reply("462", ":Unauthorized command (already registered)")
+    return _alreadyRegistered
 
 
 def noNickGiven() -> Reply:
-    return Reply("431", ":No nickname given")
+    return _noNickGiven
 
 
 def nickInUse(nick: str) -> Reply:
-    return Reply("433", f"{nick} :Nickname is already in use")
+    return (ERR_NICKNAMEINUSE, f" {nick} :Nickname is already in use\r\n".encode())
 
 
 def erroneusNick(nick: str) -> Reply:
-    return Reply("432", f"{nick} :Erroneous nickname")
+    return (ERR_ERRONEUSNICKNAME, f" {nick} :Erroneous nickname\r\n".encode())
 
 
 def channelModeIs(channel: Channel) -> Reply:
-    return Reply("324", f"{channel.name} {channel.getSimpleModes()}")
+    return (
+        RPL_CHANNELMODEIS,
+        f" {channel.name} {channel.getSimpleModes()}\r\n".encode(),
+    )
 
 
 def motdStart(server: str) -> Reply:
-    return Reply("375", f":- {server} Message of the day - ")
+    return (RPL_MOTDSTART, f" :- {server} Message of the day - \r\n".encode())
 
 
 def motd(text: str) -> Reply:
-    return Reply("372", f":- {text}")
+    return (RPL_MOTD, f" :- {text}\r\n".encode())
 
 
 def endOfMotd() -> Reply:
-    return Reply("376", ":End of MOTD command")
+    return _endOfMotd
 
 
 def youreOper() -> Reply:
-    return Reply("381", ":You are now an IRC operator")
+    return _youreOper
+
+
+def rehashing(configFile: str) -> Reply:
+    return (RPL_REHASHING, f" {configFile} :Rehashing\r\n".encode())
 
 
 def usersStart() -> Reply:
-    return Reply("392", ":UserID   Terminal  Host")
+    return _usersStart
 
 
 def users(user: User, clientIdentifier: str) -> Reply:
-    return Reply("393", f":{user.username} * {clientIdentifier}")
+    return (RPL_USERS, f" :{user.username} * {clientIdentifier}\r\n".encode())
 
 
 def endOfUsers() -> Reply:
-    return Reply("394", ":End of users")
+    return _endOfUsers
 
 
 def noUsers() -> Reply:
-    return Reply("395", ":Nobody logged in")
+    return _noUsers
 
 
 def userModeIs(mode: str) -> Reply:
-    return Reply("221", mode)
+    return (RPL_UMODEIS, f" {mode}\r\n".encode())
 
 
-def lUserClient(users: int, services: int) -> Reply:
-    return Reply("251", f":There are {users} users and {services} services on 1 server")
+def lUserClient(users: int, services: int, servers: int) -> Reply:
+    unit = "server" if servers == 1 else "servers"
+    return (
+        RPL_LUSERCLIENT,
+        (
+            f" :There are {users} users and {services} services"
+            f" on {servers} {unit}\r\n"
+        ).encode(),
+    )
 
 
 def lUserOp(ops: int) -> Reply:
-    return Reply("252", f"{ops} :operator(s) online")
+    return (RPL_LUSEROP, f" {ops} :operator(s) online\r\n".encode())
 
 
 def lUserUnknown(unknown: int) -> Reply:
-    return Reply("253", f"{unknown} :unknown connection(s)")
+    return (RPL_LUSERUNKNOWN, f" {unknown} :unknown connection(s)\r\n".encode())
 
 
 def lUserChannels(channels: int) -> Reply:
-    return Reply("254", f"{channels} :channels formed")
+    return (RPL_LUSERCHANNELS, f" {channels} :channels formed\r\n".encode())
 
 
-def lUserMe(me: int) -> Reply:
-    return Reply("255", f":I have {me} clients and 0 servers")
+def lUserMe(clients: int, servers: int) -> Reply:
+    return (
+        RPL_LUSERME,
+        f" :I have {clients} clients and {servers} servers\r\n".encode(),
+    )
+
+
+def tryAgain(command: str) -> Reply:
+    return (
+        RPL_TRYAGAIN,
+        f" {command} :Please wait a while and try again.\r\n".encode(),
+    )
 
 
 def noSuchNick(nick: str) -> Reply:
-    return Reply("401", f"{nick} :No such nick/channel")
+    return (ERR_NOSUCHNICK, f" {nick} :No such nick/channel\r\n".encode())
 
 
 def noSuchChannel(channelName: str) -> Reply:
-    return Reply("403", f"{channelName} :No such channel")
+    return (ERR_NOSUCHCHANNEL, f" {channelName} :No such channel\r\n".encode())
 
 
 def usersDisabled() -> Reply:
-    return Reply("446", ":USERS has been disabled")
+    return _usersDisabled
 
 
 def passwordMismatch() -> Reply:
-    return Reply("464", ":Password incorrect")
+    return _passwordMismatch
+
+
+def usernameInUse(username: str) -> Reply:
+    return (
+        ERR_USERNAMEINUSE,
+        f" {username} :Username is already in use\r\n".encode(),
+    )
 
 
 def badChannelKey(channelName: str) -> Reply:
-    return Reply("475", f"{channelName} :Cannot join channel (+k)")
+    return (
+        ERR_BADCHANNELKEY,
+        f" {channelName} :Cannot join channel (+k)\r\n".encode(),
+    )
 
 
+# https://datatracker.ietf.org/doc/html/rfc2812#section-4.8
 def userHost(user: User, clientIdentifier: str) -> Reply:
-    isOperator = "*" if user.isOperator() else None
-    isAway = "-" if user.isAway() else None
-
-    return Reply(
-        "302",
-        f":{user.nick}{isOperator}={isAway}{clientIdentifier}",
+    isOperator = "*" if user.isOperator() else ""
+    isAway = "-" if user.isAway() else "+"
+    return (
+        RPL_USERHOST,
+        f" :{user.nick}{isOperator}={isAway}{clientIdentifier}\r\n".encode(),
     )
 
 
 def channelList(channel: Channel) -> Reply:
-    return Reply("322", f"{channel.name} {len(channel.getAllUsers())} :{channel.topic}")
+    return (
+        RPL_LIST,
+        f" {channel.name} {channel.getMemberCount()} :{channel.topic}\r\n".encode(),
+    )
 
 
 def channelListEnd() -> Reply:
-    return Reply("323", ":End of LIST")
+    return _listEnd
 
 
 def topic(channel: Channel) -> Reply:
     if channel.topic:
-        return Reply("332", f"{channel.name} :{channel.topic}")
+        return (RPL_TOPIC, f" {channel.name} :{channel.topic}\r\n".encode())
     else:
-        return Reply("331", f"{channel.name} :No topic is set")
-
-
-def names(channel: Channel) -> Reply:
-    operators = list(map(lambda opName: f"@{opName}", channel.getOperators().keys()))
-    users = list(channel.getUsers().keys())
-    return Reply("353", f"= {channel.name} :{' '.join(operators + users)}")
+        return (RPL_NOTOPIC, f" {channel.name} :No topic is set\r\n".encode())
+
+
+def names(channel: Channel, headLength: int) -> Iterator[Reply]:
+    """As many lines as needed for the members to fit in MAX_LINE_LENGTH, once
+    the prefix, code and nick (headLength bytes) are put in front"""
+    # Names are joined at once and cut at the last space fitting in a line, so
+    # the work per member stays in C. Copying the members instead would create
+    # a tuple per member for the garbage collector to scan.
+    with channel.lock:
+        text = " ".join(
+            [
+                f"{getMemberPrefix(flags)}{user.username}"
+                for user, flags in channel.members.items()
+            ]
+        ).encode()
+    start = f" = {channel.name} :".encode()
+    room = MAX_LINE_LENGTH - headLength - len(start) - len(b"\r\n")
+    position = 0
+    while position < len(text):
+        end = len(text)
+        if end - position > room:
+            end = text.rfind(b" ", position, position + room + 1)
+            if end <= position:
+                # A single name longer than a line
+                end = position + room
+        yield (RPL_NAMREPLY, b"".join((start, text[position:end], b"\r\n")))
+        position = end + 1
 
 
 def endOfNames(channelName: str) -> Reply:
-    return Reply("366", f"{channelName} :End of NAMES list")
+    return (RPL_ENDOFNAMES, f" {channelName} :End of NAMES list\r\n".encode())
 
 
 def time(server: str, time: str) -> Reply:
-    return Reply("391", f"{server} :{time}")
+    return (RPL_TIME, f" {server} :{time}\r\n".encode())
 
 
 def unknownMode(channel: Channel, mode: str) -> Reply:
-    return Reply("472", f"{mode} :is unknown mode char to me for {channel.name}")
+    return (
+        ERR_UNKNOWNMODE,
+        f" {mode} :is unknown mode char to me for {channel.name}\r\n".encode(),
+    )
 
 
 def noChannelModes(channelName: str) -> Reply:
-    return Reply("477", f"{channelName} :Channel doesn't support modes")
+    return (
+        ERR_NOCHANMODES,
+        f" {channelName} :Channel doesn't support modes\r\n".encode(),
+    )
+
+
+def userNotInChannel(nick: str, channelName: str) -> Reply:
+    return (
+        ERR_USERNOTINCHANNEL,
+        f" {nick} {channelName} :They aren't on that channel\r\n".encode(),
+    )
+
+
+def notOnChannel(channelName: str) -> Reply:
+    return (
+        ERR_NOTONCHANNEL,
+        f" {channelName} :You're not on that channel\r\n".encode(),
+    )
+
+
+def chanOPrivsNeeded(channelName: str) -> Reply:
+    return (
+        ERR_CHANOPRIVSNEEDED,
+        f" {channelName} :You're not channel operator\r\n".encode(),
+    )
 
 
 def unknownModeFlag() -> Reply:
-    return Reply("501", ":Unknown MODE flag")
+    return _unknownModeFlag
 
 
 def usersDontMatch() -> Reply:
-    return Reply("502", ":Cannot change mode for other users")
+    return _usersDontMatch
+
+
+def statsCommands(command: str, count: int, byteCount: int) -> Reply:
+    return (RPL_STATSCOMMANDS, f" {command} {count} {byteCount} 0\r\n".encode())
+
+
+def statsUptime(seconds: int) -> Reply:
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return (
+        RPL_STATSUPTIME,
+        f" :Server Up {days} days {hours}:{minutes:02}:{seconds:02}\r\n".encode(),
+    )
+
+
+def statsDebug(text: str) -> Reply:
+    return (RPL_STATSDEBUG, f" :{text}\r\n".encode())
+
+
+def endOfStats(query: str) -> Reply:
+    return (RPL_ENDOFSTATS, f" {query} :End of STATS report\r\n".encode())
+
+
+def noPrivileges() -> Reply:
+    return _noPrivileges
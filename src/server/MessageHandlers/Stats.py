@@ -0,0 +1,72 @@
+from lib.Message import Message
+
+from .Handler import Handler, FailedParamValidation
+from ..ServerState import Client
+from .Reply import (
+    endOfStats,
+    noPrivileges,
+    statsCommands,
+    statsDebug,
+    statsUptime,
+    Reply,
+)
+
+
+# https://datatracker.ietf.org/doc/html/rfc2812#section-3.4.4
+# Operators only. Supports the m (commands) and u (uptime) queries, plus z for
+# the internal metrics (also served to Prometheus, see Metrics).
+class Stats(Handler):
+    def handle(self, client: Client, message: Message):
+        try:
+            self._requireParams(client, message)
+        except FailedParamValidation:
+            return
+
+        if not client.user.isOperator():
+            self._replyNumeric(client, noPrivileges())
+            return
+
+        query = message.params[0][:1]
+        metrics = self.serverState.metrics
+        replies: list[Reply] = []
+
+        if query == "m":
+            for command, stats in sorted(metrics.commands.items()):
+                if stats.count:
+                    replies.append(statsCommands(command, stats.count, stats.bytes))
+        elif query == "u":
+            replies.append(statsUptime(int(metrics.getUptime())))
+        elif query == "z":
+            gauges = metrics.getGauges()
+            fanout = metrics.fanout
+            replies += [
+                statsDebug(
+                    f"clients {gauges['clients']}"
+                    f" unregistered {gauges['newClients']}"
+                    f" remote {gauges['remoteClients']}"
+                    f" channels {gauges['channels']}"
+                ),
+                statsDebug(
+                    f"bytes received {metrics.bytesIn} sent {metrics.bytesOut}"
+                    f" writes {metrics.socketWrites}"
+                ),
+                statsDebug(
+                    f"sendq bytes {gauges['sendQueueBytes']}"
+                    f" max {gauges['sendQueueMaxBytes']}"
+                    f" exceeded {metrics.sendQueueExceeded}"
+                ),
+                statsDebug(f"fanout messages {fanout.count} recipients {fanout.sum}"),
+                statsDebug(
+                    f"flood throttled {metrics.throttledLines}"
+                    f" excess {metrics.excessFlood}"
+                ),
+            ]
+            for command, stats in sorted(metrics.commands.items()):
+                if stats.count:
+                    average = stats.nanoseconds // stats.count // 1000
+                    replies.append(
+                        statsDebug(f"{command} count {stats.count} avg {average}us")
+                    )
+
+        replies.append(endOfStats(query or "*"))
+        self._replyNumeric(client, replies)
@@ -3,12 +3,13 @@ from datetime import datetime
 from lib.Message import Message
 
 from .Handler import Handler
+from ..ServerState import Client
 from .Reply import time
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.4.6
 class Time(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         self._replyNumeric(
-            self.client, time(self.serverState.getPrefix(), datetime.now().isoformat())
+            client, time(self.serverState.getPrefix(), datetime.now().isoformat())
         )
@@ -2,6 +2,7 @@ from lib.logger import logger
 from lib.Message import Message
 
 from .Handler import Handler, FailedParamValidation
+from ..ServerState import Client
 from .Reply import topic
 
 
@@ -10,36 +11,37 @@ log = logger.getChild("server.MessageHandlers.Topic")
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.2.4
 class Topic(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message)
+            self._requireParams(client, message)
 
             channelName = message.params[0]
             try:
-                newTopic = " ".join(message.params[1:]).lstrip(":")
+                newTopic = message.params[1]
             except IndexError:
                 newTopic = None
 
-            if channelName in self.serverState.channels:
-                channel = self.serverState.channels[channelName]
+            if channel := self.serverState.getChannel(channelName):
                 if newTopic:
                     channel.setTopic(newTopic)
-                    self.client.handler.send(
+                    self.serverState.publishChannel(channel)
+                    self.serverState.saveChannel(channel)
+                    client.handler.send(
                         (
-                            f":{self.client.user.nick}"
+                            f":{client.user.nick}"
                             f" TOPIC {channel.name}"
                             f" :{channel.topic}\r\n"
                         )
                     )
                     log.info(
                         (
-                            f"User {self.client.user.nick}"
+                            f"User {client.user.nick}"
                             f" changed topic of channel {channel.name}"
                             f" to {channel.topic}"
                         )
                     )
                 else:
-                    self._replyNumeric(self.client, topic(channel))
+                    self._replyNumeric(client, topic(channel))
             else:
                 # TODO: ERR_NOTONCHANNEL?
                 pass
@@ -4,36 +4,68 @@ from lib.Message import Message
 from .Handler import Handler, FailedParamValidation
 from .LUsers import LUsers
 from .Motd import Motd
-from ..ServerState import Client
-from .Reply import alreadyRegistered, welcome, yourHost, created, myInfo
+from ..ServerState import ServerState, Client
+from .Reply import (
+    Burst,
+    alreadyRegistered,
+    usernameInUse,
+    welcome,
+    yourHost,
+    created,
+    myInfo,
+)
 
 
 log = logger.getChild("server.MessageHandlers.User")
 
 
+VERSION = "0.0.1"
+USER_MODES = "aiwroOs"
+CHANNEL_MODES = "OovaimnqpsrtklbeI"
+
+
 # https://datatracker.ietf.org/doc/html/rfc2812#section-3.1.3
 class User(Handler):
-    def handle(self, message: Message):
+    lUsersHandler: LUsers
+    motdHandler: Motd
+    # The replies following the welcome, the same for every client
+    serverInfo: Burst
+
+    def __init__(self, serverState: ServerState):
+        super().__init__(serverState)
+        self.lUsersHandler = LUsers(serverState)
+        self.motdHandler = Motd(serverState)
+        self.serverInfo = Burst(
+            serverState.prefixBytes,
+            [
+                yourHost(serverState.host, VERSION),
+                created(serverState.createdDate),
+                myInfo(serverState.host, VERSION, USER_MODES, CHANNEL_MODES),
+            ],
+        )
+
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message, 4)
-            if self.client.user.username:
-                self._replyNumeric(self.client, alreadyRegistered())
+            self._requireParams(client, message, 4)
+            if client.user.username:
+                self._replyNumeric(client, alreadyRegistered())
             else:
-                self.serverState.removeUser(self.client.handler)
-
-                self.client.user.username = message.params[0]
                 invisibleMode = int(message.params[1]) & 4
                 if invisibleMode:
-                    self.client.user.setInvisible(True)
-                self.client.user.realname = " ".join(message.params[3:])
+                    client.user.setInvisible(True)
+                client.user.realname = message.params[3]
+
+                username = message.params[0]
+                if not self.serverState.registerUser(client, username):
+                    self._replyNumeric(client, usernameInUse(username))
+                    return
 
-                self.serverState.clients[self.client.user.username] = self.client
-                self.sendWelcome(self.client)
+                self.sendWelcome(client)
 
                 log.info(
                     (
-                        f"Registered user {self.client.user.nick}"
-                        f" from {self.client.handler.getClientAddress()}"
+                        f"Registered user {client.user.nick}"
+                        f" from {client.handler.getClientAddress()}"
                     )
                 )
         except FailedParamValidation:
@@ -41,22 +73,20 @@ class User(Handler):
 
     # https://datatracker.ietf.org/doc/html/rfc2813#section-5.2.1
     def sendWelcome(self, client: Client) -> None:
-        assert client.user.username is not None
-        replies = [
-            welcome(
-                client.user.nick,
-                client.user.username,
-                client.handler.getHost(),
-            ),
-            yourHost(self.serverState.host, "0.0.1"),
-            created(self.serverState.createdDate),
-            myInfo(
-                client.handler.getHost(),
-                "0.0.1",
-                "aiwroOs",
-                "OovaimnqpsrtklbeI",
-            ),
-            *LUsers(self.serverState, self.client).lUsers(),
-            *Motd(self.serverState, self.client).motd(),
-        ]
-        self._replyNumeric(client, replies)
+        user = client.user
+        assert user.username is not None
+        nick = user.nick.encode()
+        # Only the welcome and the LUSERS counters are rendered per client
+        client.handler.sendRaw(
+            b"".join(
+                (
+                    self._renderNumeric(
+                        client,
+                        welcome(user.nick, user.username, client.handler.getHost()),
+                    ),
+                    self.serverInfo.render(nick),
+                    self._renderNumeric(client, self.lUsersHandler.lUsers()),
+                    self.motdHandler.getBurst().render(nick),
+                )
+            )
+        )
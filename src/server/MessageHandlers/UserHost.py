@@ -1,20 +1,24 @@
 from lib.Message import Message
 
 from .Handler import Handler, FailedParamValidation
-from .Reply import userHost
+from ..ServerState import Client
+from .Reply import userHost, noSuchNick
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-4.8
 class UserHost(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         try:
-            self._requireParams(self.client, message)
+            self._requireParams(client, message)
 
             nick = message.params[0]
             otherClient = self.serverState.getClientFromNick(nick)
-            self._replyNumeric(
-                self.client,
-                userHost(otherClient.user, otherClient.getIdentifier()),
-            )
+            if otherClient:
+                self._replyNumeric(
+                    client,
+                    userHost(otherClient.user, otherClient.getIdentifier()),
+                )
+            else:
+                self._replyNumeric(client, noSuchNick(nick))
         except FailedParamValidation:
             pass
@@ -1,21 +1,23 @@
 from lib.Message import Message
 
 from .Handler import Handler
+from ..ServerState import Client
 from .Reply import Reply, usersDisabled, usersStart, noUsers, users, endOfUsers
 
 
 # https://datatracker.ietf.org/doc/html/rfc2812#section-4.6
 class Users(Handler):
-    def handle(self, message: Message):
+    def handle(self, client: Client, message: Message):
         if self.serverState.usersDisabled:
-            self._replyNumeric(self.client, usersDisabled())
+            self._replyNumeric(client, usersDisabled())
             return
 
         replies: list[Reply] = [usersStart()]
-        if len(self.serverState.clients) == 0:
+        clients = self.serverState.getClients()
+        if len(clients) == 0:
             replies.append(noUsers())
         else:
-            for client in self.serverState.clients.values():
-                replies.append(users(client.user, client.getIdentifier()))
+            for other in clients:
+                replies.append(users(other.user, other.getIdentifier()))
         replies.append(endOfUsers())
-        self._replyNumeric(self.client, replies)
+        self._replyNumeric(client, replies)
@@ -1,4 +1,5 @@
 from .Cap import Cap
+from .ChatHistory import ChatHistory
 from .Error import Error
 from .Join import Join
 from .Kick import Kick
@@ -13,6 +14,9 @@ from .Part import Part
 from .Pass import Pass
 from .Ping import Ping
 from .PrivMsg import PrivMsg
+from .Profile import Profile
+from .Rehash import Rehash
+from .Stats import Stats
 from .Time import Time
 from .Topic import Topic
 from .User import User
@@ -22,6 +26,7 @@ from .Users import Users
 
 HANDLERS = {
     "CAP": Cap,
+    "CHATHISTORY": ChatHistory,
     "ERROR": Error,
     "JOIN": Join,
     "KICK": Kick,
@@ -36,6 +41,9 @@ HANDLERS = {
     "PASS": Pass,
     "PING": Ping,
     "PRIVMSG": PrivMsg,
+    "PROFILE": Profile,
+    "REHASH": Rehash,
+    "STATS": Stats,
     "TIME": Time,
     "TOPIC": Topic,
     "USER": User,
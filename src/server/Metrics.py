@@ -0,0 +1,262 @@
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import time
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from lib.logger import logger
+
+
+if TYPE_CHECKING:
+    from .ServerState import ServerState
+
+
+log = logger.getChild("server.Metrics")
+
+
+# Upper bounds of the command latency buckets, in nanoseconds
+LATENCY_BUCKETS = (
+    10_000,
+    25_000,
+    50_000,
+    100_000,
+    250_000,
+    500_000,
+    1_000_000,
+    2_500_000,
+    10_000_000,
+    100_000_000,
+)
+# Upper bounds of the channel fan-out buckets, in recipients
+FANOUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Updates are not locked: a concurrent update may rarely be lost, which is
+# acceptable for statistics and keeps them cheap enough to stay enabled
+class Histogram:
+    bounds: tuple[int, ...]
+    # One count per bucket, the last one is +Inf
+    counts: list[int]
+    sum: int
+    count: int
+
+    def __init__(self, bounds: tuple[int, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: int) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "", scale: float = 1) -> Iterator[str]:
+        """Prometheus samples, bounds and sum multiplied by scale"""
+        prefix = f"{labels}," if labels else ""
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{prefix}le="{bound * scale:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        yield f"{_sample(name + '_sum', labels)} {self.sum * scale:g}"
+        yield f"{_sample(name + '_count', labels)} {self.count}"
+
+
+class CommandStats(Histogram):
+    bytes: int
+
+    def __init__(self) -> None:
+        super().__init__(LATENCY_BUCKETS)
+        self.bytes = 0
+
+    @property
+    def nanoseconds(self) -> int:
+        return self.sum
+
+
+# Counters are updated where things happen, gauges are read from the server
+# state when the metrics are rendered
+class Metrics:
+    serverState: "ServerState"
+    startedAt: float
+    commands: dict[str, CommandStats]
+    bytesIn: int
+    bytesOut: int
+    # Writes of output to client sockets, coalesced output takes a single one
+    socketWrites: int
+    fanout: Histogram
+    sendQueueExceeded: int
+    excessFlood: int
+    throttledLines: int
+
+    def __init__(self, serverState: "ServerState") -> None:
+        self.serverState = serverState
+        self.startedAt = time()
+        self.commands = {}
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.socketWrites = 0
+        self.fanout = Histogram(FANOUT_BUCKETS)
+        self.sendQueueExceeded = 0
+        self.excessFlood = 0
+        self.throttledLines = 0
+
+    def getCommandStats(self, command: str) -> CommandStats:
+        return self.commands.setdefault(command, CommandStats())
+
+    def getGauges(self) -> dict[str, int]:
+        # Imported here, the state bus depends on the server state
+        from .StateBus import isRemote
+
+        state = self.serverState
+        with state.lock:
+            registered = list(state.clients.values())
+            unregistered = list(state.newClients.values())
+            channels = len(state.channels)
+
+        local = [c for c in registered if not isRemote(c.handler)]
+        sendQueues = [c.handler.getSendQueueSize() for c in local + unregistered]
+        return {
+            "clients": len(local),
+            "remoteClients": len(registered) - len(local),
+            "newClients": len(unregistered),
+            "channels": channels,
+            "sendQueueBytes": sum(sendQueues),
+            "sendQueueMaxBytes": max(sendQueues, default=0),
+        }
+
+    def getUptime(self) -> float:
+        return time() - self.startedAt
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text format"""
+        return "\n".join(self._render()) + "\n"
+
+    def _render(self) -> Iterator[str]:
+        gauges = self.getGauges()
+
+        yield from _header("irc_start_time_seconds", "gauge", "Server start time")
+        yield f"irc_start_time_seconds {self.startedAt:.3f}"
+        yield from _header("irc_clients", "gauge", "Clients of this process")
+        yield f'irc_clients{{state="registered"}} {gauges["clients"]}'
+        yield f'irc_clients{{state="unregistered"}} {gauges["newClients"]}'
+
+        for name, kind, description, value in [
+            ("remote_clients", "gauge", "Clients of other workers", "remoteClients"),
+            ("channels", "gauge", "Channels", "channels"),
+            ("send_queue_bytes", "gauge", "Pending output", "sendQueueBytes"),
+            (
+                "send_queue_max_bytes",
+                "gauge",
+                "Largest pending output of a client",
+                "sendQueueMaxBytes",
+            ),
+        ]:
+            yield from _header(f"irc_{name}", kind, description)
+            yield f"irc_{name} {gauges[value]}"
+
+        for name, description, count in [
+            ("received_bytes_total", "Bytes received", self.bytesIn),
+            ("sent_bytes_total", "Bytes sent", self.bytesOut),
+            ("socket_writes_total", "Writes to client sockets", self.socketWrites),
+            (
+                "send_queue_exceeded_total",
+                "Clients disconnected for exceeding their send queue",
+                self.sendQueueExceeded,
+            ),
+            (
+                "excess_flood_total",
+                "Clients disconnected for flooding",
+                self.excessFlood,
+            ),
+            (
+                "throttled_lines_total",
+                "Lines delayed by flood control",
+                self.throttledLines,
+            ),
+        ]:
+            yield from _header(f"irc_{name}", "counter", description)
+            yield f"irc_{name} {count}"
+
+        yield from _header(
+            "irc_channel_fanout", "histogram", "Recipients of channel messages"
+        )
+        yield from self.fanout.render("irc_channel_fanout")
+
+        commands = [
+            (f'command="{c}"', stats) for c, stats in sorted(self.commands.items())
+        ]
+        yield from _header("irc_commands_total", "counter", "Messages per command")
+        for labels, stats in commands:
+            yield f"{_sample('irc_commands_total', labels)} {stats.count}"
+        yield from _header(
+            "irc_command_received_bytes_total", "counter", "Bytes per command"
+        )
+        for labels, stats in commands:
+            yield f"{_sample('irc_command_received_bytes_total', labels)} {stats.bytes}"
+        yield from _header(
+            "irc_command_duration_seconds", "histogram", "Handling time per command"
+        )
+        for labels, stats in commands:
+            yield from stats.render("irc_command_duration_seconds", labels, 1e-9)
+
+
+def _header(name: str, kind: str, description: str) -> Iterator[str]:
+    yield f"# HELP {name} {description}"
+    yield f"# TYPE {name} {kind}"
+
+
+def _sample(name: str, labels: str) -> str:
+    return f"{name}{{{labels}}}" if labels else name
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    server: "MetricsServer"
+
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+# Serves the metrics for Prometheus on /metrics, from a background thread
+class MetricsServer(ThreadingHTTPServer):
+    metrics: Metrics
+    daemon_threads = True
+
+    def __init__(self, metrics: Metrics, host: str, port: int) -> None:
+        super().__init__((host, port), _MetricsRequestHandler)
+        self.metrics = metrics
+
+    def start(self) -> None:
+        Thread(target=self.serve_forever, name="metrics", daemon=True).start()
+        host, port = self.server_address[:2]
+        log.info(f"Metrics available on http://{host!s}:{port}/metrics")
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def startMetricsServer(
+    metrics: Metrics, port: Optional[int], host: str = "127.0.0.1"
+) -> Optional[MetricsServer]:
+    """Starts the metrics endpoint if a port is configured"""
+    if port is None:
+        return None
+    server = MetricsServer(metrics, host, port)
+    server.start()
+    return server
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Optional
+
+from bcrypt import checkpw
+
+from lib.logger import logger
+
+from .ServerState import OperatorCredential, OperatorCredentials
+
+
+log = logger.getChild("server.Operators")
+
+
+# Credentials hold the operator name, or its bcrypt hash in the files of older
+# versions
+BCRYPT_PREFIX = b"$2"
+# Names looked up among the hashed names whose result is remembered, the
+# names found are always remembered
+MAX_RESOLVED_NAMES = 1024
+
+# Threads checking passwords, bcrypt releases the GIL while hashing
+OPER_WORKERS = 2
+# Checks queued or running beyond which new attempts are turned away
+MAX_PENDING_CHECKS = 64
+
+
+# Finds the credential of an operator name with a dict lookup, an attempt then
+# costs a single password check. Hashed names can only be found by checking
+# them one by one: the result is remembered for a bounded number of names, so
+# an unknown name still costs a check per hashed name.
+class OperatorIndex:
+    names: dict[str, OperatorCredential]
+    hashedNames: list[OperatorCredential]
+    resolved: dict[str, Optional[OperatorCredential]]
+    lock: Lock
+
+    def __init__(self, credentials: OperatorCredentials) -> None:
+        self.names = {}
+        self.hashedNames = []
+        self.resolved = {}
+        self.lock = Lock()
+        for credential in credentials:
+            if credential.userHash.startswith(BCRYPT_PREFIX):
+                self.hashedNames.append(credential)
+            else:
+                self.names[credential.userHash.decode()] = credential
+        if self.hashedNames:
+            log.warning(
+                f"{len(self.hashedNames)} operator names are bcrypt hashes, OPER"
+                " with an unknown name checks every one of them: write the names"
+                " in clear, only the passwords need to be hashed"
+            )
+
+    def find(self, name: str) -> Optional[OperatorCredential]:
+        credential = self.names.get(name)
+        if credential is not None:
+            return credential
+        if name in self.resolved:
+            return self.resolved[name]
+
+        encoded = name.encode()
+        for each in self.hashedNames:
+            if checkpw(encoded, each.userHash):
+                credential = each
+                break
+        with self.lock:
+            if credential is not None or len(self.resolved) < MAX_RESOLVED_NAMES:
+                self.resolved[name] = credential
+        return credential
+
+    def check(self, name: str, password: str) -> bool:
+        """Checks a single password hash once the name is known (blocking)"""
+        credential = self.find(name)
+        return credential is not None and checkpw(
+            password.encode(), credential.passwordHash
+        )
+
+
+# Runs the checks on a small pool of threads, so bcrypt never blocks the
+# threads serving connections or the event loop
+class OperatorAuthenticator:
+    index: OperatorIndex
+    pool: ThreadPoolExecutor
+    pending: int
+    lock: Lock
+
+    def __init__(self, credentials: OperatorCredentials) -> None:
+        self.index = OperatorIndex(credentials)
+        # Threads are started on the first check, after workers are forked
+        self.pool = ThreadPoolExecutor(OPER_WORKERS, thread_name_prefix="oper")
+        self.pending = 0
+        self.lock = Lock()
+
+    def submit(self, name: str, password: str, onDone: Callable[[bool], None]) -> bool:
+        """Checks the credentials in the background and calls onDone with the
+        result, returns False if too many checks are pending"""
+        with self.lock:
+            if self.pending >= MAX_PENDING_CHECKS:
+                return False
+            self.pending += 1
+        self.pool.submit(self._check, name, password, onDone)
+        return True
+
+    def _check(self, name: str, password: str, onDone: Callable[[bool], None]) -> None:
+        try:
+            valid = self.index.check(name, password)
+        except Exception:
+            log.exception("Failed to check operator credentials")
+            valid = False
+        finally:
+            with self.lock:
+                self.pending -= 1
+        onDone(valid)
@@ -0,0 +1,248 @@
+import json
+import os
+from dataclasses import dataclass
+from queue import Empty, SimpleQueue
+from threading import Event, Thread
+from typing import Any, BinaryIO, Optional, Union
+
+from lib.logger import logger
+
+
+log = logger.getChild("server.Persistence")
+
+
+SNAPSHOT_FILE = "channels.snapshot"
+JOURNAL_FILE = "channels.journal"
+
+# Entries written (and synced) at once by the journal writer
+MAX_BATCH_SIZE = 4096
+# The journal is compacted into a snapshot once it holds this many entries
+# and more entries than there are channels
+MIN_COMPACT_ENTRIES = 10_000
+
+# Entries are JSON arrays, one per line. A channel entry holds the whole state
+# of the channel, so replaying entries already in a snapshot is harmless:
+#   ["channel", name, topic, key, userLimit, modes]
+#   ["delete", name]
+JournalEntry = list[Any]
+
+
+# Saved state of a channel. Members are not saved, and neither are operators:
+# usernames are chosen by the clients, nothing ties them to who held the status
+@dataclass(slots=True)
+class ChannelRecord:
+    topic: Optional[str]
+    key: Optional[str]
+    userLimit: Optional[int]
+    modes: int
+
+
+ChannelRecords = dict[str, ChannelRecord]
+
+
+def _readEntries(path: str) -> tuple[list[JournalEntry], int]:
+    """The entries of a file and the length of its complete lines: a crash
+    may have left the last line partially written"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    lines = data.split(b"\n")
+    # Empty if the file ends with a complete line
+    tail = lines.pop()
+    length = len(data) - len(tail)
+    try:
+        # Parsed as a single array, much faster than line by line
+        return json.loads(b"[" + b",".join(lines) + b"]"), length
+    except ValueError:
+        pass
+
+    entries = []
+    for number, line in enumerate(lines, 1):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            log.error(f"Skipping the corrupted line {number} of {path}")
+    return entries, length
+
+
+def _applyEntry(entries: dict[str, JournalEntry], entry: JournalEntry) -> None:
+    if entry[0] == "channel":
+        entries[entry[1]] = entry
+    elif entry[0] == "delete":
+        entries.pop(entry[1], None)
+
+
+def _encode(entries: list[JournalEntry]) -> bytes:
+    return "".join(
+        json.dumps(e, separators=(",", ":")) + "\n" for e in entries
+    ).encode()
+
+
+def _fsyncDirectory(directory: str) -> None:
+    # Makes a rename in the directory durable
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Append-only journal of the channels' state, compacted into snapshots.
+#
+# Changes are queued and written from a background thread: the entries queued
+# meanwhile are written together and synced once (group commit), so handlers
+# never wait for the disk. A snapshot is written to a temporary file and
+# renamed before the journal is truncated, a crash in between only replays
+# entries the snapshot already holds.
+class ChannelJournal:
+    directory: str
+    snapshotPath: str
+    journalPath: str
+    # Latest entry of every channel written, the content of the next snapshot
+    entries: dict[str, JournalEntry]
+    # Entries in the journal file since the last snapshot
+    journalEntries: int
+    queue: "SimpleQueue[Union[JournalEntry, Event, None]]"
+    file: Optional[BinaryIO]
+    thread: Optional[Thread]
+    closed: bool
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.snapshotPath = os.path.join(directory, SNAPSHOT_FILE)
+        self.journalPath = os.path.join(directory, JOURNAL_FILE)
+        self.entries = {}
+        self.journalEntries = 0
+        self.queue = SimpleQueue()
+        self.file = None
+        self.thread = None
+        self.closed = False
+
+    def load(self) -> ChannelRecords:
+        """Reads the latest snapshot and replays the journal, before start"""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot, _ = _readEntries(self.snapshotPath)
+        journal, length = _readEntries(self.journalPath)
+        for entry in snapshot + journal:
+            _applyEntry(self.entries, entry)
+        self.journalEntries = len(journal)
+
+        # New entries must not be appended to a partially written line
+        if (
+            os.path.exists(self.journalPath)
+            and os.path.getsize(self.journalPath) > length
+        ):
+            log.warning(f"Truncating the partially written end of {self.journalPath}")
+            os.truncate(self.journalPath, length)
+
+        log.info(
+            f"Loaded {len(self.entries)} channels"
+            f" ({len(snapshot)} from the snapshot, {len(journal)} journal entries)"
+        )
+        # Entries of older versions end with the operators
+        return {
+            name: ChannelRecord(*entry[2:6]) for name, entry in self.entries.items()
+        }
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(self.journalPath, "ab")
+        self.thread = Thread(target=self._write, name="journal-writer", daemon=True)
+        self.thread.start()
+
+    def saveChannel(
+        self,
+        name: str,
+        topic: Optional[str],
+        key: Optional[str],
+        userLimit: Optional[int],
+        modes: int,
+    ) -> None:
+        if not self.closed:
+            self.queue.put(["channel", name, topic, key, userLimit, modes])
+
+    def deleteChannel(self, name: str) -> None:
+        if not self.closed:
+            self.queue.put(["delete", name])
+
+    def flush(self) -> None:
+        """Blocks until every change queued so far is written and synced"""
+        if self.thread and self.thread.is_alive():
+            flushed = Event()
+            self.queue.put(flushed)
+            flushed.wait()
+
+    def close(self) -> None:
+        """Writes the queued changes and stops, later changes are dropped"""
+        self.closed = True
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _write(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < MAX_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            entries = [item for item in batch if isinstance(item, list)]
+            if entries:
+                self._append(entries)
+
+            for item in batch:
+                if isinstance(item, Event):
+                    item.set()
+                elif item is None:
+                    stopping = True
+
+        assert self.file is not None
+        self.file.close()
+        self.file = None
+
+    def _append(self, entries: list[JournalEntry]) -> None:
+        assert self.file is not None
+        # Kept for the next snapshot even if the journal cannot be written
+        for entry in entries:
+            _applyEntry(self.entries, entry)
+        try:
+            self.file.write(_encode(entries))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError:
+            log.exception(f"Failed to write to {self.journalPath}")
+            return
+
+        self.journalEntries += len(entries)
+        if self.journalEntries >= max(MIN_COMPACT_ENTRIES, len(self.entries)):
+            self._compact()
+
+    def _compact(self) -> None:
+        assert self.file is not None
+        temporaryPath = f"{self.snapshotPath}.tmp"
+        try:
+            with open(temporaryPath, "wb") as f:
+                f.write(_encode(list(self.entries.values())))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporaryPath, self.snapshotPath)
+            _fsyncDirectory(self.directory)
+
+            self.file.truncate(0)
+            os.fsync(self.file.fileno())
+        except OSError:
+            log.exception(f"Failed to write the snapshot {self.snapshotPath}")
+            return
+
+        log.debug(
+            f"Compacted {self.journalEntries} journal entries into a snapshot"
+            f" of {len(self.entries)} channels"
+        )
+        self.journalEntries = 0
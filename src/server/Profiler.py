@@ -0,0 +1,282 @@
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from heapq import heappush, heappushpop
+from signal import SIGUSR1, signal
+from tempfile import gettempdir
+from threading import Event, Lock, Thread, get_ident
+from time import perf_counter, strftime, time
+from types import CodeType, FrameType
+from typing import Callable, Optional
+
+from lib.logger import logger
+from lib.Message import Message
+
+
+log = logger.getChild("server.Profiler")
+
+
+# Messages kept by the slow log
+SLOW_LOG_SIZE = 20
+# Commands whose parameters are secrets, their lines are not kept
+REDACTED_COMMANDS = {"OPER", "PASS"}
+
+# Time between two samples of the sampling profiler, in seconds
+SAMPLE_INTERVAL = 0.001
+DEFAULT_PROFILE_SECONDS = 10
+MAX_PROFILE_SECONDS = 300
+
+# Samples are kept only for stacks going through this function
+SAMPLED_FUNCTION = "ServerCore.handleMessage"
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def _getQualifiedName(frame: FrameType) -> str:
+    """The qualified name of the function of a frame, like ``Class.method``"""
+    code = frame.f_code
+    # Python 3.11+
+    qualifiedName = getattr(code, "co_qualname", None)
+    if qualifiedName:
+        return qualifiedName
+
+    # Looks for the class defining the method in the MRO of self or cls
+    locals = frame.f_locals
+    owner = locals.get("cls")
+    if not isinstance(owner, type):
+        owner = type(locals["self"]) if "self" in locals else None
+    for cls in owner.__mro__ if owner else ():
+        attribute = cls.__dict__.get(code.co_name)
+        function = getattr(attribute, "__func__", attribute)
+        if getattr(function, "__code__", None) is code:
+            return f"{cls.__qualname__}.{code.co_name}"
+    return code.co_name
+
+
+@dataclass(order=True)
+class SlowMessage:
+    nanoseconds: int
+    command: str = field(compare=False)
+    line: str = field(compare=False)
+    timestamp: float = field(compare=False)
+
+
+# Always on: a message faster than the fastest one kept is rejected by a single
+# comparison, without taking the lock
+class SlowLog:
+    size: int
+    # Min-heap, the fastest message kept first
+    messages: list[SlowMessage]
+    threshold: int
+    lock: Lock
+
+    def __init__(self, size: int = SLOW_LOG_SIZE) -> None:
+        self.size = size
+        self.messages = []
+        self.threshold = 0
+        self.lock = Lock()
+
+    def record(self, nanoseconds: int, message: Message) -> None:
+        if nanoseconds <= self.threshold:
+            return
+
+        command = message.command
+        line = command if command in REDACTED_COMMANDS else message.rawMessage
+        entry = SlowMessage(nanoseconds, command, line, time())
+        with self.lock:
+            if len(self.messages) < self.size:
+                heappush(self.messages, entry)
+            else:
+                heappushpop(self.messages, entry)
+            if len(self.messages) == self.size:
+                self.threshold = self.messages[0].nanoseconds
+
+    def getSlowest(self) -> list[SlowMessage]:
+        with self.lock:
+            return sorted(self.messages, reverse=True)
+
+
+# Samples the stacks of the threads handling a message for a fixed time and
+# writes them in the speedscope format (https://www.speedscope.app). Sampling
+# from a thread works with both engines and costs nothing once stopped.
+class SamplingProfiler:
+    path: str
+    seconds: float
+    interval: float
+    onDone: Optional[Callable[[str, Optional[Exception]], None]]
+    frames: list[dict]
+    frameIndexes: dict[CodeType, int]
+    names: dict[CodeType, str]
+    samples: list[list[int]]
+    weights: list[float]
+    stopped: Event
+
+    def __init__(
+        self,
+        path: str,
+        seconds: float,
+        interval: float = SAMPLE_INTERVAL,
+        onDone: Optional[Callable[[str, Optional[Exception]], None]] = None,
+    ) -> None:
+        self.path = path
+        self.seconds = seconds
+        self.interval = interval
+        self.onDone = onDone
+        self.frames = []
+        self.frameIndexes = {}
+        self.names = {}
+        self.samples = []
+        self.weights = []
+        self.stopped = Event()
+
+    def start(self) -> Thread:
+        thread = Thread(target=self._run, name="profiler", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def _run(self) -> None:
+        error: Optional[Exception] = None
+        try:
+            seconds = self._sample()
+            self._write(seconds)
+            log.info(f"Wrote {len(self.samples)} samples to {self.path}")
+        except Exception as e:
+            log.exception(f"Failed to write the profile {self.path}")
+            error = e
+        finally:
+            if self.onDone:
+                self.onDone(self.path, error)
+
+    def _sample(self) -> float:
+        """Samples until stopped or for the given time, returns the time taken"""
+        ownThread = get_ident()
+        started = previous = perf_counter()
+        deadline = started + self.seconds
+
+        while not self.stopped.wait(self.interval):
+            now = perf_counter()
+            for threadId, frame in sys._current_frames().items():
+                if threadId != ownThread:
+                    stack = self._getStack(frame)
+                    if stack:
+                        self.samples.append(stack)
+                        self.weights.append(now - previous)
+            previous = now
+            if now >= deadline:
+                break
+        return perf_counter() - started
+
+    def _getStack(self, frame: Optional[FrameType]) -> Optional[list[int]]:
+        frames: list[FrameType] = []
+        while frame:
+            frames.append(frame)
+            frame = frame.f_back
+
+        if not any(self._getName(f) == SAMPLED_FUNCTION for f in frames):
+            return None
+        # Speedscope wants stacks from the outermost frame
+        return [self._getFrameIndex(f) for f in reversed(frames)]
+
+    def _getName(self, frame: FrameType) -> str:
+        code = frame.f_code
+        name = self.names.get(code)
+        if name is None:
+            name = self.names[code] = _getQualifiedName(frame)
+        return name
+
+    def _getFrameIndex(self, frame: FrameType) -> int:
+        code = frame.f_code
+        index = self.frameIndexes.get(code)
+        if index is None:
+            index = self.frameIndexes[code] = len(self.frames)
+            self.frames.append(
+                {
+                    "name": self._getName(frame),
+                    "file": code.co_filename,
+                    "line": code.co_firstlineno,
+                }
+            )
+        return index
+
+    def _write(self, seconds: float) -> None:
+        profile = {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": f"IRC server {os.getpid()}",
+            "exporter": "irc-server",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": SAMPLED_FUNCTION,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": seconds,
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
+        with open(self.path, "w") as f:
+            json.dump(profile, f)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+# Profiling state of a server: the slow log, and the sampling profiler while
+# one is running
+class Profiler:
+    directory: str
+    slowLog: SlowLog
+    sampling: Optional[SamplingProfiler]
+    lock: Lock
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self.directory = directory or gettempdir()
+        self.slowLog = SlowLog()
+        self.sampling = None
+        self.lock = Lock()
+
+    def startSampling(
+        self,
+        seconds: float = DEFAULT_PROFILE_SECONDS,
+        onDone: Optional[Callable[[str, Optional[Exception]], None]] = None,
+    ) -> str:
+        """Samples for the given time, returns the file the profile is written to"""
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        with self.lock:
+            if self.sampling:
+                raise ProfilerBusy(self.sampling.path)
+
+            name = f"irc-profile-{os.getpid()}-{strftime('%Y%m%d-%H%M%S')}"
+            path = os.path.join(self.directory, f"{name}.speedscope.json")
+
+            def done(path: str, error: Optional[Exception]) -> None:
+                with self.lock:
+                    self.sampling = None
+                if onDone:
+                    onDone(path, error)
+
+            self.sampling = SamplingProfiler(path, seconds, onDone=done)
+            self.sampling.start()
+
+        log.info(f"Profiling for {seconds} seconds")
+        return path
+
+
+def installProfileSignal(profiler: Profiler) -> None:
+    """Starts a profile of the default length on SIGUSR1 (main thread only)"""
+
+    def onSignal(signalNumber: int, frame: Optional[FrameType]) -> None:
+        try:
+            profiler.startSampling()
+        except ProfilerBusy:
+            log.warning("A profile is already running")
+
+    signal(SIGUSR1, onSignal)
@@ -0,0 +1,87 @@
+from collections import deque
+from threading import Condition
+from typing import Callable, Optional
+
+
+# Default high-water mark of a connection's pending output, in bytes
+DEFAULT_SEND_QUEUE_LIMIT = 1024 * 1024
+# Pending output under which a reply paused for the client to catch up resumes
+DRAIN_MARK = 64 * 1024
+
+
+class SendQueueExceeded(Exception):
+    pass
+
+
+# Bounded outbound byte queue of a single connection. Handlers push to it from
+# any thread without blocking, while a writer pops and writes to the socket.
+class SendQueue:
+    limit: int
+    size: int
+    closed: bool
+    chunks: deque[bytes]
+    condition: Condition
+    drainCallbacks: list[Callable[[], None]]
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.size = 0
+        self.closed = False
+        self.chunks = deque()
+        self.condition = Condition()
+        self.drainCallbacks = []
+
+    def push(self, data: bytes) -> None:
+        with self.condition:
+            if self.closed:
+                return
+            if self.size + len(data) > self.limit:
+                raise SendQueueExceeded(self.size + len(data))
+
+            self.chunks.append(data)
+            self.size += len(data)
+            self.condition.notify()
+
+    def pop(self) -> Optional[list[bytes]]:
+        """Waits for pending data and returns all of it, None once closed and drained"""
+        with self.condition:
+            while not self.chunks and not self.closed:
+                self.condition.wait()
+
+            if not self.chunks:
+                return None
+
+            chunks = list(self.chunks)
+            self.chunks.clear()
+            self.size = 0
+            return chunks
+
+    def whenDrained(self, callback: Callable[[], None]) -> bool:
+        """Keeps callback for notifyDrained and returns True, or returns False if
+        the queue is already under DRAIN_MARK. Closed queues drop it."""
+        with self.condition:
+            if not self.closed and self.size <= DRAIN_MARK:
+                return False
+            if not self.closed:
+                self.drainCallbacks.append(callback)
+            return True
+
+    def notifyDrained(self) -> None:
+        """Runs the callbacks kept by whenDrained once the queue is under
+        DRAIN_MARK, called by the writer after each write"""
+        with self.condition:
+            if self.size > DRAIN_MARK or not self.drainCallbacks:
+                return
+            callbacks = self.drainCallbacks
+            self.drainCallbacks = []
+        for callback in callbacks:
+            callback()
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.drainCallbacks = []
+            self.condition.notify()
+
+    def __len__(self) -> int:
+        return self.size
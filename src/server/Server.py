@@ -1,21 +1,25 @@
+import socket
 from socketserver import ThreadingTCPServer
 from typing import Optional
 
 from lib.logger import logger
-from lib.Message import Message
 
-from .ServerState import ServerState, MOTD, OperatorCredentials
+from .ServerCore import ServerCore, LISTEN_BACKLOG
+from .FloodControl import FloodLimits
+from .SendQueue import DEFAULT_SEND_QUEUE_LIMIT
+from .ServerState import MOTD, OperatorCredentials
 from .ClientHandler import ClientHandler
-from .MessageHandlers.handlers import HANDLERS
 
 
 log = logger.getChild("server.Server")
 
 
-class Server(ThreadingTCPServer):
+class Server(ServerCore, ThreadingTCPServer):
     started: bool
+    reusePort: bool
 
-    serverState: ServerState
+    # Inherited from ThreadingTCPServer
+    request_queue_size = LISTEN_BACKLOG
 
     def __init__(
         self,
@@ -24,17 +28,35 @@ class Server(ThreadingTCPServer):
         motd: Optional[MOTD] = [],
         operatorCredentials: Optional[OperatorCredentials] = [],
         createdDate: Optional[str] = None,
+        sendQueueLimit: int = DEFAULT_SEND_QUEUE_LIMIT,
+        reusePort: bool = False,
+        floodLimits: Optional[FloodLimits] = None,
     ) -> None:
-        super().__init__((host, port), ClientHandler)
+        self.reusePort = reusePort
+        ThreadingTCPServer.__init__(self, (host, port), ClientHandler)
 
         host = self.server_address[0]
         port = self.server_address[1]
 
-        self.serverState = ServerState(
-            host, port, motd, operatorCredentials, createdDate
+        ServerCore.__init__(
+            self,
+            host,
+            port,
+            motd,
+            operatorCredentials,
+            createdDate,
+            sendQueueLimit,
+            floodLimits,
         )
         self.started = False
 
+    def server_bind(self) -> None:
+        # Lets worker processes listen on the same port (Linux, BSD). Not left
+        # to allow_reuse_port, which socketserver only honours from Python 3.11
+        if self.reusePort:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        ThreadingTCPServer.server_bind(self)
+
     def start(self) -> None:
         if not self.started:
             self.started = True
@@ -47,22 +69,3 @@ class Server(ThreadingTCPServer):
         self.shutdown()
         self.started = False
         log.info("Server stopped")
-
-    def handleClientConnect(self, handler: ClientHandler) -> None:
-        self.serverState.addUser(handler)
-
-    def handleClientDisconnect(self, handler: ClientHandler) -> None:
-        self.serverState.removeUser(handler)
-
-    def handleMessage(self, handler: ClientHandler, rawMessage: str) -> None:
-        client = self.serverState.getClient(handler)
-        message = Message(rawMessage, client.user)
-
-        if message.command in HANDLERS:
-            Handler = HANDLERS[message.command]
-            messageHandler = Handler(self.serverState, client)
-            messageHandler.handle(message)
-        elif message.command == "QUIT":
-            pass
-        else:
-            log.debug(f"Unhandled command: {message.rawMessage}")
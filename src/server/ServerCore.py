@@ -0,0 +1,92 @@
+from logging import DEBUG
+from time import monotonic
+from typing import Optional
+
+from lib.logger import logger
+from lib.Message import Message
+
+from .Connection import Connection
+from .Dispatcher import Dispatcher
+from .FloodControl import ExcessFlood, FloodLimits, TokenBucket, getCommandCost
+from .SendQueue import DEFAULT_SEND_QUEUE_LIMIT
+from .ServerState import ServerState, MOTD, OperatorCredentials
+
+
+log = logger.getChild("server.ServerCore")
+
+
+# Pending connections the OS queues before accept, sized for reconnect storms
+LISTEN_BACKLOG = 4096
+
+
+# Engine-independent part of the server: owns the state and dispatches
+# messages read by a connection to the message handlers
+class ServerCore:
+    serverState: ServerState
+    dispatcher: Dispatcher
+    sendQueueLimit: int
+    # Flood control is off without limits
+    floodLimits: Optional[FloodLimits]
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        motd: Optional[MOTD] = [],
+        operatorCredentials: Optional[OperatorCredentials] = [],
+        createdDate: Optional[str] = None,
+        sendQueueLimit: int = DEFAULT_SEND_QUEUE_LIMIT,
+        floodLimits: Optional[FloodLimits] = None,
+    ) -> None:
+        self.serverState = ServerState(
+            host, port, motd, operatorCredentials, createdDate
+        )
+        self.dispatcher = Dispatcher(self.serverState)
+        self.sendQueueLimit = sendQueueLimit
+        self.floodLimits = floodLimits
+
+    def handleClientConnect(self, handler: Connection) -> None:
+        self.serverState.addUser(handler)
+        if self.floodLimits:
+            client = self.serverState.getClient(handler)
+            client.floodBucket = TokenBucket(self.floodLimits, monotonic())
+
+    def handleClientDisconnect(self, handler: Connection) -> None:
+        user = handler.user
+        self.serverState.removeUser(handler)
+
+        if user:
+            # The hub frees the nick before other workers learn about the quit
+            self.serverState.releaseNick(handler, user.nick)
+            if user.username:
+                self.serverState.publish(("quit", user.username))
+
+    def handleMessage(self, handler: Connection, rawMessage: bytes) -> float:
+        """Handles a line, returns the seconds the connection must wait before
+        reading the next one (flood control)"""
+        metrics = self.serverState.metrics
+        # Counts the line ending the connection stripped
+        metrics.bytesIn += len(rawMessage) + 2
+        client = self.serverState.getClient(handler)
+        message = Message(rawMessage, client.user)
+
+        delay = 0.0
+        bucket = client.floodBucket
+        if bucket:
+            # Lines read before the connection closed are dropped
+            if bucket.exceeded:
+                return 0.0
+            cost = getCommandCost(self.serverState, message)
+            try:
+                delay = bucket.charge(cost, monotonic())
+            except ExcessFlood:
+                metrics.excessFlood += 1
+                handler.disconnect("Excess Flood")
+                return 0.0
+            if delay:
+                metrics.throttledLines += 1
+
+        if not self.dispatcher.dispatch(client, message) and message.command != "QUIT":
+            if log.isEnabledFor(DEBUG):
+                log.debug(f"Unhandled command: {message.rawMessage}")
+        return delay
@@ -1,23 +1,45 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
+from signal import SIGHUP, signal
 from threading import Lock
-from typing import Optional
+from types import FrameType
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
 from datetime import datetime
+from itertools import count, dropwhile, islice
 
 from lib.logger import logger
-from lib.User import User
-from lib.Channel import Channels
+from lib.User import User, ircLower
+from lib.Channel import Channel, Channels, Modes
 
-from .ClientHandler import ClientHandler
+from .Connection import Connection
+from .FloodControl import TokenBucket
+from .History import History
+from .Metrics import Metrics
+from .Persistence import ChannelJournal, ChannelRecords
+from .Profiler import Profiler
+
+
+if TYPE_CHECKING:
+    from .Links import ServerLinks
+    from .StateBus import BusEvent, StateBus
 
 
 class ClientNotFound(Exception):
     pass
 
 
-@dataclass
+# Slotted, a server keeps one per client of the whole network
+@dataclass(slots=True)
 class Client:
-    handler: ClientHandler
+    handler: Connection
     user: User
+    # Flood control of local clients, when enabled
+    floodBucket: Optional[TokenBucket] = None
+    # Numeric replies waiting for the client to catch up, see
+    # Handler._paceNumeric
+    pacedReplies: Optional[Iterator[tuple[bytes, bytes]]] = None
+    # IRCv3 capabilities the client negotiated, see Cap
+    capabilities: frozenset[str] = frozenset()
 
     def getIdentifier(self) -> str:
         return f"{self.user.nick}!{self.user.username}@{self.handler.getHost()}"
@@ -33,24 +55,53 @@ Clients = dict[str, Client]
 OperatorCredentials = list[OperatorCredential]
 MOTD = list[str]
 
+# Channels taken at a time under the registry lock by iterChannels
+CHANNEL_CHUNK = 256
 
-def _getAnonymousIdentifier(handler: ClientHandler) -> str:
+
+def _getAnonymousIdentifier(handler: Connection) -> str:
     return f"{handler.getHost()}:{handler.getPort()}"
 
 
 log = logger.getChild("server.ServerState")
 
 
+# Concurrency model: the registry lock (lock) guards the client, nick and
+# channel dicts, every Channel guards its members with its own lock. Locks are
+# taken in that order, never the registry lock while holding a channel's.
+# Lookups are single dict reads and take no lock.
 class ServerState:
     host: str
+    prefix: str
+    prefixBytes: bytes
     port: int
     motd: MOTD
     operatorCredentials: OperatorCredentials
     createdDate: str
+    # By case-insensitive name (ircLower), like nicks, in order of creation
     channels: Channels
+    # Serials of the channels, and changes to the channel registry, for
+    # iterChannels
+    channelSerials: Iterator[int]
+    channelsVersion: int
     clients: Clients
     newClients: Clients
+    nicks: Clients
+    # Local clients with the operator mode, counted for LUSERS
+    operators: int
     usersDisabled: bool
+    # Reads the MOTD from the configuration, for REHASH
+    motdLoader: Optional[Callable[[], Optional[MOTD]]]
+    # Connects the worker processes, when there are several
+    bus: Optional["StateBus"]
+    # Links to the other servers of the network, when enabled
+    links: Optional["ServerLinks"]
+    metrics: Metrics
+    profiler: Profiler
+    # Recent messages of the channels, for CHATHISTORY
+    history: History
+    # Saves the state of the channels across restarts, when enabled
+    journal: Optional[ChannelJournal]
 
     lock: Lock
 
@@ -63,52 +114,337 @@ class ServerState:
         createdDate: Optional[str],
     ) -> None:
         self.host = host
+        # Starts every message of the server, numeric replies use it as bytes
+        self.prefix = f":{host}"
+        self.prefixBytes = self.prefix.encode()
         self.port = port
         self.motd = motd or []
         self.operatorCredentials = operatorCredentials or []
         self.createdDate = createdDate or datetime.now().isoformat()
         self.channels = {}
+        self.channelSerials = count(1)
+        self.channelsVersion = 0
         self.clients = {}
         self.newClients = {}
+        # Registered and unregistered clients by nick, using the RFC 1459 casemapping
+        self.nicks = {}
+        self.operators = 0
         self.usersDisabled = False
+        self.motdLoader = None
+        self.bus = None
+        self.links = None
+        self.metrics = Metrics(self)
+        self.profiler = Profiler()
+        self.history = History()
+        self.journal = None
 
         self.lock = Lock()
 
-    def addUser(self, handler: ClientHandler) -> None:
+    def addUser(self, handler: Connection) -> None:
         with self.lock:
             user = User()
             client = Client(handler, user)
             self.newClients[_getAnonymousIdentifier(handler)] = client
             handler.user = user
 
-    def removeUser(self, handler: ClientHandler) -> None:
+    def removeUser(self, handler: Connection) -> None:
         with self.lock:
             if handler.user and handler.user.username:
                 log.info(f"Removing user {handler.user.nick}")
-                for channelName in self.channels:
-                    channel = self.channels[channelName]
-                    if handler.user.username in channel.getAllUsers():
-                        channel.removeUser(handler.user)
-                del self.clients[handler.user.username]
+                for channel in list(handler.user.channels.values()):
+                    channel.removeUser(handler.user)
+                    self._deleteChannelIfEmpty(channel)
+                client = self.clients.pop(handler.user.username)
             elif _getAnonymousIdentifier(handler) in self.newClients:
-                del self.newClients[_getAnonymousIdentifier(handler)]
+                client = self.newClients.pop(_getAnonymousIdentifier(handler))
             else:
                 raise ClientNotFound(handler)
 
-    def getClient(self, handler: ClientHandler) -> Client:
+            self._removeNick(client)
+            if client.user.isOperator():
+                self.operators -= 1
+
+    def addRemoteClient(self, client: Client) -> bool:
+        """Adds a registered client served by another worker or server, returns
+        False if its nick or username is already taken"""
+        username = client.user.username
+        assert username is not None
+        key = ircLower(client.user.nick)
+        with self.lock:
+            if username in self.clients or key in self.nicks:
+                return False
+            self.clients[username] = client
+            self.nicks[key] = client
+            return True
+
+    def registerUser(self, client: Client, username: str) -> bool:
+        """Registers a client, returns False if the username is taken"""
+        with self.lock:
+            # Clients are found by username, local, worker and linked ones alike
+            if username in self.clients:
+                return False
+            del self.newClients[_getAnonymousIdentifier(client.handler)]
+            client.user.username = username
+            self.clients[username] = client
+
+        user = client.user
+        host = client.handler.getHost()
+        self.publish(
+            ("register", username, user.nick, user.realname, host, user.isInvisible())
+        )
+        return True
+
+    def setOperator(self, client: Client, operator: bool) -> bool:
+        """Sets the operator mode, returns False if the client is gone"""
+        user = client.user
+        with self.lock:
+            if user.username:
+                connected = self.clients.get(user.username) is client
+            else:
+                key = _getAnonymousIdentifier(client.handler)
+                connected = self.newClients.get(key) is client
+            if not connected:
+                return False
+
+            if user.isOperator() != operator:
+                user.setOperator(operator)
+                self.operators += 1 if operator else -1
+            return True
+
+    def setMOTD(self, motd: Optional[MOTD]) -> None:
+        # A new list, the handlers render the MOTD again when it is replaced
+        self.motd = list(motd or [])
+
+    def reloadMOTD(self) -> bool:
+        """Reads the MOTD again with motdLoader, returns False if it failed"""
+        if self.motdLoader is None:
+            return False
+        try:
+            motd = self.motdLoader()
+        except OSError as e:
+            log.warning(f"Could not reload the MOTD: {e}")
+            return False
+
+        self.setMOTD(motd)
+        log.info("Reloaded the MOTD")
+        return True
+
+    def changeNick(self, client: Client, nick: str) -> bool:
+        """Gives the client a nick, returns False if another client already has it"""
+        key = ircLower(nick)
+        previousKey = ircLower(client.user.nick)
+        # With several workers, the hub decides which client gets a nick
+        if self.bus and not self.bus.claimNick(key, self._getNickOwner(client.handler)):
+            return False
+
+        changed = False
+        try:
+            with self.lock:
+                owner = self.nicks.get(key)
+                if owner is None or owner is client:
+                    client.user.setNick(nick)
+                    self._removeNick(client, previousKey)
+                    self.nicks[key] = client
+                    changed = True
+        finally:
+            if key != previousKey:
+                # Give up whichever of the two nicks the client does not use
+                self._releaseNick(client.handler, previousKey if changed else key)
+
+        if changed and client.user.username:
+            self.publish(("nick", client.user.username, nick))
+        return changed
+
+    def renameRemoteClient(self, client: Client, nick: str) -> bool:
+        """Renames a client served elsewhere, returns False if another client
+        already has the nick"""
+        key = ircLower(nick)
+        with self.lock:
+            owner = self.nicks.get(key)
+            if owner is not None and owner is not client:
+                return False
+            previousKey = ircLower(client.user.nick)
+            client.user.setNick(nick)
+            self._removeNick(client, previousKey)
+            self.nicks[key] = client
+            return True
+
+    def releaseNick(self, handler: Connection, nick: str) -> None:
+        """Gives up the nick of a connection that closed, across workers"""
+        self._releaseNick(handler, ircLower(nick))
+
+    def _releaseNick(self, handler: Connection, key: str) -> None:
+        if self.bus:
+            self.bus.releaseNick(key, self._getNickOwner(handler))
+
+    def _getNickOwner(self, handler: Connection) -> str:
+        assert self.bus is not None
+        return self.bus.getNickOwner(handler)
+
+    def publish(self, event: "BusEvent") -> None:
+        """Shares a local change with the other workers and servers, if any"""
+        if self.bus:
+            self.bus.publish(event)
+        if self.links:
+            self.links.publish(event)
+
+    def publishChannel(self, channel: Channel) -> None:
+        """Shares the topic and modes of a channel with the other workers and
+        servers, if any"""
+        if self.bus or self.links:
+            self.publish(
+                (
+                    "channel",
+                    channel.name,
+                    channel.topic,
+                    channel.key,
+                    channel.userLimit,
+                    int(channel.modes),
+                )
+            )
+
+    def saveChannel(self, channel: Channel) -> None:
+        """Journals the topic, key, limit and modes of a channel, if enabled"""
+        if self.journal:
+            # Queued under the lock, the journal gets a channel's changes in order
+            with channel.lock:
+                self.journal.saveChannel(
+                    channel.name,
+                    channel.topic,
+                    channel.key,
+                    channel.userLimit,
+                    int(channel.modes),
+                )
+
+    def restoreChannels(self, records: ChannelRecords) -> None:
+        """Creates the channels saved by the journal, without members"""
+        with self.lock:
+            for name, record in records.items():
+                channel = Channel(name, None)
+                channel.topic = record.topic
+                channel.key = record.key
+                channel.userLimit = record.userLimit
+                channel.modes = Modes(record.modes)
+                self._addChannel(channel)
+
+    def _removeNick(self, client: Client, key: Optional[str] = None) -> None:
+        key = key or ircLower(client.user.nick)
+        if self.nicks.get(key) is client:
+            del self.nicks[key]
+
+    @contextmanager
+    def openChannel(
+        self, name: str, creator: User, key: Optional[str] = None
+    ) -> Iterator[tuple[Channel, bool]]:
+        """Yields the channel and whether it was just created for creator, with
+        the channel's lock held"""
+        folded = ircLower(name)
+        while True:
+            with self.lock:
+                channel = self.channels.get(folded)
+                created = channel is None
+                if channel is None:
+                    channel = Channel(name, creator, key)
+                    self._addChannel(channel)
+
+            with channel.lock:
+                # Its last member may have left (deleting it) in the meantime
+                if not channel.closed:
+                    yield channel, created
+                    return
+
+    def _addChannel(self, channel: Channel) -> None:
+        channel.serial = next(self.channelSerials)
+        self.channels[ircLower(channel.name)] = channel
+        self.channelsVersion += 1
+
+    def deleteChannelIfEmpty(self, channel: Channel) -> bool:
+        with self.lock:
+            return self._deleteChannelIfEmpty(channel)
+
+    def _deleteChannelIfEmpty(self, channel: Channel) -> bool:
+        with channel.lock:
+            if channel.closed or channel.members:
+                return False
+
+            log.info(f"Deleting channel {channel.name}")
+            channel.closed = True
+            folded = ircLower(channel.name)
+            if self.channels.get(folded) is channel:
+                del self.channels[folded]
+                self.channelsVersion += 1
+            self.history.discard(channel)
+            if self.journal:
+                self.journal.deleteChannel(channel.name)
+            return True
+
+    def getChannel(self, name: str) -> Optional[Channel]:
+        """The channel with the name, in any case"""
+        return self.channels.get(ircLower(name))
+
+    def getChannels(self) -> list[Channel]:
+        with self.lock:
+            return list(self.channels.values())
+
+    def iterChannels(self) -> Iterator[Channel]:
+        """Iterates over the channels without copying the registry, taking
+        CHANNEL_CHUNK of them at a time under the lock. Channels created in the
+        meantime are included, deleted ones may still come up (closed)."""
+        channels: Iterator[Channel] = iter(())
+        version = 0
+        last: Optional[int] = None
+        while True:
+            with self.lock:
+                if last is None:
+                    channels = iter(self.channels.values())
+                elif self.channelsVersion != version:
+                    # The dict iterator is no longer valid: in order of
+                    # creation, the rest follows the last channel taken
+                    after = last
+                    channels = dropwhile(
+                        lambda channel: channel.serial <= after,
+                        iter(self.channels.values()),
+                    )
+                version = self.channelsVersion
+                chunk = list(islice(channels, CHANNEL_CHUNK))
+            if not chunk:
+                return
+            last = chunk[-1].serial
+            yield from chunk
+
+    def getClients(self) -> list[Client]:
+        """Returns the registered clients"""
+        with self.lock:
+            return list(self.clients.values())
+
+    def getClient(self, handler: Connection) -> Client:
         if handler.user and handler.user.username:
             return self.clients[handler.user.username]
         else:
             return self.newClients[_getAnonymousIdentifier(handler)]
 
-    def getUserFromNick(self, nick: str) -> User:
-        return self.getClientFromNick(nick).user
+    def getUserFromNick(self, nick: str) -> Optional[User]:
+        client = self.getClientFromNick(nick)
+        return client.user if client else None
 
-    def getClientFromNick(self, nick: str) -> Client:
-        return next(c for c in self.clients.values() if c.user.nick == nick)
+    def getClientFromNick(self, nick: str) -> Optional[Client]:
+        """Returns the registered client using the nick, if any"""
+        client = self.nicks.get(ircLower(nick))
+        if client and client.user.username:
+            return client
+        return None
 
     def userAlreadyRegistered(self, user: User) -> bool:
         return user.password is not None
 
     def getPrefix(self) -> str:
-        return f":{self.host}"
+        return self.prefix
+
+
+def installReloadSignal(serverState: ServerState) -> None:
+    """Reloads the MOTD on SIGHUP (main thread only)"""
+
+    def onSignal(signalNumber: int, frame: Optional[FrameType]) -> None:
+        serverState.reloadMOTD()
+
+    signal(SIGHUP, onSignal)
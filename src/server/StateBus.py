@@ -0,0 +1,417 @@
+from itertools import count
+from multiprocessing.connection import Client as BusClient, Connection, Listener
+from queue import SimpleQueue
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Optional, Protocol, TypeGuard
+
+from lib.Channel import Channel, Modes
+from lib.logger import logger
+from lib.User import User
+
+from .Connection import Connection as ClientConnection
+from .ServerState import Client, ServerState
+
+
+log = logger.getChild("server.StateBus")
+
+
+# Events are tuples whose first item is their kind:
+#   ("register", username, nick, realname, host, invisible)
+#   ("nick", username, nick)
+#   ("quit", username)
+#   ("join", username, channelName)
+#   ("part", username, channelName)
+#   ("op", username, channelName, isOperator)
+#   ("channel", channelName, topic, key, userLimit, modes)
+#   ("channelMessage", channelName, data, history)
+#   ("motd", lines)
+BusEvent = tuple[Any, ...]
+
+# Time a worker waits for the hub to answer a nick claim
+CLAIM_TIMEOUT = 5
+
+
+# Where the messages of clients served elsewhere go: the state bus for the
+# clients of other workers, a server link for those of linked servers
+class Route(Protocol):
+    def deliver(self, username: str, data: bytes) -> None:
+        ...
+
+    def relay(self, channel: Channel, data: bytes, history: bool) -> None:
+        """Sends a message of the channel to its members behind the route"""
+        ...
+
+
+# Stands in for the connection of a client served by another worker or a linked
+# server. Whatever is sent to it is passed on by its route.
+class RemoteConnection:
+    user: Optional[User]
+    route: Route
+    username: str
+    host: str
+
+    def __init__(self, route: Route, username: str, host: str) -> None:
+        self.user = None
+        self.route = route
+        self.username = username
+        self.host = host
+
+    def send(self, message: str) -> None:
+        self.sendRaw(message.encode())
+
+    def sendRaw(self, data: bytes) -> None:
+        self.route.deliver(self.username, data)
+
+    def getClientAddress(self) -> str:
+        return f"{self.host}:0"
+
+    def getHost(self) -> str:
+        return self.host
+
+    def getPort(self) -> int:
+        return 0
+
+    def getSendQueueSize(self) -> int:
+        return 0
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        # Passed on by the route, which does not hold the output back
+        return False
+
+    def disconnect(self, reason: str) -> None:
+        # Only the server (or worker) serving the client can close its connection
+        pass
+
+
+def isRemote(connection: ClientConnection) -> TypeGuard[RemoteConnection]:
+    return isinstance(connection, RemoteConnection)
+
+
+# Runs in the parent process and connects the workers: it forwards events to
+# every other worker, routes messages to the worker of their recipient and is
+# the single authority on which nicks are taken.
+class StateBusHub:
+    listener: Listener
+    workers: dict[int, "_HubWorker"]
+    users: dict[str, int]
+    nicks: dict[str, str]
+    lock: Lock
+
+    def __init__(self, path: str, authkey: bytes) -> None:
+        self.listener = Listener(path, "AF_UNIX", authkey=authkey)
+        self.workers = {}
+        # Worker of every registered user
+        self.users = {}
+        # Owner of every taken nick, by RFC 1459 lowercase nick
+        self.nicks = {}
+        self.lock = Lock()
+
+    def start(self) -> None:
+        Thread(target=self._accept, name="bus-hub", daemon=True).start()
+
+    def stop(self) -> None:
+        self.listener.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                break
+            _, workerId = connection.recv()
+            worker = _HubWorker(workerId, connection)
+            with self.lock:
+                self.workers[workerId] = worker
+            Thread(
+                target=self._read,
+                args=(worker,),
+                name=f"bus-hub-{workerId}",
+                daemon=True,
+            ).start()
+            log.info(f"Worker {workerId} connected")
+
+    def _read(self, worker: "_HubWorker") -> None:
+        while True:
+            try:
+                message = worker.connection.recv()
+            except (EOFError, OSError):
+                break
+
+            kind = message[0]
+            if kind == "event":
+                self._forwardEvent(worker, message[1])
+            elif kind == "deliver":
+                with self.lock:
+                    recipient = self.workers.get(self.users.get(message[1], -1))
+                if recipient and recipient is not worker:
+                    recipient.send(message)
+            elif kind == "claimNick":
+                _, requestId, key, owner = message
+                with self.lock:
+                    claimed = self.nicks.setdefault(key, owner) == owner
+                worker.send(("claimed", requestId, claimed))
+            elif kind == "releaseNick":
+                _, key, owner = message
+                with self.lock:
+                    if self.nicks.get(key) == owner:
+                        del self.nicks[key]
+
+        self._disconnect(worker)
+
+    def _forwardEvent(self, sender: "_HubWorker", event: BusEvent) -> None:
+        with self.lock:
+            if event[0] == "register":
+                self.users[event[1]] = sender.workerId
+            elif event[0] == "quit":
+                self.users.pop(event[1], None)
+            workers = [w for w in self.workers.values() if w is not sender]
+
+        for worker in workers:
+            worker.send(("event", event))
+
+    def _disconnect(self, worker: "_HubWorker") -> None:
+        log.warning(f"Worker {worker.workerId} disconnected")
+        prefix = f"{worker.workerId}/"
+        with self.lock:
+            del self.workers[worker.workerId]
+            for key, owner in list(self.nicks.items()):
+                if owner.startswith(prefix):
+                    del self.nicks[key]
+            usernames = [u for u, w in self.users.items() if w == worker.workerId]
+
+        # The clients of the worker are gone, so are they for everyone else
+        for username in usernames:
+            self._forwardEvent(worker, ("quit", username))
+        worker.close()
+
+
+# Hub side of a worker connection. Outgoing messages are queued and written by a
+# dedicated thread, so a worker that is slow to read never stalls the others.
+class _HubWorker:
+    workerId: int
+    connection: Connection
+    queue: SimpleQueue
+
+    def __init__(self, workerId: int, connection: Connection) -> None:
+        self.workerId = workerId
+        self.connection = connection
+        self.queue = SimpleQueue()
+        Thread(
+            target=self._write, name=f"bus-hub-writer-{workerId}", daemon=True
+        ).start()
+
+    def send(self, message: Any) -> None:
+        self.queue.put(message)
+
+    def close(self) -> None:
+        self.queue.put(None)
+
+    def _write(self) -> None:
+        while True:
+            message = self.queue.get()
+            if message is None:
+                break
+            try:
+                self.connection.send(message)
+            except OSError:
+                break
+        self.connection.close()
+
+
+# Worker side of the bus. Local changes are published as events, events from
+# the other workers are applied to a replica of their clients and channels in
+# serverState, so handlers see every client as if it was local.
+class StateBus:
+    workerId: int
+    connection: Connection
+    serverState: ServerState
+    sendLock: Lock
+    requestIds: "count[int]"
+    claims: dict[int, tuple[Event, list[bool]]]
+    appliers: dict[str, Callable[..., None]]
+
+    def __init__(
+        self, workerId: int, connection: Connection, serverState: ServerState
+    ) -> None:
+        self.workerId = workerId
+        self.connection = connection
+        self.serverState = serverState
+        self.sendLock = Lock()
+        self.requestIds = count()
+        self.claims = {}
+        self.appliers = {
+            "register": self._applyRegister,
+            "nick": self._applyNick,
+            "quit": self._applyQuit,
+            "join": self._applyJoin,
+            "part": self._applyPart,
+            "op": self._applyOp,
+            "channel": self._applyChannel,
+            "channelMessage": self._applyChannelMessage,
+            "motd": self._applyMOTD,
+        }
+
+    @classmethod
+    def connect(
+        cls, path: str, authkey: bytes, workerId: int, serverState: ServerState
+    ) -> "StateBus":
+        bus = cls(workerId, BusClient(path, "AF_UNIX", authkey=authkey), serverState)
+        bus._send(("hello", workerId))
+        Thread(target=bus._read, name="bus-reader", daemon=True).start()
+        serverState.bus = bus
+        return bus
+
+    def _send(self, message: Any) -> None:
+        with self.sendLock:
+            self.connection.send(message)
+
+    def publish(self, event: BusEvent) -> None:
+        self._send(("event", event))
+
+    def deliver(self, username: str, data: bytes) -> None:
+        self._send(("deliver", username, data))
+
+    def getNickOwner(self, connection: ClientConnection) -> str:
+        return f"{self.workerId}/{connection.getClientAddress()}"
+
+    def claimNick(self, key: str, owner: str) -> bool:
+        """Asks the hub for the nick, blocks until it answers"""
+        requestId = next(self.requestIds)
+        answered = Event()
+        result: list[bool] = []
+        self.claims[requestId] = (answered, result)
+        try:
+            self._send(("claimNick", requestId, key, owner))
+            if not answered.wait(CLAIM_TIMEOUT):
+                log.error(f"Hub did not answer the claim of {key}")
+                return False
+            return result[0]
+        finally:
+            del self.claims[requestId]
+
+    def releaseNick(self, key: str, owner: str) -> None:
+        self._send(("releaseNick", key, owner))
+
+    def relay(self, channel: Channel, data: bytes, history: bool) -> None:
+        self.publish(("channelMessage", channel.name, data, history))
+
+    def _read(self) -> None:
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                log.error("Lost the connection to the state bus hub")
+                break
+
+            kind = message[0]
+            try:
+                if kind == "event":
+                    event = message[1]
+                    self.appliers[event[0]](*event[1:])
+                elif kind == "deliver":
+                    client = self.serverState.clients.get(message[1])
+                    if client and not isRemote(client.handler):
+                        client.handler.sendRaw(message[2])
+                elif kind == "claimed":
+                    claim = self.claims.get(message[1])
+                    if claim:
+                        claim[1].append(message[2])
+                        claim[0].set()
+            except Exception:
+                log.exception(f"Failed to apply {message[0]} from the state bus")
+
+    def _getRemoteClient(self, username: str) -> Optional[Client]:
+        client = self.serverState.clients.get(username)
+        if client and isRemote(client.handler):
+            return client
+        return None
+
+    def _applyRegister(
+        self, username: str, nick: str, realname: str, host: str, invisible: bool
+    ) -> None:
+        user = User()
+        user.username = username
+        user.setNick(nick)
+        user.realname = realname
+        user.setInvisible(invisible)
+        connection = RemoteConnection(self, username, host)
+        connection.user = user
+        if not self.serverState.addRemoteClient(Client(connection, user)):
+            log.warning(f"Username {username} is already taken, ignoring {nick}")
+
+    def _applyNick(self, username: str, nick: str) -> None:
+        client = self._getRemoteClient(username)
+        if client:
+            self.serverState.renameRemoteClient(client, nick)
+
+    def _applyQuit(self, username: str) -> None:
+        client = self._getRemoteClient(username)
+        if client:
+            self.serverState.removeUser(client.handler)
+
+    def _applyJoin(self, username: str, channelName: str) -> None:
+        client = self._getRemoteClient(username)
+        if client:
+            with self.serverState.openChannel(channelName, client.user) as (
+                channel,
+                created,
+            ):
+                if not created and not channel.hasUser(client.user):
+                    channel.addUser(client.user)
+
+    def _applyPart(self, username: str, channelName: str) -> None:
+        client = self._getRemoteClient(username)
+        channel = self.serverState.getChannel(channelName)
+        if client and channel:
+            with channel.lock:
+                if channel.hasUser(client.user):
+                    channel.removeUser(client.user)
+            self.serverState.deleteChannelIfEmpty(channel)
+
+    def _applyOp(self, username: str, channelName: str, isOperator: bool) -> None:
+        client = self.serverState.clients.get(username)
+        channel = self.serverState.getChannel(channelName)
+        if client and channel:
+            with channel.lock:
+                if not channel.hasUser(client.user):
+                    return
+                if isOperator and not channel.isOperator(client.user):
+                    channel.addOperator(client.user)
+                elif not isOperator and channel.isOperator(client.user):
+                    channel.removeOperator(client.user)
+
+    def _applyChannel(
+        self,
+        channelName: str,
+        topic: Optional[str],
+        key: Optional[str],
+        userLimit: Optional[int],
+        modes: int,
+    ) -> None:
+        channel = self.serverState.getChannel(channelName)
+        if channel:
+            with channel.lock:
+                channel.topic = topic
+                channel.key = key
+                channel.userLimit = userLimit
+                channel.modes = Modes(modes)
+
+    def _applyChannelMessage(
+        self, channelName: str, data: bytes, history: bool
+    ) -> None:
+        channel = self.serverState.getChannel(channelName)
+        if channel:
+            clients = self.serverState.clients
+            with channel.lock:
+                # Workers with members keep their own copy of the history
+                if history:
+                    self.serverState.history.record(channel, data)
+                for user in channel.members:
+                    # Members always have a username, see Channel.addUser
+                    assert user.username is not None
+                    client = clients.get(user.username)
+                    if client and not isRemote(client.handler):
+                        client.handler.sendRaw(data)
+
+    def _applyMOTD(self, lines: list[str]) -> None:
+        self.serverState.setMOTD(lines)
@@ -0,0 +1,115 @@
+import os
+from multiprocessing import get_context
+from shutil import rmtree
+from signal import SIGHUP, SIGTERM, signal
+from tempfile import mkdtemp
+from types import FrameType
+from typing import Callable, Optional, Union
+
+from lib.logger import logger, stopLogs
+
+from .AsyncServer import AsyncServer
+from .Metrics import startMetricsServer
+from .Profiler import installProfileSignal
+from .Server import Server
+from .ServerState import installReloadSignal
+from .StateBus import StateBus, StateBusHub
+
+
+log = logger.getChild("server.Workers")
+
+
+ServerFactory = Callable[[], Union[Server, AsyncServer]]
+
+# Time given to a worker to stop once the server is shutting down
+WORKER_STOP_TIMEOUT = 5
+
+
+def runWorkers(
+    count: int, createServer: ServerFactory, metricsPort: Optional[int] = None
+) -> None:
+    """Serves with count worker processes listening on the same port.
+
+    Every worker runs its own server, created with reusePort so the kernel
+    spreads new connections over them (SO_REUSEPORT). Workers share clients
+    and channels over a state bus hub running in this process. Linux only:
+    workers are forked.
+
+    Worker n serves its metrics on metricsPort + n, if given. SIGHUP is
+    forwarded to the workers, which reload their MOTD.
+    """
+    directory = mkdtemp(prefix="irc-bus-")
+    path = os.path.join(directory, "bus.sock")
+    authkey = os.urandom(32)
+
+    # Stops like on Ctrl-C, the workers inherit this and stop their server too
+    signal(SIGTERM, _exit)
+
+    # Workers are forked before the hub starts any thread
+    hub = StateBusHub(path, authkey)
+    context = get_context("fork")
+    workers = [
+        context.Process(
+            target=_runWorker,
+            args=(workerId, path, authkey, createServer, metricsPort),
+            name=f"worker-{workerId}",
+        )
+        for workerId in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    hub.start()
+
+    def reload(signalNumber: int, frame: Optional[FrameType]) -> None:
+        for worker in workers:
+            if worker.pid and worker.is_alive():
+                os.kill(worker.pid, SIGHUP)
+
+    signal(SIGHUP, reload)
+    log.info(f"Started {count} workers")
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Ctrl-C reached the workers as well
+        pass
+    except SystemExit:
+        for worker in workers:
+            worker.terminate()
+    finally:
+        for worker in workers:
+            worker.join(WORKER_STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.kill()
+        hub.stop()
+        rmtree(directory, ignore_errors=True)
+
+
+def _exit(signalNumber: int, frame: Optional[FrameType]) -> None:
+    raise SystemExit()
+
+
+def _runWorker(
+    workerId: int,
+    path: str,
+    authkey: bytes,
+    createServer: ServerFactory,
+    metricsPort: Optional[int],
+) -> None:
+    server = createServer()
+    StateBus.connect(path, authkey, workerId, server.serverState)
+    if metricsPort is not None:
+        startMetricsServer(server.serverState.metrics, metricsPort + workerId)
+    installProfileSignal(server.serverState.profiler)
+    installReloadSignal(server.serverState)
+    log.info(f"Worker {workerId} (pid {os.getpid()}) serving")
+
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        # Forked processes exit without running atexit handlers
+        stopLogs()
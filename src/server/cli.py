@@ -1,7 +1,19 @@
+from typing import Optional, Union
+
 from lib.logger import logger, setLogFile
 
 from .Server import Server
-from .Config import Config
+from .AsyncServer import AsyncServer
+from .Links import ServerLinks
+from .Metrics import startMetricsServer
+from .Persistence import ChannelJournal
+from .Profiler import installProfileSignal
+from .ServerState import MOTD, installReloadSignal
+from .Workers import runWorkers
+from .config import Config, Engine
+
+
+log = logger.getChild("server.cli")
 
 
 def main():
@@ -12,18 +24,73 @@ def main():
     if logPath:
         setLogFile(logPath)
 
-    server = Server(
-        config.getHost(),
-        config.getPort(),
-        config.getMOTD(),
-        operatorCredentials=config.getOperatorCredentials(),
-    )
+    ServerClass = AsyncServer if config.getEngine() == Engine.ASYNCIO else Server
+    workers = config.getWorkers()
+
+    def loadMOTD() -> Optional[MOTD]:
+        config.loadMOTD()
+        return config.getMOTD()
+
+    def createServer() -> Union[Server, AsyncServer]:
+        server = ServerClass(
+            config.getHost(),
+            config.getPort(),
+            config.getMOTD(),
+            operatorCredentials=config.getOperatorCredentials(),
+            sendQueueLimit=config.getSendQueueLimit(),
+            reusePort=workers > 1,
+            floodLimits=config.getFloodLimits(),
+        )
+        server.serverState.profiler.directory = config.getProfileDir()
+        server.serverState.motdLoader = loadMOTD
+        server.serverState.history.capacity = config.getHistoryLines()
+        server.serverState.history.budget = config.getHistoryBudget()
+        return server
+
+    dataDir = config.getDataDir()
+    linkPort = config.getLinkPort()
+    peers = config.getLinks()
+    if workers > 1:
+        if dataDir:
+            log.warning("Channels are not saved with several workers")
+        if linkPort or peers:
+            log.warning("Servers are not linked with several workers")
+        runWorkers(workers, createServer, config.getMetricsPort())
+        return
 
+    server = createServer()
+    journal = None
+    if dataDir:
+        journal = ChannelJournal(dataDir)
+        server.serverState.restoreChannels(journal.load())
+        journal.start()
+        server.serverState.journal = journal
+    links = None
+    if linkPort or peers:
+        linkPassword = config.getLinkPassword()
+        if linkPassword:
+            name = config.getServerName()
+            links = ServerLinks(server.serverState, name, linkPassword)
+            if linkPort:
+                links.listen(config.getHost(), linkPort)
+            for host, port in peers:
+                links.connect(host, port)
+        else:
+            log.error("Servers are not linked without LINK_PASSWORD")
+    startMetricsServer(server.serverState.metrics, config.getMetricsPort())
+    installProfileSignal(server.serverState.profiler)
+    installReloadSignal(server.serverState)
     try:
         server.start()
     except KeyboardInterrupt:
         pass
     finally:
+        # Closed first, the channels emptied by the shutdown stay saved
+        if journal:
+            server.serverState.journal = None
+            journal.close()
+        if links:
+            links.stop()
         server.stop()
 
 
@@ -1,3 +1,5 @@
+from enum import Enum
+from tempfile import gettempdir
 from typing import Optional
 
 from tap import Tap
@@ -5,6 +7,14 @@ from pydantic import BaseSettings
 
 from lib.logger import LogLevel, logger
 
+from .FloodControl import (
+    DEFAULT_FLOOD_BURST,
+    DEFAULT_FLOOD_RATE,
+    DEFAULT_FLOOD_TIMEOUT,
+    FloodLimits,
+)
+from .History import DEFAULT_HISTORY_BUDGET, DEFAULT_HISTORY_LINES
+from .SendQueue import DEFAULT_SEND_QUEUE_LIMIT
 from .ServerState import OperatorCredential, OperatorCredentials, MOTD
 
 
@@ -12,6 +22,15 @@ DEFAULT_HOST = "localhost"
 DEFAULT_PORT = 6667
 DEFAULT_LOG_LEVEL = LogLevel.INFO
 
+
+class Engine(Enum):
+    THREADED = "threaded"  # One thread per connection (socketserver)
+    ASYNCIO = "asyncio"  # Single-threaded asyncio event loop
+
+
+DEFAULT_ENGINE = Engine.THREADED
+DEFAULT_WORKERS = 1
+
 log = logger.getChild("server.Config")
 
 
@@ -22,6 +41,14 @@ class CliConfig(Tap):
     port: Optional[int] = None  # Port to listen on
     log_level: Optional[LogLevel] = None  # Log level
     log_path: Optional[str] = None  # Path to log file
+    engine: Optional[Engine] = None  # Server engine (threaded or asyncio)
+    workers: Optional[int] = None  # Worker processes sharing the port (Linux only)
+    metrics_port: Optional[int] = None  # Local port serving Prometheus metrics
+    profile_dir: Optional[str] = None  # Directory profiles are written to
+    data_dir: Optional[str] = None  # Directory channels are saved to
+    server_name: Optional[str] = None  # Name of the server on the network
+    link_port: Optional[int] = None  # Port accepting links from other servers
+    links: Optional[list[str]] = None  # host:port of the servers to link to
 
 
 class FileConfig(BaseSettings):
@@ -31,6 +58,21 @@ class FileConfig(BaseSettings):
     log_path: Optional[str] = None  # Path to log file
     operator_credentials_path: Optional[str] = None  # Path to operator credentials file
     motd_path: Optional[str] = None  # Path to MOTD file
+    engine: Optional[Engine] = None  # Server engine (threaded or asyncio)
+    sendq_limit: Optional[int] = None  # Max bytes of pending output per client
+    flood_rate: Optional[float] = None  # Flood control tokens per second, 0 disables
+    flood_burst: Optional[float] = None  # Flood control tokens a client can save up
+    flood_timeout: Optional[float] = None  # Seconds throttled before Excess Flood
+    history_lines: Optional[int] = None  # Messages kept per channel, 0 disables
+    history_budget: Optional[int] = None  # Max bytes of history of all channels
+    workers: Optional[int] = None  # Worker processes sharing the port (Linux only)
+    metrics_port: Optional[int] = None  # Local port serving Prometheus metrics
+    profile_dir: Optional[str] = None  # Directory profiles are written to
+    data_dir: Optional[str] = None  # Directory channels are saved to
+    server_name: Optional[str] = None  # Name of the server on the network
+    link_port: Optional[int] = None  # Port accepting links from other servers
+    links: Optional[list[str]] = None  # host:port of the servers to link to
+    link_password: Optional[str] = None  # Password of the links, both ways
 
     class Config:
         env_file = ".env"
@@ -57,6 +99,8 @@ class Config:
             f"Log Path: {self.getLogPath()}"
         )
 
+    # One "name:passwordHash" line per operator, the password hashed with bcrypt.
+    # Names hashed with bcrypt (older files) still work, see OperatorIndex.
     def loadOperatorCredentials(self) -> None:
         if self.fileConfig.operator_credentials_path:
             with open(self.fileConfig.operator_credentials_path, "r") as f:
@@ -94,6 +138,60 @@ class Config:
     def getLogPath(self) -> Optional[str]:
         return self.cliConfig.log_path or self.fileConfig.log_path
 
+    def getEngine(self) -> Engine:
+        return self.cliConfig.engine or self.fileConfig.engine or DEFAULT_ENGINE
+
+    def getWorkers(self) -> int:
+        return self.cliConfig.workers or self.fileConfig.workers or DEFAULT_WORKERS
+
+    def getMetricsPort(self) -> Optional[int]:
+        return self.cliConfig.metrics_port or self.fileConfig.metrics_port
+
+    def getProfileDir(self) -> str:
+        return self.cliConfig.profile_dir or self.fileConfig.profile_dir or gettempdir()
+
+    def getDataDir(self) -> Optional[str]:
+        return self.cliConfig.data_dir or self.fileConfig.data_dir
+
+    def getServerName(self) -> str:
+        return (
+            self.cliConfig.server_name or self.fileConfig.server_name or self.getHost()
+        )
+
+    def getLinkPort(self) -> Optional[int]:
+        return self.cliConfig.link_port or self.fileConfig.link_port
+
+    def getLinks(self) -> list[tuple[str, int]]:
+        links = self.cliConfig.links or self.fileConfig.links or []
+        addresses = []
+        for link in links:
+            host, _, port = link.rpartition(":")
+            addresses.append((host, int(port)))
+        return addresses
+
+    def getLinkPassword(self) -> Optional[str]:
+        return self.fileConfig.link_password
+
+    def getSendQueueLimit(self) -> int:
+        return self.fileConfig.sendq_limit or DEFAULT_SEND_QUEUE_LIMIT
+
+    def getFloodLimits(self) -> Optional[FloodLimits]:
+        rate = self.fileConfig.flood_rate
+        if rate == 0:
+            return None
+        return FloodLimits(
+            rate or DEFAULT_FLOOD_RATE,
+            self.fileConfig.flood_burst or DEFAULT_FLOOD_BURST,
+            self.fileConfig.flood_timeout or DEFAULT_FLOOD_TIMEOUT,
+        )
+
+    def getHistoryLines(self) -> int:
+        lines = self.fileConfig.history_lines
+        return DEFAULT_HISTORY_LINES if lines is None else lines
+
+    def getHistoryBudget(self) -> int:
+        return self.fileConfig.history_budget or DEFAULT_HISTORY_BUDGET
+
     def getOperatorCredentials(self) -> Optional[OperatorCredentials]:
         return self.operatorCredentials
 
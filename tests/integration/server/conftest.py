@@ -1,10 +1,11 @@
-from pytest import fixture
-from typing import Generator
+from pytest import fixture, FixtureRequest
+from typing import Generator, Union
 from threading import Thread
 from socket import socket
 from bcrypt import hashpw, gensalt
 
 from server.Server import Server
+from server.AsyncServer import AsyncServer
 from server.ServerState import OperatorCredential
 
 from .utils import createClient
@@ -12,16 +13,17 @@ from .utils import createClient
 SERVER_HOST = "localhost"
 SERVER_PORT = 0
 
-operatorCredentials = [
-    OperatorCredential(
-        hashpw("test".encode(), gensalt()), hashpw("test".encode(), gensalt())
-    )
-]
+# A clear name and a cheap hash: OPER is answered once checked in the background,
+# after the replies the tests wait for if checking takes too long
+operatorCredentials = [OperatorCredential(b"test", hashpw("test".encode(), gensalt(4)))]
 
 
-@fixture
-def server() -> Generator[Server, None, None]:
-    server = Server(SERVER_HOST, SERVER_PORT, ["test"], operatorCredentials, "N/A")
+@fixture(params=[Server, AsyncServer], ids=["threaded", "asyncio"])
+def server(
+    request: FixtureRequest,
+) -> Generator[Union[Server, AsyncServer], None, None]:
+    ServerClass = request.param
+    server = ServerClass(SERVER_HOST, SERVER_PORT, ["test"], operatorCredentials, "N/A")
     serverThread = Thread(target=server.start, daemon=True)
     serverThread.start()
 
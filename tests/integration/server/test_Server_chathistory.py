@@ -0,0 +1,77 @@
+import re
+
+from server.Server import Server
+
+from .utils import createClient, readJoin, readLine, readLines, registerClient
+
+
+def test_Server_chathistory_latest(server: Server):
+    client = createClient(server)
+    client2 = createClient(server)
+    registerClient(client, "test")
+    registerClient(client2, "test2")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    client2.sendall(b"JOIN #chan\r\n")
+    readJoin(client2)
+
+    client.sendall(b"PRIVMSG #chan :first\r\nPRIVMSG #chan :second\r\n")
+    readLines(client2, 2)
+
+    client2.sendall(b"CAP REQ :batch server-time\r\n")
+    assert readLine(client2) == "CAP test2 ACK :batch server-time\r\n"
+    client2.sendall(b"CHATHISTORY LATEST #chan * 10\r\n")
+    lines = readLines(client2, 4)
+
+    assert lines is not None
+    match = re.fullmatch(r":127.0.0.1 BATCH \+(\S+) chathistory #chan\r\n", lines[0])
+    assert match
+    reference = match[1]
+    tags = rf"@batch={reference};time=\d{{4}}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{{3}}Z"
+    assert re.fullmatch(
+        rf"{tags} :test!test@127.0.0.1 PRIVMSG #chan :first\r\n", lines[1]
+    )
+    assert re.fullmatch(
+        rf"{tags} :test!test@127.0.0.1 PRIVMSG #chan :second\r\n", lines[2]
+    )
+    assert lines[3] == f":127.0.0.1 BATCH -{reference}\r\n"
+
+
+def test_Server_chathistory_untagged(server: Server):
+    client = createClient(server)
+    client2 = createClient(server)
+    registerClient(client, "test")
+    registerClient(client2, "test2")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    client2.sendall(b"JOIN #chan\r\n")
+    readJoin(client2)
+
+    client.sendall(b"PRIVMSG #chan :first\r\nPRIVMSG #chan :second\r\n")
+    readLines(client2, 2)
+
+    # Without the capabilities, the messages are replayed as they were sent
+    client2.sendall(b"CHATHISTORY LATEST #chan * 10\r\n")
+    lines = readLines(client2, 2)
+
+    assert lines == [
+        ":test!test@127.0.0.1 PRIVMSG #chan :first\r\n",
+        ":test!test@127.0.0.1 PRIVMSG #chan :second\r\n",
+    ]
+
+
+def test_Server_chathistory_notMember(server: Server):
+    client = createClient(server)
+    client2 = createClient(server)
+    registerClient(client, "test")
+    registerClient(client2, "test2")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+
+    client2.sendall(b"CHATHISTORY LATEST #chan * 10\r\n")
+    response = readLine(client2)
+
+    assert response == (
+        ":127.0.0.1 FAIL CHATHISTORY INVALID_TARGET LATEST #chan"
+        " :Messages could not be retrieved\r\n"
+    )
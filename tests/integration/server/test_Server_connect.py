@@ -2,7 +2,7 @@ from socket import socket
 
 from server.Server import Server
 
-from .utils import createClient, readLine
+from .utils import createClient, readLine, readLines
 
 
 def test_Server_connect(server: Server):
@@ -14,8 +14,18 @@ def test_Server_connectMultipleClients(server: Server):
     createClient(server)
 
 
+def test_Server_reusePort():
+    # Worker processes each bind their own server to the same port
+    first = Server("127.0.0.1", 0, reusePort=True)
+    try:
+        second = Server("127.0.0.1", first.serverState.port, reusePort=True)
+        second.server_close()
+    finally:
+        first.server_close()
+
+
 def test_Server_cap(client: socket):
-    expectedResponse = "CAP * LS :\r\n"
+    expectedResponse = "CAP * LS :batch draft/chathistory server-time\r\n"
 
     client.sendall(b"CAP LS\r\n")
     response = readLine(client)
@@ -26,6 +36,20 @@ def test_Server_cap(client: socket):
     assert response == expectedResponse
 
 
+def test_Server_cap_req(client: socket):
+    client.sendall(b"CAP REQ :batch server-time\r\n")
+    response = readLine(client)
+    assert response == "CAP * ACK :batch server-time\r\n"
+
+    client.sendall(b"CAP REQ :-batch unknown\r\n")
+    response = readLine(client)
+    assert response == "CAP * NAK :-batch unknown\r\n"
+
+    client.sendall(b"CAP REQ -batch\r\nCAP LIST\r\n")
+    response = readLines(client, 2)
+    assert response == ["CAP * ACK :-batch\r\n", "CAP * LIST :server-time\r\n"]
+
+
 def test_Server_ping(client: socket):
     client.sendall(b"PING\r\n")
     response = readLine(client)
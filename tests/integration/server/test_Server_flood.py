@@ -0,0 +1,37 @@
+from time import perf_counter
+from threading import Thread
+from typing import Generator, Union
+
+from pytest import fixture, FixtureRequest
+
+from server.AsyncServer import AsyncServer
+from server.FloodControl import FloodLimits
+from server.Server import Server
+
+from .utils import createClient, readLines
+
+
+@fixture(params=[Server, AsyncServer], ids=["threaded", "asyncio"])
+def floodServer(
+    request: FixtureRequest,
+) -> Generator[Union[Server, AsyncServer], None, None]:
+    limits = FloodLimits(rate=20, burst=1, timeout=10)
+    server = request.param("localhost", 0, [], [], "N/A", floodLimits=limits)
+    serverThread = Thread(target=server.start, daemon=True)
+    serverThread.start()
+
+    yield server
+
+    server.stop()
+    serverThread.join()
+
+
+def test_Server_flood_delayed(floodServer: Server):
+    client = createClient(floodServer)
+    started = perf_counter()
+    client.sendall(b"PING\r\n" * 6)
+
+    # After the burst, lines wait for the 0.5 token of the line before them
+    assert readLines(client, 6) == ["PONG\r\n"] * 6
+    assert perf_counter() - started >= 0.07
+    client.close()
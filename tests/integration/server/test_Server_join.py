@@ -51,3 +51,14 @@ def test_Server_join_channelKey(server: Server):
         ":127.0.0.1 366 test2 #chan :End of NAMES list\r\n",
     ]
     assert responses == expectedResponses
+
+
+def test_Server_join_alreadyJoined(client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    # Ignored, the NAMES reply of the next JOIN follows
+    client.sendall(b"JOIN #chan\r\nJOIN #chan2\r\n")
+    response = readLine(client)
+
+    assert response == ":test!test@127.0.0.1 JOIN #chan2\r\n"
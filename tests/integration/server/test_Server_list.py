@@ -0,0 +1,73 @@
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_RCVBUF
+from time import sleep
+
+from server.Server import Server
+
+from .utils import createClient, readJoin, readLines, registerClient
+
+
+def test_Server_list_filters(server: Server, client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #alpha\r\n")
+    readJoin(client)
+    client.sendall(b"JOIN #beta\r\n")
+    readJoin(client)
+
+    other = createClient(server)
+    registerClient(other, "other")
+    other.sendall(b"JOIN #alpha\r\n")
+    readJoin(other)
+    readLines(client, 1)
+
+    client.sendall(b"LIST >1\r\n")
+    assert readLines(client, 2) == [
+        ":127.0.0.1 322 test #alpha 2 :None\r\n",
+        ":127.0.0.1 323 test :End of LIST\r\n",
+    ]
+
+    client.sendall(b"LIST #*,!#al*\r\n")
+    assert readLines(client, 2) == [
+        ":127.0.0.1 322 test #beta 1 :None\r\n",
+        ":127.0.0.1 323 test :End of LIST\r\n",
+    ]
+
+    client.sendall(b"LIST #unknown\r\n")
+    assert readLines(client, 1) == [":127.0.0.1 323 test :End of LIST\r\n"]
+
+    other.close()
+
+
+def test_Server_list_mixedCase(client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #Mixed\r\n")
+    readJoin(client)
+
+    # Names and masks are case insensitive alike
+    for query in (b"#mixed", b"#MIXED", b"#mIx*"):
+        client.sendall(b"LIST " + query + b"\r\n")
+        assert readLines(client, 2) == [
+            ":127.0.0.1 322 test #Mixed 1 :None\r\n",
+            ":127.0.0.1 323 test :End of LIST\r\n",
+        ]
+
+
+def test_Server_list_paced(server: Server, client: socket):
+    registerClient(client)
+    names = [f"#channel{i}" for i in range(3000)]
+    client.sendall(f"JOIN {','.join(names)}\r\n".encode())
+    readLines(client, 4 * len(names))
+
+    # A client slow to read gets the whole listing once it catches up
+    slowClient = socket(AF_INET, SOCK_STREAM)
+    slowClient.setsockopt(SOL_SOCKET, SO_RCVBUF, 4096)
+    slowClient.connect((server.serverState.host, server.serverState.port))
+    registerClient(slowClient, "slow")
+    slowClient.sendall(b"LIST\r\n")
+    sleep(0.2)
+
+    lines = readLines(slowClient, len(names) + 1)
+    assert lines is not None
+    assert sorted(line.split()[3] for line in lines[:-1]) == sorted(names)
+    assert lines[-1] == ":127.0.0.1 323 slow :End of LIST\r\n"
+
+    slowClient.close()
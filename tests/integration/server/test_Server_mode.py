@@ -1,6 +1,8 @@
 from socket import socket
 
-from .utils import readLine
+from server.Server import Server
+
+from .utils import createClient, readJoin, readLine, readLines, registerClient
 
 
 def test_Server_mode(client: socket):
@@ -12,3 +14,57 @@ def test_Server_mode_notEnoughParameters(client: socket):
     response = readLine(client)
 
     assert response == ":127.0.0.1 461 * MODE :Not enough parameters\r\n"
+
+
+def test_Server_mode_channelOperator(server: Server):
+    client = createClient(server)
+    client2 = createClient(server)
+    registerClient(client, "test")
+    registerClient(client2, "test2")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    client2.sendall(b"JOIN #chan\r\n")
+    readJoin(client2)
+    readLine(client)
+
+    client2.sendall(b"MODE #chan +o test2\r\n")
+    response = readLine(client2)
+    assert response == ":127.0.0.1 482 test2 #chan :You're not channel operator\r\n"
+
+    client.sendall(b"MODE #chan +o nobody\r\n")
+    response = readLine(client)
+    assert response == ":127.0.0.1 401 test nobody :No such nick/channel\r\n"
+
+    client.sendall(b"MODE #chan +o\r\n")
+    response = readLine(client)
+    assert response == ":127.0.0.1 461 test MODE :Not enough parameters\r\n"
+
+    client.sendall(b"MODE #chan +o test2\r\nNAMES #chan\r\n")
+    response = readLines(client, 2)
+    assert response[0] == ":127.0.0.1 353 test = #chan :@test @test2\r\n"
+
+    client2.sendall(b"MODE #chan -o test\r\nNAMES #chan\r\n")
+    response = readLines(client2, 2)
+    assert response[0] == ":127.0.0.1 353 test2 = #chan :test @test2\r\n"
+
+
+def test_Server_mode_channelKey(client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+
+    client.sendall(b"MODE #chan +k secret\r\n")
+    client.sendall(b"MODE #chan\r\n")
+    response = readLine(client)
+    assert response == ":127.0.0.1 324 test #chan k\r\n"
+
+
+def test_Server_mode_userOperator(client: socket):
+    registerClient(client)
+    # Operators are made with OPER only
+    client.sendall(b"MODE test +o\r\nSTATS u\r\n")
+    response = readLine(client)
+
+    assert response == (
+        ":127.0.0.1 481 test :Permission Denied- You're not an IRC operator\r\n"
+    )
@@ -0,0 +1,29 @@
+from socket import socket
+
+from .utils import readJoin, readLines, registerClient
+
+
+def test_Server_names(client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+
+    client.sendall(b"NAMES #chan\r\n")
+    responses = readLines(client, 2)
+
+    assert responses == [
+        ":127.0.0.1 353 test = #chan :@test\r\n",
+        ":127.0.0.1 366 test #chan :End of NAMES list\r\n",
+    ]
+
+
+def test_Server_names_notEnoughParameters(client: socket):
+    registerClient(client)
+    client.sendall(b"NAMES\r\nPING\r\n")
+    responses = readLines(client, 2)
+
+    # The connection is still served
+    assert responses == [
+        ":127.0.0.1 461 test NAMES :Not enough parameters\r\n",
+        "PONG\r\n",
+    ]
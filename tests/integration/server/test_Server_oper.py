@@ -1,6 +1,6 @@
 from socket import socket
 
-from .utils import readLine
+from .utils import readLine, readLines
 
 
 def test_Server_oper(client: socket):
@@ -27,3 +27,12 @@ def test_Server_oper_passwordMismatch(client: socket):
     response = readLine(client)
 
     assert response == ":127.0.0.1 464 * :Password incorrect\r\n"
+
+
+def test_Server_oper_tooManyAttempts(client: socket):
+    client.sendall(b"OPER pass pass\r\n")
+    client.sendall(b"OPER test test\r\n")
+    responses = readLines(client, 2)
+
+    assert ":127.0.0.1 263 * OPER :Please wait a while and try again.\r\n" in responses
+    assert ":127.0.0.1 464 * :Password incorrect\r\n" in responses
@@ -1,6 +1,6 @@
 from socket import socket
 
-from .utils import readLine, registerClient, readJoin
+from .utils import readLine, readLines, registerClient, readJoin
 
 
 def test_Server_part(client: socket):
@@ -11,3 +11,35 @@ def test_Server_part(client: socket):
     response = readLine(client)
 
     assert response == ":test!test@127.0.0.1 PART #chan :Tired\r\n"
+
+
+def test_Server_join_leaveAll(client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    client.sendall(b"JOIN #chan2\r\n")
+    readJoin(client)
+    client.sendall(b"JOIN 0\r\n")
+    responses = readLines(client, 2)
+
+    assert responses == [
+        ":test!test@127.0.0.1 PART #chan\r\n",
+        ":test!test@127.0.0.1 PART #chan2\r\n",
+    ]
+
+
+def test_Server_part_notOnChannel(client: socket):
+    registerClient(client)
+    client.sendall(b"PART #chan\r\n")
+    response = readLine(client)
+    assert response == ":127.0.0.1 403 test #chan :No such channel\r\n"
+
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    client.sendall(b"PART #chan\r\nPART #chan\r\n")
+    responses = readLines(client, 2)
+
+    assert responses == [
+        ":test!test@127.0.0.1 PART #chan\r\n",
+        ":127.0.0.1 403 test #chan :No such channel\r\n",
+    ]
@@ -0,0 +1,41 @@
+from server.Server import Server
+
+from .utils import createClient, readLine, registerClient, readJoin
+
+
+def test_Server_privmsg_nick(server: Server):
+    client = createClient(server)
+    client2 = createClient(server)
+    registerClient(client, "test")
+    registerClient(client2, "Other")
+
+    client.sendall(b"PRIVMSG other :Hello there\r\n")
+    response = readLine(client2)
+
+    assert response == ":test!test@127.0.0.1 PRIVMSG Other :Hello there\r\n"
+
+
+def test_Server_privmsg_noSuchNick(server: Server):
+    client = createClient(server)
+    registerClient(client, "test")
+
+    client.sendall(b"PRIVMSG nobody :Hello\r\n")
+    response = readLine(client)
+
+    assert response == ":127.0.0.1 401 test nobody :No such nick/channel\r\n"
+
+
+def test_Server_privmsg_channel(server: Server):
+    client = createClient(server)
+    client2 = createClient(server)
+    registerClient(client, "test")
+    registerClient(client2, "test2")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    client2.sendall(b"JOIN #chan\r\n")
+    readJoin(client2)
+
+    client.sendall(b"PRIVMSG #chan :Hello  there :)\r\n")
+    response = readLine(client2)
+
+    assert response == ":test!test@127.0.0.1 PRIVMSG #chan :Hello  there :)\r\n"
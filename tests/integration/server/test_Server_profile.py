@@ -0,0 +1,62 @@
+from socket import socket
+
+from server.Server import Server
+
+from .utils import readLine, readLines, registerClient
+
+
+def test_Server_profile_noPrivileges(client: socket):
+    registerClient(client)
+    client.sendall(b"PROFILE SLOW\r\n")
+
+    response = readLine(client)
+    assert response == (
+        ":127.0.0.1 481 test :Permission Denied- You're not an IRC operator\r\n"
+    )
+
+
+def test_Server_profile_slow(client: socket):
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    client.sendall(b"PROFILE SLOW\r\n")
+    response = readLines(client, 4)
+
+    assert all(line.startswith(":127.0.0.1 NOTICE test :") for line in response)
+    # The parameters of OPER are not shown
+    assert any(line.endswith(": OPER\r\n") for line in response[:3])
+    assert response[3] == ":127.0.0.1 NOTICE test :End of the 3 slowest messages\r\n"
+
+
+def test_Server_profile(server: Server, client: socket, tmp_path):
+    server.serverState.profiler.directory = str(tmp_path)
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    client.sendall(b"PROFILE 1\r\n")
+    started = readLine(client)
+    assert started.startswith(":127.0.0.1 NOTICE test :Profiling")
+
+    written = readLine(client)
+    path = next(tmp_path.iterdir())
+    assert written == f":127.0.0.1 NOTICE test :Profile written to {path}\r\n"
+
+
+def test_Server_profile_failed(server: Server, client: socket, tmp_path):
+    server.serverState.profiler.directory = str(tmp_path / "missing")
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    client.sendall(b"PROFILE 1\r\n")
+    readLine(client)
+
+    failed = readLine(client)
+    assert failed.startswith(":127.0.0.1 NOTICE test :Failed to write the profile")
+    # The next profile can start
+    client.sendall(b"PROFILE 1\r\n")
+    response = readLines(client, 2)
+    assert response[0].startswith(":127.0.0.1 NOTICE test :Profiling")
+    assert response[1].startswith(":127.0.0.1 NOTICE test :Failed")
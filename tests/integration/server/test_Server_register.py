@@ -63,3 +63,33 @@ def test_Server_user_notEnoughParameters(client: socket):
     response = readLine(client)
 
     assert response == ":127.0.0.1 461 * USER :Not enough parameters\r\n"
+
+
+def test_Server_nick_nicknameInUseCaseInsensitive(server: Server):
+    client = createClient(server)
+    client.sendall(b"NICK [Test]\r\n")
+    client2 = createClient(server)
+    client2.sendall(b"NICK {test}\r\n")
+    response = readLine(client2)
+
+    assert response == ":127.0.0.1 433 * {test} :Nickname is already in use\r\n"
+
+
+def test_Server_nick_erroneusNickname(client: socket):
+    client.sendall(b"NICK nicknameTooLong\r\n")
+    response = readLine(client)
+
+    assert response == ":127.0.0.1 432 * nicknameTooLong :Erroneous nickname\r\n"
+
+
+def test_Server_user_usernameInUse(server: Server):
+    client = createClient(server)
+    registerClient(client, "test")
+    client2 = createClient(server)
+    client2.sendall(b"NICK test2\r\nUSER test 0 * *\r\n")
+    response = readLine(client2)
+
+    assert response == ":127.0.0.1 468 test2 test :Username is already in use\r\n"
+
+    client2.sendall(b"USER test2 0 * *\r\n")
+    assert readLine(client2).startswith(":127.0.0.1 001 test2 ")
@@ -0,0 +1,43 @@
+from socket import socket
+
+from server.Server import Server
+
+from .utils import readLine, readLines, registerClient
+
+
+def test_Server_rehash_noPrivileges(client: socket):
+    registerClient(client)
+    client.sendall(b"REHASH\r\n")
+
+    response = readLine(client)
+    assert response == (
+        ":127.0.0.1 481 test :Permission Denied- You're not an IRC operator\r\n"
+    )
+
+
+def test_Server_rehash(server: Server, client: socket):
+    server.serverState.motdLoader = lambda: ["reloaded"]
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    client.sendall(b"REHASH\r\n")
+    assert readLine(client) == ":127.0.0.1 382 test MOTD :Rehashing\r\n"
+
+    client.sendall(b"MOTD\r\n")
+    assert readLines(client, 3) == [
+        ":127.0.0.1 375 test :- 127.0.0.1 Message of the day - \r\n",
+        ":127.0.0.1 372 test :- reloaded\r\n",
+        ":127.0.0.1 376 test :End of MOTD command\r\n",
+    ]
+
+
+def test_Server_rehash_failed(server: Server, client: socket):
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    # The server was not given a way to load the MOTD
+    client.sendall(b"REHASH\r\n")
+    response = readLine(client)
+    assert response == ":127.0.0.1 NOTICE test :The MOTD could not be reloaded\r\n"
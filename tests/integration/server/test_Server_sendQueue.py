@@ -0,0 +1,62 @@
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_RCVBUF
+from time import monotonic
+
+from server.Server import Server
+
+from .utils import createClient, readJoin, readLine, readLines, registerClient
+
+
+def test_Server_sendQueueExceeded(server: Server):
+    server.sendQueueLimit = 16 * 1024
+
+    # A client that stops reading, with a tiny receive window
+    slowClient = socket(AF_INET, SOCK_STREAM)
+    slowClient.setsockopt(SOL_SOCKET, SO_RCVBUF, 4096)
+    slowClient.connect((server.serverState.host, server.serverState.port))
+    registerClient(slowClient, "slow")
+    slowClient.sendall(b"JOIN #chan\r\n")
+    readJoin(slowClient)
+
+    client = createClient(server)
+    registerClient(client, "fast")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+
+    message = f"PRIVMSG #chan :{'a' * 400}\r\n".encode() * 100
+    deadline = monotonic() + 10
+    while "slow" in server.serverState.clients and monotonic() < deadline:
+        client.sendall(message)
+
+    # The slow client was dropped without stalling the sender
+    assert "slow" not in server.serverState.clients
+    client.sendall(b"PING\r\n")
+    assert readLine(client) == "PONG\r\n"
+
+    slowClient.close()
+
+
+def test_Server_sendQueue_coalesced(server: Server):
+    receiver = createClient(server)
+    registerClient(receiver, "receiver")
+    receiver.sendall(b"JOIN #chan\r\n")
+    readJoin(receiver)
+
+    client = createClient(server)
+    registerClient(client, "sender")
+    client.sendall(b"JOIN #chan\r\n")
+    readJoin(client)
+    readLine(receiver)
+
+    metrics = server.serverState.metrics
+    writes = metrics.socketWrites
+    client.sendall(b"".join(f"PRIVMSG #chan :{i}\r\n".encode() for i in range(200)))
+
+    # Messages queued together reach the socket in fewer writes, in order
+    lines = readLines(receiver, 200)
+    assert lines == [
+        f":sender!sender@127.0.0.1 PRIVMSG #chan :{i}\r\n" for i in range(200)
+    ]
+    assert metrics.socketWrites - writes < 100
+
+    client.close()
+    receiver.close()
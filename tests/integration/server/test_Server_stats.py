@@ -0,0 +1,69 @@
+from socket import socket
+from urllib.request import urlopen
+
+from server.Metrics import startMetricsServer
+from server.Server import Server
+
+from .utils import readLine, readLines, registerClient
+
+
+def test_Server_stats_noPrivileges(client: socket):
+    registerClient(client)
+    client.sendall(b"STATS m\r\n")
+
+    response = readLine(client)
+    assert response == (
+        ":127.0.0.1 481 test :Permission Denied- You're not an IRC operator\r\n"
+    )
+
+
+def test_Server_stats_commands(client: socket):
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    # A command is counted once handled, STATS is not included yet
+    client.sendall(b"STATS m\r\n")
+    response = readLines(client, 4)
+
+    assert response == [
+        ":127.0.0.1 212 test NICK 1 9 0\r\n",
+        ":127.0.0.1 212 test OPER 1 14 0\r\n",
+        ":127.0.0.1 212 test USER 1 15 0\r\n",
+        ":127.0.0.1 219 test m :End of STATS report\r\n",
+    ]
+
+
+def test_Server_stats_uptime(client: socket):
+    registerClient(client)
+    client.sendall(b"OPER test test\r\n")
+    readLine(client)
+
+    client.sendall(b"STATS u\r\n")
+    response = readLines(client, 2)
+
+    # Started a moment ago
+    assert response[0].startswith(":127.0.0.1 242 test :Server Up 0 days 0:00:0")
+    assert response[1] == ":127.0.0.1 219 test u :End of STATS report\r\n"
+
+
+def test_Server_metrics(server: Server, client: socket):
+    registerClient(client)
+    client.sendall(b"JOIN #chan\r\nPRIVMSG #chan :hello\r\nPING\r\n")
+    readLines(client, 5)
+
+    metricsServer = startMetricsServer(server.serverState.metrics, 0)
+    assert metricsServer is not None
+    try:
+        port = metricsServer.server_address[1]
+        with urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            metrics = response.read().decode()
+    finally:
+        metricsServer.stop()
+
+    assert 'irc_clients{state="registered"} 1' in metrics
+    assert "irc_channels 1" in metrics
+    assert 'irc_commands_total{command="PRIVMSG"} 1' in metrics
+    assert 'irc_command_duration_seconds_count{command="JOIN"} 1' in metrics
+    assert "irc_channel_fanout_count 2" in metrics
@@ -5,9 +5,11 @@ from lib.Channel import (
     ChannelNameTooLong,
     MAX_CHANNEL_NAME_LENGTH,
     InvalidChannelPrefix,
+    MemberFlags,
     NoUserInChannel,
     NoUsername,
     UserAlreadyInChannel,
+    getMemberPrefix,
 )
 from lib.User import User
 
@@ -45,9 +47,8 @@ def test_Channel_creator():
     creator.username = "test"
     channel = Channel("#test", creator)
 
-    assert len(channel.getAllUsers()) == 1
-    assert len(channel.getOperators()) == 1
-    assert len(channel.getUsers()) == 0
+    assert channel.getMemberCount() == 1
+    assert channel.getMemberFlags(creator) == MemberFlags.OPERATOR
     assert channel.isOperator(creator)
     assert channel.getSimpleModes() == ""
 
@@ -99,17 +100,15 @@ def test_Channel_addRemoveUsers():
     user.username = "test2"
 
     channel.addUser(user)
-    assert len(channel.getAllUsers()) == 2
-    assert len(channel.getUsers()) == 1
-    assert len(channel.getOperators()) == 1
+    assert channel.getMemberCount() == 2
+    assert channel.getMemberFlags(user) == MemberFlags.NONE
 
     with raises(UserAlreadyInChannel):
         channel.addUser(user)
 
     channel.removeUser(user)
-    assert len(channel.getAllUsers()) == 1
-    assert len(channel.getUsers()) == 0
-    assert len(channel.getOperators()) == 1
+    assert channel.getMemberCount() == 1
+    assert channel.getMemberFlags(user) is None
 
     with raises(NoUserInChannel):
         channel.removeUser(user)
@@ -125,18 +124,16 @@ def test_Channel_addRemoveOperators():
     user.username = "test2"
 
     channel.addOperator(user)
-    assert len(channel.getAllUsers()) == 2
-    assert len(channel.getUsers()) == 0
-    assert len(channel.getOperators()) == 2
+    assert channel.getMemberCount() == 2
     assert channel.isOperator(user)
 
     with raises(UserAlreadyInChannel):
         channel.addOperator(user)
 
+    # Losing operator status does not leave the channel
     channel.removeOperator(user)
-    assert len(channel.getAllUsers()) == 1
-    assert len(channel.getUsers()) == 0
-    assert len(channel.getOperators()) == 1
+    assert channel.getMemberCount() == 2
+    assert channel.getMemberFlags(user) == MemberFlags.NONE
     assert not channel.isOperator(user)
 
     with raises(NoUserInChannel):
@@ -146,9 +143,86 @@ def test_Channel_addRemoveOperators():
         channel.addOperator(User())
 
 
+def test_Channel_removeUser_operator():
+    channel = createChannel()
+
+    user = User()
+    user.username = "test2"
+    channel.addUser(user)
+    channel.addOperator(user)
+
+    # Leaving the channel also gives up operator status
+    channel.removeUser(user)
+    assert not channel.hasUser(user)
+    assert not channel.isOperator(user)
+    assert user.channels == {}
+
+
+def test_Channel_memberFlags():
+    channel = createChannel()
+
+    user = User()
+    user.username = "test2"
+    channel.addUser(user)
+    assert getMemberPrefix(channel.getMemberFlags(user)) == ""
+
+    channel.setMemberFlag(user, MemberFlags.VOICE, True)
+    assert getMemberPrefix(channel.getMemberFlags(user)) == "+"
+
+    # The highest status is shown
+    channel.addOperator(user)
+    assert getMemberPrefix(channel.getMemberFlags(user)) == "@"
+
+    channel.setMemberFlag(user, MemberFlags.VOICE, False)
+    assert channel.getMemberFlags(user) == MemberFlags.OPERATOR
+
+    with raises(NoUserInChannel):
+        channel.setMemberFlag(User(), MemberFlags.VOICE, True)
+
+
+def test_Channel_hasUser():
+    channel = createChannel()
+
+    user = User()
+    user.username = "test2"
+    channel.addUser(user)
+
+    # Another user with the same username, e.g. after reconnecting
+    other = User()
+    other.username = "test2"
+    assert channel.hasUser(user)
+    assert not channel.hasUser(other)
+    assert not channel.hasUser(User())
+
+
 def test_Channel_topic():
     channel = createChannel()
 
     assert channel.topic is None
     channel.setTopic("topic")
     assert channel.topic == "topic"
+
+
+def test_Channel_userChannels():
+    channel = createChannel()
+    creator = next(iter(channel.members))
+    assert creator.channels == {"#test": channel}
+
+    user = User()
+    user.username = "test2"
+
+    channel.addUser(user)
+    assert user.channels == {"#test": channel}
+    assert channel.hasUser(user)
+
+    # Still in the channel while either a user or an operator
+    channel.addOperator(user)
+    channel.removeOperator(user)
+    assert user.channels == {"#test": channel}
+
+    channel.removeUser(user)
+    assert user.channels == {}
+    assert not channel.hasUser(user)
+
+    channel.removeUser(creator)
+    assert creator.channels == {}
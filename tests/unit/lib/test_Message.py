@@ -7,3 +7,64 @@ def test_Message():
     assert message.prefix is None
     assert message.command == "QUIT"
     assert message.params == []
+
+
+def test_Message_params():
+    message = Message("JOIN #chan,#chan2 key", User())
+    assert message.command == "JOIN"
+    assert message.params == ["#chan,#chan2", "key"]
+
+
+def test_Message_trailing():
+    message = Message("PRIVMSG #chan :Hello  there :)", User())
+    assert message.command == "PRIVMSG"
+    assert message.params == ["#chan", "Hello  there :)"]
+
+    message = Message("TOPIC #chan :", User())
+    assert message.params == ["#chan", ""]
+
+
+def test_Message_prefix():
+    message = Message(":nick!user@host PRIVMSG nick2 :Hi", User())
+    assert message.prefix == "nick!user@host"
+    assert message.command == "PRIVMSG"
+    assert message.params == ["nick2", "Hi"]
+
+
+def test_Message_tags():
+    message = Message(
+        "@time=2022-01-01T00:00:00Z;msgid=a\\sb\\:c;+draft/flag :nick PING x", User()
+    )
+    assert message.tags == {
+        "time": "2022-01-01T00:00:00Z",
+        "msgid": "a b;c",
+        "+draft/flag": "",
+    }
+    assert message.prefix == "nick"
+    assert message.command == "PING"
+    assert message.params == ["x"]
+
+    assert Message("PING x", User()).tags == {}
+
+
+def test_Message_spaces():
+    message = Message("MODE  #chan   +k  key ", User())
+    assert message.command == "MODE"
+    assert message.params == ["#chan", "+k", "key"]
+
+
+def test_Message_lowercaseCommand():
+    assert Message("privmsg #chan :hi", User()).command == "PRIVMSG"
+
+
+def test_Message_maxParams():
+    message = Message("CMD " + " ".join(str(i) for i in range(20)), User())
+    assert len(message.params) == 15
+    assert message.params[14] == "14 15 16 17 18 19"
+
+
+def test_Message_bytes():
+    message = Message(b"PRIVMSG #chan :caf\xc3\xa9 \xff", User())
+    assert message.command == "PRIVMSG"
+    assert message.params == ["#chan", "café �"]
+    assert message.rawMessage == "PRIVMSG #chan :café �"
@@ -1,6 +1,6 @@
 from pytest import raises
 
-from lib.User import User
+from lib.User import User, ircLower
 
 
 def test_User():
@@ -52,3 +52,10 @@ def test_User_modes():
     user.setOperator(False)
     assert user.getModes() == ""
     assert not user.isOperator()
+
+
+def test_ircLower():
+    assert ircLower("Nick") == "nick"
+    assert ircLower("[Nick]") == "{nick}"
+    assert ircLower("A\\B^") == "a|b~"
+    assert ircLower("{nick}|~") == "{nick}|~"
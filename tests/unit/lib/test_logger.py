@@ -0,0 +1,102 @@
+from io import StringIO
+from logging import Formatter, StreamHandler, getLogger
+
+from lib.logger import LogQueueHandler, LogWriter
+
+
+class CountingStream(StringIO):
+    flushes: int = 0
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+
+def createLogger(name: str, writer: LogWriter, stream: CountingStream):
+    handler = StreamHandler(stream)
+    handler.setFormatter(Formatter("%(levelname)s %(message)s"))
+    writer.handlers.append(handler)
+
+    log = getLogger(f"irc.test.{name}")
+    log.propagate = False
+    log.setLevel("INFO")
+    log.addHandler(LogQueueHandler(writer))
+    return log
+
+
+def test_LogWriter():
+    writer = LogWriter()
+    stream = CountingStream()
+    log = createLogger("writer", writer, stream)
+
+    log.info("first")
+    log.debug("hidden")
+    log.warning("second %s", "formatted")
+    writer.flush()
+
+    assert stream.getvalue() == "INFO first\nWARNING second formatted\n"
+
+
+def test_LogWriter_batches():
+    writer = LogWriter()
+    stream = CountingStream()
+    log = createLogger("batches", writer, stream)
+
+    # Holds the writer back until every record is queued
+    writer.handlers[0].acquire()
+    try:
+        log.info("wait")
+        for i in range(100):
+            log.info(f"line {i}")
+    finally:
+        writer.handlers[0].release()
+    writer.flush()
+
+    assert stream.getvalue().count("\n") == 101
+    assert stream.flushes <= 3
+
+
+def test_LogWriter_handlerLevel():
+    writer = LogWriter()
+    stream = CountingStream()
+    log = createLogger("level", writer, stream)
+    writer.handlers[0].setLevel("WARNING")
+
+    log.info("hidden")
+    log.error("shown")
+    writer.flush()
+
+    assert stream.getvalue() == "ERROR shown\n"
+
+
+def test_LogWriter_exception():
+    writer = LogWriter()
+    stream = CountingStream()
+    log = createLogger("exception", writer, stream)
+
+    try:
+        raise ValueError("broken")
+    except ValueError:
+        log.exception("failed")
+    writer.flush()
+
+    output = stream.getvalue()
+    assert output.startswith("ERROR failed\nTraceback")
+    assert "ValueError: broken" in output
+
+
+def test_LogWriter_startsLazily():
+    writer = LogWriter()
+    stream = CountingStream()
+    log = createLogger("lazy", writer, stream)
+    assert writer.thread is None
+
+    log.info("first")
+    assert writer.thread is not None
+    writer.stop()
+
+    assert not writer.thread.is_alive()
+    assert stream.getvalue() == "INFO first\n"
+
+    # Written in place once stopped
+    log.info("after")
+    assert stream.getvalue() == "INFO first\nINFO after\n"
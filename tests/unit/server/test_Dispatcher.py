@@ -0,0 +1,33 @@
+from lib.Message import Message
+from server.Dispatcher import Dispatcher
+from server.ServerState import ServerState
+
+from .utils import FakeConnection
+
+
+def test_Dispatcher():
+    serverState = ServerState("127.0.0.1", 6667, [], [], "N/A")
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    dispatcher = Dispatcher(serverState)
+
+    assert dispatcher.dispatch(client, Message("PING", client.user))
+    assert dispatcher.dispatch(client, Message("PING", client.user))
+    assert connection.sent == [b"PONG\r\n", b"PONG\r\n"]
+
+    stats = dispatcher.getStats()
+    assert stats["PING"].count == 2
+    assert stats["PING"].nanoseconds > 0
+    assert stats["JOIN"].count == 0
+
+
+def test_Dispatcher_unknownCommand():
+    serverState = ServerState("127.0.0.1", 6667, [], [], "N/A")
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    dispatcher = Dispatcher(serverState)
+
+    assert not dispatcher.dispatch(client, Message("UNKNOWN", client.user))
+    assert "UNKNOWN" not in dispatcher.getStats()
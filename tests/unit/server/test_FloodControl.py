@@ -0,0 +1,75 @@
+from pytest import approx, raises
+
+from lib.Message import Message
+from server.FloodControl import ExcessFlood, FloodLimits, TokenBucket, getCommandCost
+from server.ServerCore import ServerCore
+
+from .utils import FakeConnection
+
+
+def test_TokenBucket():
+    bucket = TokenBucket(FloodLimits(rate=2, burst=4, timeout=10), 0)
+
+    # The burst is free, then lines wait for the debt to be paid back
+    assert bucket.charge(3, 0) == 0
+    assert bucket.charge(1, 0) == 0
+    assert bucket.charge(1, 0) == approx(0.5)
+    assert bucket.charge(1, 0.5) == approx(0.5)
+
+    # Idle time refills the bucket, up to the burst
+    assert bucket.charge(4, 100) == 0
+    assert bucket.throttledSince is None
+
+    # A single line never waits longer than refilling the whole bucket
+    assert bucket.charge(100, 100) == approx(2)
+
+
+def test_TokenBucket_excessFlood():
+    bucket = TokenBucket(FloodLimits(rate=1, burst=1, timeout=5), 0)
+
+    now = 0.0
+    with raises(ExcessFlood):
+        while now < 10:
+            now += bucket.charge(1, now)
+    assert bucket.exceeded
+    assert now == approx(6)
+
+
+def test_getCommandCost():
+    server = ServerCore("127.0.0.1", 6667, [], [], "N/A")
+    connections = []
+    for i in range(100):
+        connection = FakeConnection(i)
+        server.handleClientConnect(connection)
+        server.handleMessage(connection, f"NICK user{i}".encode())
+        server.handleMessage(connection, f"USER user{i} 0 * :user{i}".encode())
+        server.handleMessage(connection, b"JOIN #big")
+        connections.append(connection)
+    user = server.serverState.getClient(connections[0]).user
+
+    def cost(line: str) -> float:
+        return getCommandCost(server.serverState, Message(line, user))
+
+    assert cost("PING") < cost("PRIVMSG user1 :hi")
+    assert cost("PRIVMSG user1 :hi") < cost("PRIVMSG user1,user2 :hi")
+    assert cost("PRIVMSG #big :hi") == 3
+
+
+def test_ServerCore_floodControl():
+    server = ServerCore(
+        "127.0.0.1", 6667, [], [], "N/A", floodLimits=FloodLimits(1, 1, 0)
+    )
+    connection = FakeConnection(1)
+    server.handleClientConnect(connection)
+
+    assert server.handleMessage(connection, b"PING") == 0
+    assert server.handleMessage(connection, b"PING") == 0
+    assert server.handleMessage(connection, b"PING") > 0
+    assert server.serverState.metrics.throttledLines == 1
+    assert connection.disconnected is None
+
+    # Still throttled once the timeout passed
+    server.handleMessage(connection, b"PING")
+    assert connection.disconnected == "Excess Flood"
+    assert server.serverState.metrics.excessFlood == 1
+    assert connection.sent == [b"PONG\r\n"] * 3
@@ -0,0 +1,234 @@
+from lib.Channel import Channel
+from lib.Message import Message
+from lib.User import User
+from server.History import ChannelHistory
+from server.MessageHandlers.ChatHistory import (
+    ChatHistory,
+    formatTimestamp,
+    parseSelector,
+)
+from server.MessageHandlers.List import List, parseListFilter
+from server.MessageHandlers.Motd import Motd
+from server.MessageHandlers.Names import Names
+from server.MessageHandlers.Reply import needMoreParams
+from server.ServerState import ServerState
+
+from .utils import FakeConnection
+
+
+def test_Handler_replyNumeric():
+    serverState = ServerState("irc.example.com", 6667, [], [], "N/A")
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+
+    Motd(serverState)._replyNumeric(client, needMoreParams("JOIN"))
+
+    assert connection.sent == [
+        b":irc.example.com 461 * JOIN :Not enough parameters\r\n"
+    ]
+
+
+def test_Handler_replyNumeric_burst():
+    serverState = ServerState("irc.example.com", 6667, ["héllo"], [], "N/A")
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    client.user.setNick("test")
+
+    handler = Motd(serverState)
+    handler._replyNumeric(client, handler.motd(serverState.motd))
+
+    # The burst is written at once
+    assert connection.sent == [
+        b":irc.example.com 375 test :- irc.example.com Message of the day - \r\n"
+        + b":irc.example.com 372 test :- h\xc3\xa9llo\r\n"
+        + b":irc.example.com 376 test :End of MOTD command\r\n"
+    ]
+
+
+def test_Handler_motdBurst():
+    serverState = ServerState("irc.example.com", 6667, ["first"], [], "N/A")
+    handler = Motd(serverState)
+
+    burst = handler.getBurst()
+    assert burst.render(b"test") == (
+        b":irc.example.com 375 test :- irc.example.com Message of the day - \r\n"
+        b":irc.example.com 372 test :- first\r\n"
+        b":irc.example.com 376 test :End of MOTD command\r\n"
+    )
+    assert handler.getBurst() is burst
+
+    # Rendered again once the MOTD is replaced
+    serverState.setMOTD(["second"])
+    assert b":- second\r\n" in handler.getBurst().render(b"test")
+
+
+def test_Handler_names_split():
+    serverState = ServerState("irc.example.com", 6667, [], [], "N/A")
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    client.user.setNick("test")
+
+    members = []
+    for i in range(1000):
+        user = User()
+        user.username = f"member{i}"
+        members.append(user)
+    channel = Channel("#big", members[0])
+    for user in members[1:]:
+        channel.addUser(user)
+    serverState.channels["#big"] = channel
+
+    Names(serverState).handle(client, Message("NAMES #big", client.user))
+
+    lines = b"".join(connection.sent).split(b"\r\n")[:-1]
+    assert all(len(line) + 2 <= 512 for line in lines)
+    assert lines[-1] == b":irc.example.com 366 test #big :End of NAMES list"
+
+    head = b":irc.example.com 353 test = #big :"
+    assert all(line.startswith(head) for line in lines[:-1])
+    names = b" ".join(line[len(head) :] for line in lines[:-1]).split()
+    assert names == [b"@member0"] + [f"member{i}".encode() for i in range(1, 1000)]
+
+
+def createChannels(serverState: ServerState, count: int) -> None:
+    for i in range(count):
+        creator = User()
+        creator.username = f"creator{i}"
+        serverState.channels[f"#chan{i}"] = Channel(f"#chan{i}", creator)
+
+
+def test_Handler_paceNumeric():
+    serverState = ServerState("irc.example.com", 6667, [], [], "N/A")
+    createChannels(serverState, 250)
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    client.user.setNick("test")
+    connection.backlogged = True
+
+    List(serverState).handle(client, Message("LIST", client.user))
+
+    # A chunk is sent, the rest waits for the output to drain
+    assert b"".join(connection.sent).count(b" 322 ") == 100
+    connection.drain()
+    assert b"".join(connection.sent).count(b" 322 ") == 200
+
+    connection.backlogged = False
+    connection.drain()
+    output = b"".join(connection.sent)
+    assert output.count(b" 322 ") == 250
+    assert output.endswith(b":irc.example.com 323 test :End of LIST\r\n")
+    assert client.pacedReplies is None
+
+
+def test_Handler_paceNumeric_replaced():
+    serverState = ServerState("irc.example.com", 6667, [], [], "N/A")
+    createChannels(serverState, 150)
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    connection.backlogged = True
+
+    handler = List(serverState)
+    handler.handle(client, Message("LIST", client.user))
+    handler.handle(client, Message("LIST #chan1", client.user))
+
+    # The first listing stops once replaced
+    connection.backlogged = False
+    connection.drain()
+    output = b"".join(connection.sent)
+    assert output.count(b" 322 ") == 101
+    assert output.count(b" 323 ") == 1
+
+
+def test_ListFilter():
+    listFilter = parseListFilter(">1,<4,#a*,!#ab*")
+    creator = User()
+    creator.username = "creator"
+
+    def channel(name: str, members: int) -> Channel:
+        channel = Channel(name, creator)
+        for i in range(members - 1):
+            user = User()
+            user.username = f"user{i}"
+            channel.addUser(user)
+        return channel
+
+    assert listFilter.matches(channel("#AC", 2))
+    assert listFilter.matches(channel("#a", 3))
+    assert not listFilter.matches(channel("#a", 1))
+    assert not listFilter.matches(channel("#a", 4))
+    assert not listFilter.matches(channel("#b", 2))
+    assert not listFilter.matches(channel("#abc", 2))
+
+    # Names without wildcards are looked up
+    assert parseListFilter("#a,#b*").names == ["#a"]
+    assert parseListFilter("#a[1]").matches(channel("#A{1}", 1))
+
+
+def test_ChatHistory_timestamps():
+    timestamp = parseSelector("timestamp=2023-04-05T06:07:08.009Z")
+
+    assert timestamp == 1680674828009
+    assert formatTimestamp(timestamp) == "2023-04-05T06:07:08.009Z"
+
+
+def test_Handler_chatHistory():
+    serverState = ServerState("irc.example.com", 6667, [], [], "N/A")
+    connection = FakeConnection(1)
+    serverState.addUser(connection)
+    client = serverState.getClient(connection)
+    client.user.setNick("test")
+    client.user.username = "test"
+    client.capabilities = frozenset(("batch", "server-time"))
+    with serverState.openChannel("#chan", client.user) as (channel, _):
+        pass
+
+    history = serverState.history.channels[channel] = ChannelHistory(10)
+    for i in range(5):
+        history.append(1000 * i, f":a!a@h PRIVMSG #chan :{i}\r\n".encode())
+
+    handler = ChatHistory(serverState)
+
+    def request(params: str) -> list[bytes]:
+        connection.sent = []
+        handler.handle(client, Message(f"CHATHISTORY {params}", client.user))
+        return b"".join(connection.sent).split(b"\r\n")[:-1]
+
+    lines = request("BEFORE #chan timestamp=1970-01-01T00:00:03.000Z 2")
+    assert lines == [
+        b":irc.example.com BATCH +1 chathistory #chan",
+        b"@batch=1;time=1970-01-01T00:00:01.000Z :a!a@h PRIVMSG #chan :1",
+        b"@batch=1;time=1970-01-01T00:00:02.000Z :a!a@h PRIVMSG #chan :2",
+        b":irc.example.com BATCH -1",
+    ]
+    assert [
+        line[-1:]
+        for line in request("after #chan timestamp=1970-01-01T00:00:02Z 5")[1:-1]
+    ] == [b"3", b"4"]
+    assert [line[-1:] for line in request("LATEST #chan * 2")[1:-1]] == [b"3", b"4"]
+
+    client.capabilities = frozenset(("batch",))
+    assert request("LATEST #chan * 1") == [
+        b":irc.example.com BATCH +4 chathistory #chan",
+        b"@batch=4 :a!a@h PRIVMSG #chan :4",
+        b":irc.example.com BATCH -4",
+    ]
+    client.capabilities = frozenset(("server-time",))
+    assert request("LATEST #chan * 1") == [
+        b"@time=1970-01-01T00:00:04.000Z :a!a@h PRIVMSG #chan :4"
+    ]
+    client.capabilities = frozenset(("batch", "server-time"))
+
+    assert request("LATEST #chan * 0") == [
+        b":irc.example.com FAIL CHATHISTORY INVALID_PARAMS 0 :Invalid limit"
+    ]
+    assert request("BEFORE #chan * 5") == [
+        b":irc.example.com FAIL CHATHISTORY INVALID_PARAMS * :Invalid message selector"
+    ]
+    assert request("AROUND #chan * 5") == [
+        b":irc.example.com FAIL CHATHISTORY INVALID_PARAMS AROUND :Unknown subcommand"
+    ]
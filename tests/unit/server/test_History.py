@@ -0,0 +1,113 @@
+from lib.Channel import Channel
+from lib.User import User
+from server.History import ENTRY_OVERHEAD, ChannelHistory, History
+
+
+def createChannel(name: str) -> Channel:
+    user = User()
+    user.username = user.nick = "creator"
+    return Channel(name, user)
+
+
+def line(i: int) -> bytes:
+    return f":a!a@h PRIVMSG #chan :{i:03d}\r\n".encode()
+
+
+def timestamps(entries) -> list[int]:
+    return [timestamp for timestamp, _ in entries]
+
+
+def test_ChannelHistory_ring():
+    history = ChannelHistory(5)
+    for i in range(8):
+        history.append(i * 10, line(i))
+
+    # The oldest messages were replaced
+    assert len(history) == 5
+    assert len(history.lines) == 5
+    assert history.latest(10) == [(i * 10, line(i)) for i in range(3, 8)]
+    assert history.usedBytes == 5 * (len(line(0)) + ENTRY_OVERHEAD)
+
+
+def test_ChannelHistory_seek():
+    history = ChannelHistory(5)
+    for i in range(7):
+        history.append(i * 10, line(i))
+
+    assert timestamps(history.latest(2)) == [50, 60]
+    assert timestamps(history.latest(10, after=40)) == [50, 60]
+    assert timestamps(history.before(50, 2)) == [30, 40]
+    assert timestamps(history.before(45, 10)) == [20, 30, 40]
+    assert timestamps(history.after(30, 2)) == [40, 50]
+    assert timestamps(history.after(35, 10)) == [40, 50, 60]
+    assert history.after(60, 10) == []
+    assert history.before(20, 10) == []
+
+
+def test_ChannelHistory_clockSkew():
+    history = ChannelHistory(5)
+    history.append(100, line(0))
+    history.append(50, line(1))
+
+    # Kept sorted for the binary search
+    assert timestamps(history.latest(2)) == [100, 100]
+
+
+def test_ChannelHistory_dropOldest():
+    history = ChannelHistory(5)
+    for i in range(4):
+        history.append(i, line(i))
+
+    assert history.dropOldest(2) == 2 * (len(line(0)) + ENTRY_OVERHEAD)
+    for i in range(4, 8):
+        history.append(i, line(i))
+
+    # Grows again up to its capacity, oldest first
+    assert timestamps(history.latest(10)) == [3, 4, 5, 6, 7]
+
+
+def test_History_budget():
+    size = len(line(0)) + ENTRY_OVERHEAD
+    history = History(capacity=10, budget=12 * size)
+    channels = [createChannel(f"#chan{i}") for i in range(3)]
+
+    for i in range(5):
+        history.record(channels[0], line(i))
+        history.record(channels[1], line(i))
+    # The first channel is now the most recently active
+    history.record(channels[0], line(5))
+    assert history.usedBytes == 11 * size
+
+    # The least recently active channel is evicted first
+    history.record(channels[2], line(0))
+    history.record(channels[2], line(1))
+    assert history.latest(channels[1], 10) == []
+    assert len(history.latest(channels[0], 10)) == 6
+    assert history.usedBytes == 8 * size
+
+    history.discard(channels[0])
+    assert history.usedBytes == 2 * size
+
+
+def test_History_budget_single():
+    size = len(line(0)) + ENTRY_OVERHEAD
+    history = History(capacity=10, budget=3 * size)
+    channel = createChannel("#chan")
+
+    # A single channel keeps its latest messages
+    for i in range(5):
+        history.record(channel, line(i))
+    assert [text for _, text in history.latest(channel, 10)] == [
+        line(2),
+        line(3),
+        line(4),
+    ]
+    assert history.usedBytes == 3 * size
+
+
+def test_History_disabled():
+    history = History(capacity=0)
+    channel = createChannel("#chan")
+
+    history.record(channel, line(0))
+    assert history.latest(channel, 10) == []
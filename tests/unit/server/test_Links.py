@@ -0,0 +1,194 @@
+from time import monotonic, sleep
+from typing import Callable
+
+from pytest import fixture
+
+from server.Links import ServerLinks
+from server.ServerCore import ServerCore
+from server.StateBus import isRemote
+
+from .utils import FakeConnection
+
+
+def waitFor(predicate: Callable[[], bool], timeout: float = 5) -> None:
+    deadline = monotonic() + timeout
+    while not predicate():
+        assert monotonic() < deadline, "Timed out waiting for the links"
+        sleep(0.01)
+
+
+class LinkedServer:
+    core: ServerCore
+    links: ServerLinks
+    port: int
+
+    def __init__(self, name: str) -> None:
+        self.core = ServerCore("127.0.0.1", 6667, [], [], "N/A")
+        self.links = ServerLinks(self.core.serverState, name, "secret")
+        self.port = self.links.listen("127.0.0.1", 0)
+
+    def linkTo(self, other: "LinkedServer") -> None:
+        self.links.connect("127.0.0.1", other.port)
+        waitFor(lambda: any(link.synced.is_set() for link in self.links.links))
+
+    def register(self, nick: str, port: int) -> FakeConnection:
+        connection = FakeConnection(port)
+        self.core.handleClientConnect(connection)
+        self.core.handleMessage(connection, f"NICK {nick}".encode())
+        self.core.handleMessage(connection, f"USER {nick} 0 * :{nick}".encode())
+        return connection
+
+    def knows(self, nick: str) -> bool:
+        return self.core.serverState.getClientFromNick(nick) is not None
+
+
+@fixture
+def servers():
+    created: list[LinkedServer] = []
+
+    def create(name: str) -> LinkedServer:
+        server = LinkedServer(name)
+        created.append(server)
+        return server
+
+    yield create
+    for server in created:
+        server.links.stop()
+
+
+def test_ServerLinks_burst(servers):
+    a, b = servers("a.irc"), servers("b.irc")
+    alice = a.register("alice", 1)
+    a.core.handleMessage(alice, b"JOIN #chan")
+    a.core.handleMessage(alice, b"TOPIC #chan :Linked")
+    a.core.handleMessage(alice, b"MODE #chan +t")
+    b.register("bob", 2)
+
+    b.linkTo(a)
+    waitFor(lambda: a.knows("bob"))
+
+    state = b.core.serverState
+    client = state.getClientFromNick("alice")
+    assert isRemote(client.handler)
+    assert client.getIdentifier() == "alice!alice@127.0.0.1"
+    channel = state.getChannel("#chan")
+    assert channel.topic == "Linked"
+    assert channel.getSimpleModes() == "t"
+    assert channel.isOperator(client.user)
+
+    a.core.handleMessage(alice, b"LUSERS")
+    replies = b"".join(alice.sent)
+    assert b"There are 2 users and 0 services on 2 servers" in replies
+    assert b"I have 1 clients and 1 servers" in replies
+
+
+def test_ServerLinks_channelMessage(servers):
+    # c.irc - a.irc - b.irc, only a.irc and b.irc have members of #chan
+    a, b, c = servers("a.irc"), servers("b.irc"), servers("c.irc")
+    b.linkTo(a)
+    c.linkTo(a)
+    alice = a.register("alice", 1)
+    bob = b.register("bob", 2)
+    carol = c.register("carol", 3)
+    waitFor(lambda: b.knows("carol") and c.knows("bob"))
+
+    a.core.handleMessage(alice, b"JOIN #chan")
+    waitFor(lambda: b.core.serverState.getChannel("#chan") is not None)
+    b.core.handleMessage(bob, b"JOIN #chan")
+    waitFor(lambda: c.core.serverState.getChannel("#chan").getMemberCount() == 2)
+    assert any(b"JOIN #chan" in data for data in alice.sent)
+
+    a.core.handleMessage(alice, b"PRIVMSG #chan :hello")
+    waitFor(lambda: any(b"PRIVMSG #chan :hello" in data for data in bob.sent))
+    assert bob.sent[-1] == b":alice!alice@127.0.0.1 PRIVMSG #chan :hello\r\n"
+
+    # Across two links to a client
+    c.core.handleMessage(carol, b"PRIVMSG bob :hi")
+    waitFor(lambda: bob.sent[-1] == b":carol!carol@127.0.0.1 PRIVMSG bob :hi\r\n")
+
+    # The message went nowhere near c.irc, which keeps no history of it
+    for server, lines in ((a, 1), (b, 1), (c, 0)):
+        state = server.core.serverState
+        channel = state.getChannel("#chan")
+        assert len(state.history.latest(channel, 10)) == lines
+
+
+def test_ServerLinks_changes(servers):
+    a, b = servers("a.irc"), servers("b.irc")
+    b.linkTo(a)
+    alice = a.register("alice", 1)
+    bob = b.register("bob", 2)
+    waitFor(lambda: a.knows("bob") and b.knows("alice"))
+
+    a.core.handleMessage(alice, b"JOIN #chan")
+    waitFor(lambda: b.core.serverState.getChannel("#chan") is not None)
+    b.core.handleMessage(bob, b"JOIN #chan")
+    b.core.handleMessage(bob, b"NICK robert")
+    waitFor(lambda: a.knows("robert"))
+    assert not a.knows("bob")
+    channel = a.core.serverState.getChannel("#chan")
+    assert channel.getMemberCount() == 2
+
+    b.core.handleMessage(bob, b"PART #chan")
+    waitFor(lambda: channel.getMemberCount() == 1)
+
+    a.core.handleClientDisconnect(alice)
+    waitFor(lambda: not b.knows("alice"))
+    # Its last member gone, the channel is deleted everywhere
+    assert b.core.serverState.getChannel("#chan") is None
+
+
+def test_ServerLinks_nickCollision(servers):
+    a, b = servers("a.irc"), servers("b.irc")
+    first = a.register("alice", 1)
+    second = b.register("alice", 2)
+
+    b.linkTo(a)
+
+    # https://datatracker.ietf.org/doc/html/rfc2813#section-5.2
+    waitFor(lambda: first.disconnected is not None)
+    waitFor(lambda: second.disconnected is not None)
+    assert first.disconnected.startswith("Killed")
+    assert not isRemote(a.core.serverState.getClientFromNick("alice").handler)
+
+
+def test_ServerLinks_squit(servers):
+    # c.irc - a.irc - b.irc
+    a, b, c = servers("a.irc"), servers("b.irc"), servers("c.irc")
+    b.linkTo(a)
+    c.linkTo(a)
+    b.register("bob", 2)
+    waitFor(lambda: c.knows("bob"))
+    assert set(c.links.servers) == {"a.irc", "b.irc"}
+
+    b.links.stop()
+
+    waitFor(lambda: not c.knows("bob"))
+    assert set(c.links.servers) == {"a.irc"}
+    assert c.links.linkedUsers == 0
+
+
+def test_ServerLinks_loop(servers):
+    a, b, c = servers("a.irc"), servers("b.irc"), servers("c.irc")
+    b.linkTo(a)
+    c.linkTo(b)
+    waitFor(lambda: "c.irc" in a.links.servers)
+
+    # The link would close a cycle, a.irc already knows c.irc
+    c.links.connect("127.0.0.1", a.port)
+    sleep(0.2)
+
+    assert len(a.links.links) == 1
+    assert len(c.links.links) == 1
+    assert set(a.links.servers) == {"b.irc", "c.irc"}
+
+
+def test_ServerLinks_badPassword(servers):
+    a = servers("a.irc")
+    b = servers("b.irc")
+    b.links.password = "wrong"
+    b.links.connect("127.0.0.1", a.port)
+    sleep(0.2)
+
+    assert a.links.links == ()
+    assert a.links.servers == {}
@@ -0,0 +1,53 @@
+from server.Metrics import Histogram, Metrics
+from server.ServerState import ServerState
+
+from .utils import FakeConnection
+
+
+def test_Histogram():
+    histogram = Histogram((1, 10, 100))
+    for value in [0, 1, 5, 10, 50, 1000]:
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 2, 1, 1]
+    assert histogram.count == 6
+    assert histogram.sum == 1066
+    assert list(histogram.render("size", 'kind="test"')) == [
+        'size_bucket{kind="test",le="1"} 2',
+        'size_bucket{kind="test",le="10"} 4',
+        'size_bucket{kind="test",le="100"} 5',
+        'size_bucket{kind="test",le="+Inf"} 6',
+        'size_sum{kind="test"} 1066',
+        'size_count{kind="test"} 6',
+    ]
+
+
+def test_Metrics_gauges():
+    serverState = ServerState("127.0.0.1", 6667, [], [], "N/A")
+    serverState.addUser(FakeConnection(1))
+    serverState.addUser(FakeConnection(2))
+    client = serverState.getClient(FakeConnection(2))
+    serverState.changeNick(client, "nick")
+    serverState.registerUser(client, "user")
+
+    assert serverState.metrics.getGauges() == {
+        "clients": 1,
+        "remoteClients": 0,
+        "newClients": 1,
+        "channels": 0,
+        "sendQueueBytes": 0,
+        "sendQueueMaxBytes": 0,
+    }
+
+
+def test_Metrics_render():
+    metrics = Metrics(ServerState("127.0.0.1", 6667, [], [], "N/A"))
+    metrics.getCommandStats("PING").observe(20_000)
+    metrics.bytesIn = 6
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE irc_commands_total counter" in lines
+    assert 'irc_commands_total{command="PING"} 1' in lines
+    assert 'irc_command_duration_seconds_bucket{command="PING",le="1e-05"} 0' in lines
+    assert 'irc_command_duration_seconds_bucket{command="PING",le="2.5e-05"} 1' in lines
+    assert "irc_received_bytes_total 6" in lines
@@ -0,0 +1,55 @@
+from threading import Event
+
+from bcrypt import gensalt, hashpw
+
+from server.Operators import OperatorAuthenticator, OperatorIndex
+from server.ServerState import OperatorCredential
+
+
+def hashed(text: str) -> bytes:
+    return hashpw(text.encode(), gensalt(4))
+
+
+def test_OperatorIndex():
+    credentials = [
+        OperatorCredential(hashed("alice"), hashed("alicePassword")),
+        OperatorCredential(b"bob", hashed("bobPassword")),
+    ]
+    index = OperatorIndex(credentials)
+
+    assert index.find("bob") is credentials[1]
+    assert index.find("alice") is credentials[0]
+    assert index.find("mallory") is None
+    # Hashed names are checked once per name
+    assert index.resolved == {"alice": credentials[0], "mallory": None}
+
+    assert index.check("alice", "alicePassword")
+    assert index.check("bob", "bobPassword")
+    assert not index.check("bob", "alicePassword")
+    assert not index.check("mallory", "alicePassword")
+
+
+def test_OperatorAuthenticator():
+    authenticator = OperatorAuthenticator(
+        [OperatorCredential(b"bob", hashed("bobPassword"))]
+    )
+    results: list[bool] = []
+    done = Event()
+
+    def onDone(valid: bool) -> None:
+        results.append(valid)
+        if len(results) == 2:
+            done.set()
+
+    assert authenticator.submit("bob", "bobPassword", onDone)
+    assert authenticator.submit("bob", "wrong", onDone)
+    assert done.wait(5)
+    assert sorted(results) == [False, True]
+    assert authenticator.pending == 0
+
+
+def test_OperatorAuthenticator_pendingLimit(monkeypatch):
+    monkeypatch.setattr("server.Operators.MAX_PENDING_CHECKS", 0)
+    authenticator = OperatorAuthenticator([])
+
+    assert not authenticator.submit("bob", "bobPassword", lambda valid: None)
@@ -0,0 +1,127 @@
+import os
+
+from lib.Channel import Modes
+from server import Persistence
+from server.Persistence import ChannelJournal, ChannelRecord
+from server.ServerCore import ServerCore
+
+from .utils import FakeConnection
+
+
+def register(core: ServerCore, nick: str, port: int) -> FakeConnection:
+    connection = FakeConnection(port)
+    core.handleClientConnect(connection)
+    core.handleMessage(connection, f"NICK {nick}".encode())
+    core.handleMessage(connection, f"USER {nick} 0 * :{nick}".encode())
+    return connection
+
+
+def test_ChannelJournal(tmp_path):
+    journal = ChannelJournal(str(tmp_path))
+    assert journal.load() == {}
+    journal.start()
+    journal.saveChannel("#chan", None, None, None, 0)
+    journal.saveChannel("#chan", "topic", "key", 10, 32)
+    journal.saveChannel("#gone", None, None, None, 0)
+    journal.deleteChannel("#gone")
+    journal.close()
+
+    # Changes after closing are dropped
+    journal.saveChannel("#late", None, None, None, 0)
+
+    assert ChannelJournal(str(tmp_path)).load() == {
+        "#chan": ChannelRecord("topic", "key", 10, 32)
+    }
+
+
+def test_ChannelJournal_operators(tmp_path):
+    # Written by older versions, the saved operators are not restored
+    with open(tmp_path / Persistence.JOURNAL_FILE, "w") as f:
+        f.write('["channel","#chan","topic",null,null,8,["alice"]]\n')
+
+    assert ChannelJournal(str(tmp_path)).load() == {
+        "#chan": ChannelRecord("topic", None, None, 8)
+    }
+
+
+def test_ChannelJournal_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr(Persistence, "MIN_COMPACT_ENTRIES", 10)
+    journal = ChannelJournal(str(tmp_path))
+    journal.load()
+    journal.start()
+    for i in range(25):
+        journal.saveChannel(f"#chan{i % 3}", str(i), None, None, 0)
+        # One entry per batch
+        journal.flush()
+    journal.close()
+
+    # Compacted twice, the journal holds the last five entries
+    with open(journal.snapshotPath, "rb") as f:
+        assert f.read().count(b"\n") == 3
+    with open(journal.journalPath, "rb") as f:
+        assert f.read().count(b"\n") == 5
+
+    records = ChannelJournal(str(tmp_path)).load()
+    assert {name: record.topic for name, record in records.items()} == {
+        "#chan0": "24",
+        "#chan1": "22",
+        "#chan2": "23",
+    }
+
+
+def test_ChannelJournal_tornWrite(tmp_path):
+    journal = ChannelJournal(str(tmp_path))
+    journal.load()
+    journal.start()
+    journal.saveChannel("#chan", "topic", None, None, 0)
+    journal.close()
+
+    # A crash in the middle of a write
+    with open(journal.journalPath, "ab") as f:
+        f.write(b'["channel","#other",')
+
+    journal = ChannelJournal(str(tmp_path))
+    assert list(journal.load()) == ["#chan"]
+    journal.start()
+    journal.saveChannel("#other", None, None, None, 0)
+    journal.close()
+
+    assert list(ChannelJournal(str(tmp_path)).load()) == ["#chan", "#other"]
+
+
+def test_ServerState_restoreChannels(tmp_path):
+    core = ServerCore("127.0.0.1", 6667, [], [], "N/A")
+    journal = ChannelJournal(str(tmp_path))
+    journal.load()
+    journal.start()
+    core.serverState.journal = journal
+
+    alice = register(core, "alice", 1)
+    bob = register(core, "bob", 2)
+    core.handleMessage(alice, b"JOIN #chan")
+    core.handleMessage(bob, b"JOIN #chan")
+    core.handleMessage(alice, b"TOPIC #chan :Saved")
+    core.handleMessage(alice, b"MODE #chan +t")
+    core.handleMessage(alice, b"JOIN #empty")
+    core.handleMessage(alice, b"PART #empty")
+    journal.close()
+    assert os.path.getsize(journal.journalPath) > 0
+
+    # Restarted: the channels come back without members
+    restarted = ServerCore("127.0.0.1", 6667, [], [], "N/A")
+    restarted.serverState.restoreChannels(ChannelJournal(str(tmp_path)).load())
+    state = restarted.serverState
+    assert state.getChannel("#empty") is None
+    channel = state.getChannel("#chan")
+    assert channel.topic == "Saved"
+    assert channel.modes == Modes.TOPIC
+    assert channel.getMemberCount() == 0
+
+    # Operators are not restored: alice's username does not make her its
+    # operator again, its first member runs the channel as its creator would
+    bob = register(restarted, "bob", 2)
+    alice = register(restarted, "alice", 1)
+    restarted.handleMessage(bob, b"JOIN #chan")
+    restarted.handleMessage(alice, b"JOIN #chan")
+    assert channel.isOperator(state.getClient(bob).user)
+    assert not channel.isOperator(state.getClient(alice).user)
@@ -0,0 +1,117 @@
+import json
+import sys
+from threading import Event, Thread
+
+from lib.Message import Message
+from lib.User import User
+from server.Profiler import (
+    ProfilerBusy,
+    Profiler,
+    SamplingProfiler,
+    SlowLog,
+    _getQualifiedName,
+)
+from server.ServerCore import ServerCore
+
+from .utils import FakeConnection
+
+
+def test_SlowLog():
+    slowLog = SlowLog(3)
+    user = User()
+    for nanoseconds in [5, 1, 9, 7, 3]:
+        slowLog.record(nanoseconds, Message(f"PING {nanoseconds}", user))
+
+    assert [m.nanoseconds for m in slowLog.getSlowest()] == [9, 7, 5]
+    assert [m.line for m in slowLog.getSlowest()] == ["PING 9", "PING 7", "PING 5"]
+    assert slowLog.threshold == 5
+
+
+def test_SlowLog_redacted():
+    slowLog = SlowLog(3)
+    slowLog.record(1, Message("OPER name password", User()))
+
+    assert slowLog.getSlowest()[0].line == "OPER"
+
+
+def test_SamplingProfiler(tmp_path):
+    server = ServerCore("127.0.0.1", 6667, [], [], "N/A")
+    connection = FakeConnection(1)
+    server.handleClientConnect(connection)
+    stopped = Event()
+
+    def handleMessages() -> None:
+        while not stopped.is_set():
+            server.handleMessage(connection, b"PING")
+
+    thread = Thread(target=handleMessages)
+    thread.start()
+    path = str(tmp_path / "profile.json")
+    try:
+        SamplingProfiler(path, 0.2).start().join()
+    finally:
+        stopped.set()
+        thread.join()
+
+    with open(path) as f:
+        profile = json.load(f)
+    frames = [frame["name"] for frame in profile["shared"]["frames"]]
+    samples = profile["profiles"][0]["samples"]
+    assert "ServerCore.handleMessage" in frames
+    assert len(samples) > 0
+    assert len(samples) == len(profile["profiles"][0]["weights"])
+    # Only the thread handling messages is sampled
+    assert all(frames[s[-1]] != "SamplingProfiler._run" for s in samples)
+
+
+def test_getQualifiedName():
+    class Base:
+        def method(self):
+            return sys._getframe()
+
+        @classmethod
+        def create(cls):
+            return sys._getframe()
+
+    class Derived(Base):
+        pass
+
+    # Named after the class defining the method, as co_qualname does
+    assert _getQualifiedName(Derived().method()) == Base.method.__qualname__
+    assert _getQualifiedName(Derived.create()) == Base.create.__qualname__
+    assert _getQualifiedName(sys._getframe()) == "test_getQualifiedName"
+
+
+def test_Profiler_busy(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    done = Event()
+    profiler.startSampling(0.05, lambda path, error: done.set())
+
+    try:
+        profiler.startSampling(1)
+        assert False, "A second profile started"
+    except ProfilerBusy:
+        pass
+
+    assert done.wait(5)
+    assert profiler.sampling is None
+    assert list(tmp_path.iterdir())
+
+
+def test_Profiler_writeFailed(tmp_path):
+    # The profile cannot be written in a missing directory
+    profiler = Profiler(str(tmp_path / "missing"))
+    done = Event()
+    errors = []
+
+    def onDone(path, error):
+        errors.append(error)
+        done.set()
+
+    profiler.startSampling(0.05, onDone)
+
+    assert done.wait(5)
+    assert isinstance(errors[0], FileNotFoundError)
+    # A failed profile does not keep the next ones from starting
+    assert profiler.sampling is None
+    profiler.startSampling(0.05)
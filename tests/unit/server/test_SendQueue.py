@@ -0,0 +1,86 @@
+from threading import Thread
+
+from pytest import raises
+
+from server.SendQueue import DRAIN_MARK, SendQueue, SendQueueExceeded
+
+
+def test_SendQueue():
+    queue = SendQueue(10)
+
+    queue.push(b"abc")
+    queue.push(b"def")
+    assert len(queue) == 6
+
+    assert queue.pop() == [b"abc", b"def"]
+    assert len(queue) == 0
+
+
+def test_SendQueue_exceeded():
+    queue = SendQueue(10)
+
+    queue.push(b"a" * 10)
+    with raises(SendQueueExceeded):
+        queue.push(b"b")
+    assert len(queue) == 10
+
+    queue.pop()
+    queue.push(b"b")
+    assert len(queue) == 1
+
+
+def test_SendQueue_close():
+    queue = SendQueue(10)
+
+    queue.push(b"abc")
+    queue.close()
+    queue.push(b"def")
+
+    assert queue.pop() == [b"abc"]
+    assert queue.pop() is None
+
+
+def test_SendQueue_popWaitsForData():
+    queue = SendQueue(10)
+    popped = []
+
+    writer = Thread(target=lambda: popped.append(queue.pop()))
+    writer.start()
+    queue.push(b"abc")
+    writer.join(2)
+
+    assert popped == [[b"abc"]]
+
+
+def test_SendQueue_drained():
+    queue = SendQueue(4 * DRAIN_MARK)
+    drained = []
+
+    # Under the mark, the caller goes on sending
+    queue.push(b"a" * DRAIN_MARK)
+    assert not queue.whenDrained(lambda: drained.append(1))
+
+    queue.push(b"b")
+    assert queue.whenDrained(lambda: drained.append(2))
+    queue.notifyDrained()
+    assert drained == []
+
+    queue.pop()
+    queue.notifyDrained()
+    queue.notifyDrained()
+    assert drained == [2]
+
+
+def test_SendQueue_drained_closed():
+    queue = SendQueue(4 * DRAIN_MARK)
+    drained = []
+
+    queue.push(b"a" * (DRAIN_MARK + 1))
+    assert queue.whenDrained(lambda: drained.append(1))
+    queue.close()
+    queue.pop()
+    queue.notifyDrained()
+
+    # Dropped with the connection
+    assert queue.whenDrained(lambda: drained.append(2))
+    assert drained == []
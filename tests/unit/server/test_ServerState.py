@@ -0,0 +1,329 @@
+import random
+import sys
+from threading import Thread
+
+from pytest import raises
+
+from lib.Channel import Channel
+from server.ServerCore import ServerCore
+from server.ServerState import CHANNEL_CHUNK, ServerState, Client
+
+from .utils import FakeConnection
+
+
+def createServerState() -> ServerState:
+    return ServerState("127.0.0.1", 6667, [], [], "N/A")
+
+
+def connect(serverState: ServerState, port: int) -> Client:
+    connection = FakeConnection(port)
+    serverState.addUser(connection)
+    return serverState.getClient(connection)
+
+
+def test_ServerState_changeNick():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    other = connect(serverState, 2)
+
+    assert serverState.changeNick(client, "Nick")
+    assert client.user.nick == "Nick"
+    assert serverState.nicks == {"nick": client}
+
+    # Collisions use the RFC 1459 casemapping
+    assert not serverState.changeNick(other, "NICK")
+    assert not serverState.changeNick(other, "nick")
+    assert other.user.nick == "*"
+
+    # A client can change the case of its own nick
+    assert serverState.changeNick(client, "NICK")
+    assert client.user.nick == "NICK"
+
+    assert serverState.changeNick(client, "[other]")
+    assert serverState.changeNick(other, "nick")
+    assert not serverState.changeNick(other, "{OTHER}")
+    assert serverState.nicks == {"{other}": client, "nick": other}
+
+
+def test_ServerState_changeNick_tooLong():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.changeNick(client, "nick")
+
+    with raises(ValueError):
+        serverState.changeNick(client, "n" * 10)
+    assert client.user.nick == "nick"
+    assert serverState.nicks == {"nick": client}
+
+
+def test_ServerState_getClientFromNick():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.changeNick(client, "Nick")
+
+    # Only registered clients can be looked up
+    assert serverState.getClientFromNick("nick") is None
+
+    serverState.registerUser(client, "user")
+    assert serverState.clients == {"user": client}
+    assert serverState.newClients == {}
+    assert serverState.getClientFromNick("NICK") is client
+    assert serverState.getUserFromNick("nick") is client.user
+    assert serverState.getClientFromNick("other") is None
+
+
+def test_ServerState_registerUser_usernameInUse():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    other = connect(serverState, 2)
+
+    assert serverState.registerUser(client, "user")
+    assert not serverState.registerUser(other, "user")
+    # Left unregistered, free to try another username
+    assert serverState.clients == {"user": client}
+    assert other.user.username is None
+    assert serverState.registerUser(other, "other")
+
+
+def test_ServerState_removeUser():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.changeNick(client, "nick")
+    unregistered = connect(serverState, 2)
+    serverState.changeNick(unregistered, "other")
+    serverState.registerUser(client, "user")
+
+    serverState.removeUser(client.handler)
+    serverState.removeUser(unregistered.handler)
+
+    assert serverState.clients == {}
+    assert serverState.newClients == {}
+    assert serverState.nicks == {}
+
+
+def test_ServerState_removeUser_channels():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.registerUser(client, "user")
+    other = connect(serverState, 2)
+    serverState.registerUser(other, "other")
+
+    serverState.channels["#a"] = Channel("#a", client.user)
+    serverState.channels["#b"] = Channel("#b", other.user)
+    serverState.channels["#b"].addUser(client.user)
+
+    serverState.removeUser(client.handler)
+
+    # Channels left empty are deleted
+    assert list(serverState.channels) == ["#b"]
+    assert not serverState.channels["#b"].hasUser(client.user)
+    assert client.user.channels == {}
+
+
+def test_ServerState_openChannel():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.registerUser(client, "user")
+    other = connect(serverState, 2)
+    serverState.registerUser(other, "other")
+
+    with serverState.openChannel("#a", client.user, "key") as (channel, created):
+        assert created
+        assert channel.isOperator(client.user)
+        assert channel.key == "key"
+    with serverState.openChannel("#a", other.user) as (existing, created):
+        assert not created
+        assert existing is channel
+        assert not existing.hasUser(other.user)
+
+    # Closed channels are replaced instead of being joined
+    channel.removeUser(client.user)
+    assert serverState.deleteChannelIfEmpty(channel)
+    assert channel.closed
+    assert serverState.getChannel("#a") is None
+    with serverState.openChannel("#a", other.user) as (replacement, created):
+        assert created
+        assert replacement is not channel
+
+
+def test_ServerState_openChannel_caseInsensitive():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.registerUser(client, "user")
+
+    with serverState.openChannel("#Chan[1]", client.user) as (channel, _):
+        pass
+    with serverState.openChannel("#CHAN{1}", client.user) as (same, created):
+        assert not created
+        assert same is channel
+    assert serverState.getChannel("#chan{1}") is channel
+    assert channel.name == "#Chan[1]"
+
+    channel.removeUser(client.user)
+    assert serverState.deleteChannelIfEmpty(channel)
+    assert serverState.getChannel("#Chan[1]") is None
+
+
+def test_ServerState_deleteChannelIfEmpty():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.registerUser(client, "user")
+
+    with serverState.openChannel("#a", client.user) as (channel, _):
+        pass
+    assert not serverState.deleteChannelIfEmpty(channel)
+    assert serverState.getChannels() == [channel]
+
+    channel.removeUser(client.user)
+    assert serverState.deleteChannelIfEmpty(channel)
+    assert not serverState.deleteChannelIfEmpty(channel)
+    assert serverState.getChannels() == []
+
+
+def test_ServerState_iterChannels():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    serverState.registerUser(client, "user")
+
+    def openChannel(name: str) -> Channel:
+        with serverState.openChannel(name, client.user) as (channel, _):
+            return channel
+
+    count = CHANNEL_CHUNK * 2 + 1
+    channels = [openChannel(f"#c{i}") for i in range(count)]
+
+    iterated = []
+    iterator = serverState.iterChannels()
+    for channel in iterator:
+        iterated.append(channel)
+        if len(iterated) == CHANNEL_CHUNK:
+            # Between two chunks: one channel listed and one to come are
+            # deleted, another one is created
+            for deleted in (channels[0], channels[-1]):
+                deleted.removeUser(client.user)
+                assert serverState.deleteChannelIfEmpty(deleted)
+            created = openChannel("#new")
+
+    assert iterated == channels[:-1] + [created]
+
+
+STRESS_THREADS = 8
+STRESS_CLIENTS_PER_THREAD = 4
+STRESS_ITERATIONS = 1500
+STRESS_CHANNELS = ["#a", "#b", "#c"]
+
+
+def test_ServerState_concurrentChannels():
+    server = ServerCore("127.0.0.1", 6667, [], [], "N/A")
+    errors: list[BaseException] = []
+
+    def connectClient(port: int) -> FakeConnection:
+        connection = FakeConnection(port)
+        server.handleClientConnect(connection)
+        server.handleMessage(connection, f"NICK n{port}".encode())
+        server.handleMessage(connection, f"USER u{port} 0 * :stress".encode())
+        return connection
+
+    def work(thread: int) -> None:
+        randomizer = random.Random(thread)
+        firstPort = thread * STRESS_CLIENTS_PER_THREAD
+        ports = range(firstPort, firstPort + STRESS_CLIENTS_PER_THREAD)
+        connections = [connectClient(port) for port in ports]
+        commands = [
+            "JOIN {channel}",
+            "PART {channel}",
+            "PRIVMSG {channel} :hello",
+            "KICK {channel} n{other}",
+            "MODE {channel} +o n{other}",
+            "MODE {channel} -o n{other}",
+            "TOPIC {channel} :topic",
+            "NAMES {channel}",
+            "LIST",
+            "LUSERS",
+            "USERS",
+            "JOIN 0",
+        ]
+        try:
+            for _ in range(STRESS_ITERATIONS):
+                index = randomizer.randrange(len(connections))
+                connection = connections[index]
+                if randomizer.random() < 0.02:
+                    # Reconnect, leaving every channel at once
+                    server.handleClientDisconnect(connection)
+                    connections[index] = connectClient(connection.port)
+                    continue
+
+                line = randomizer.choice(commands).format(
+                    channel=randomizer.choice(STRESS_CHANNELS),
+                    other=randomizer.randrange(
+                        STRESS_THREADS * STRESS_CLIENTS_PER_THREAD
+                    ),
+                )
+                # Handlers answer membership races with numerics, nothing
+                # raises
+                server.handleMessage(connection, line.encode())
+        except BaseException as e:
+            errors.append(e)
+
+    switchInterval = sys.getswitchinterval()
+    # Switch threads as often as possible to make races likely
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [Thread(target=work, args=(i,)) for i in range(STRESS_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switchInterval)
+
+    assert errors == []
+
+    serverState = server.serverState
+    for channel in serverState.getChannels():
+        assert not channel.closed
+        assert channel.members
+        for user in channel.members:
+            assert serverState.clients[user.username].user is user
+            assert user.channels[channel.name] is channel
+    for client in serverState.clients.values():
+        for name, channel in client.user.channels.items():
+            assert serverState.getChannel(name) is channel
+            assert channel.hasUser(client.user)
+
+
+def test_ServerState_operators():
+    serverState = createServerState()
+    client = connect(serverState, 1)
+    other = connect(serverState, 2)
+
+    serverState.setOperator(client, True)
+    serverState.setOperator(client, True)
+    serverState.setOperator(other, True)
+    assert serverState.operators == 2
+
+    serverState.setOperator(other, False)
+    assert serverState.operators == 1
+
+    serverState.removeUser(client.handler)
+    assert serverState.operators == 0
+
+    # A check finishing once the client is gone changes nothing
+    assert not serverState.setOperator(client, True)
+    assert serverState.operators == 0
+
+
+def test_ServerState_reloadMOTD():
+    serverState = createServerState()
+    assert not serverState.reloadMOTD()
+
+    serverState.motdLoader = lambda: ["reloaded"]
+    assert serverState.reloadMOTD()
+    assert serverState.motd == ["reloaded"]
+
+    def failing():
+        raise FileNotFoundError("motd.txt")
+
+    serverState.motdLoader = failing
+    assert not serverState.reloadMOTD()
+    assert serverState.motd == ["reloaded"]
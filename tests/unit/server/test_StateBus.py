@@ -0,0 +1,107 @@
+from time import monotonic, sleep
+from typing import Callable
+
+from pytest import fixture
+
+from server.ServerCore import ServerCore
+from server.StateBus import StateBus, StateBusHub, isRemote
+
+from .utils import FakeConnection
+
+
+def waitFor(predicate: Callable[[], bool], timeout: float = 5) -> None:
+    deadline = monotonic() + timeout
+    while not predicate():
+        assert monotonic() < deadline, "Timed out waiting for the state bus"
+        sleep(0.01)
+
+
+@fixture
+def workers(tmp_path):
+    path = str(tmp_path / "bus.sock")
+    hub = StateBusHub(path, b"secret")
+    hub.start()
+
+    cores = [ServerCore("127.0.0.1", 6667, [], [], "N/A") for _ in range(2)]
+    for workerId, core in enumerate(cores):
+        StateBus.connect(path, b"secret", workerId, core.serverState)
+    waitFor(lambda: len(hub.workers) == 2)
+
+    yield cores
+    hub.stop()
+
+
+def register(core: ServerCore, nick: str, port: int) -> FakeConnection:
+    connection = FakeConnection(port)
+    core.handleClientConnect(connection)
+    core.handleMessage(connection, f"NICK {nick}".encode())
+    core.handleMessage(connection, f"USER {nick} 0 * :{nick}".encode())
+    return connection
+
+
+def test_StateBus_register(workers):
+    first, second = workers
+    register(first, "alice", 1)
+
+    waitFor(lambda: second.serverState.getClientFromNick("alice") is not None)
+    client = second.serverState.getClientFromNick("alice")
+    assert isRemote(client.handler)
+    assert client.user.username == "alice"
+
+
+def test_StateBus_nickCollision(workers):
+    first, second = workers
+    register(first, "alice", 1)
+
+    # The hub rejects the nick even before the registration reaches the worker
+    connection = register(second, "ALICE", 2)
+    assert b"433" in b"".join(connection.sent)
+    assert second.serverState.getClient(connection).user.nick == "*"
+
+
+def test_StateBus_channelMessage(workers):
+    first, second = workers
+    alice = register(first, "alice", 1)
+    bob = register(second, "bob", 2)
+    waitFor(lambda: first.serverState.getClientFromNick("bob") is not None)
+
+    first.handleMessage(alice, b"JOIN #chan")
+    waitFor(lambda: second.serverState.getChannel("#chan") is not None)
+    second.handleMessage(bob, b"JOIN #chan")
+    waitFor(lambda: first.serverState.getChannel("#chan").getMemberCount() == 2)
+
+    first.handleMessage(alice, b"PRIVMSG #chan :hello")
+    waitFor(lambda: any(b"PRIVMSG #chan :hello" in data for data in bob.sent))
+    # Both workers keep the message in the channel's history
+    for core in workers:
+        channel = core.serverState.getChannel("#chan")
+        [(_, line)] = core.serverState.history.latest(channel, 10)
+        assert line.endswith(b"PRIVMSG #chan :hello\r\n")
+
+    # Messages to a nick are routed to the worker of its client
+    second.handleMessage(bob, b"PRIVMSG alice :hi")
+    waitFor(lambda: any(b"PRIVMSG alice :hi" in data for data in alice.sent))
+
+
+def test_StateBus_quit(workers):
+    first, second = workers
+    alice = register(first, "alice", 1)
+    waitFor(lambda: second.serverState.getClientFromNick("alice") is not None)
+
+    first.handleClientDisconnect(alice)
+    waitFor(lambda: second.serverState.getClientFromNick("alice") is None)
+
+    # The nick is free again on every worker
+    connection = register(second, "alice", 2)
+    assert second.serverState.getClient(connection).user.nick == "alice"
+
+
+def test_StateBus_rehash(workers):
+    first, second = workers
+    first.serverState.motdLoader = lambda: ["reloaded"]
+    alice = register(first, "alice", 1)
+    first.serverState.setOperator(first.serverState.getClient(alice), True)
+
+    first.handleMessage(alice, b"REHASH")
+    assert b" 382 " in alice.sent[-1]
+    waitFor(lambda: second.serverState.motd == ["reloaded"])
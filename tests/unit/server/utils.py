@@ -0,0 +1,53 @@
+from typing import Callable, Optional
+
+from lib.User import User
+
+
+class FakeConnection:
+    user: Optional[User]
+    port: int
+    sent: list[bytes]
+    disconnected: Optional[str]
+    # While set, output waits for drain() to be called
+    backlogged: bool
+    drainCallbacks: list[Callable[[], None]]
+
+    def __init__(self, port: int) -> None:
+        self.user = None
+        self.port = port
+        self.sent = []
+        self.disconnected = None
+        self.backlogged = False
+        self.drainCallbacks = []
+
+    def send(self, message: str) -> None:
+        self.sendRaw(message.encode())
+
+    def sendRaw(self, data: bytes) -> None:
+        self.sent.append(data)
+
+    def getClientAddress(self) -> str:
+        return f"{self.getHost()}:{self.getPort()}"
+
+    def getHost(self) -> str:
+        return "127.0.0.1"
+
+    def getPort(self) -> int:
+        return self.port
+
+    def getSendQueueSize(self) -> int:
+        return 0
+
+    def onDrained(self, callback: Callable[[], None]) -> bool:
+        if self.backlogged:
+            self.drainCallbacks.append(callback)
+        return self.backlogged
+
+    def drain(self) -> None:
+        callbacks = self.drainCallbacks
+        self.drainCallbacks = []
+        for callback in callbacks:
+            callback()
+
+    def disconnect(self, reason: str) -> None:
+        self.disconnected = reason